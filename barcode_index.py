@@ -0,0 +1,165 @@
+import json
+import logging
+import re
+import threading
+
+from price_diff import leer_csv_blob
+
+# === 🔹 Índice de códigos de barra de entrada ===
+# Una sola forma de leer la lista de códigos para todas las rutas: el CSV
+# se lee en streaming como texto (sin inferir tipos: pandas convertía
+# ``Barra`` a entero, perdía los ceros a la izquierda y con NaN producía
+# "7501...0.0"). Cada código se normaliza y se deduplica por su GTIN-14.
+#
+#   valido          GTIN-8/12/13/14 con dígito verificador correcto
+#   corregido       largo no GTIN (perdió ceros a la izquierda) con dígito correcto;
+#                   se completa a 12 dígitos (UPC-A)
+#   digito_invalido numérico con dígito verificador incorrecto (se conserva;
+#                   ``estricto=True`` lo descarta)
+#   alfanumerico    con sufijo de variante (p. ej. "8054083027166-1"); se conserva tal cual
+#   malformado      vacío, NaN, notación científica o largo imposible (se descarta)
+#
+# El índice compacto se guarda en ``Scrapping/_entrada/indice_codigos.json``
+# junto con el ETag del CSV: mientras el CSV no cambie, las rutas cargan la
+# lista ya normalizada sin releerlo (y dentro de una instancia, de memoria).
+
+logger = logging.getLogger("barcode-index")
+
+BLOB_CODIGOS = "codigo_barra_scrapping.csv"
+COLUMNA_CODIGOS = "Barra"
+INDICE_BLOB = "Scrapping/_entrada/indice_codigos.json"
+VERSION = 1  # cambia si cambian las reglas de normalización
+
+LARGOS_GTIN = (8, 12, 13, 14)
+RE_DECIMAL_CERO = re.compile(r"^(\d+)\.0+$")
+RE_CIENTIFICA = re.compile(r"^\d+(\.\d+)?[eE]\+?\d+$")
+RE_ALFANUMERICO = re.compile(r"^\d{6,14}[-\s]?[A-Za-z0-9]{1,3}$")
+VACIOS = ("", "nan", "none", "null", "-")
+
+_memoria = {}
+_memoria_lock = threading.Lock()
+
+
+def digito_valido(codigo):
+    """Dígito verificador GS1 (módulo 10, pesos 3/1 desde la derecha)."""
+    digitos = [int(c) for c in codigo]
+    suma = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digitos[:-1])))
+    return (10 - suma % 10) % 10 == digitos[-1]
+
+
+def normalizar_codigo(valor):
+    """``(codigo, estado)``; ``codigo`` es ``None`` si el valor es malformado."""
+    texto = str(valor if valor is not None else "").strip()
+    if texto.lower() in VACIOS or RE_CIENTIFICA.match(texto):
+        return None, "malformado"
+    texto = RE_DECIMAL_CERO.sub(r"\1", texto)
+    if not texto.isdigit():
+        return (texto, "alfanumerico") if RE_ALFANUMERICO.match(texto) else (None, "malformado")
+    if not 6 <= len(texto) <= 14:
+        return None, "malformado"
+    if not digito_valido(texto):
+        return texto, "digito_invalido"
+    if len(texto) in LARGOS_GTIN:
+        return texto, "valido"
+    # Los ceros a la izquierda no cambian el dígito verificador: basta el
+    # largo mínimo que los recupera (p. ej. UPC-A de 11 dígitos → 12)
+    return texto.zfill(12), "corregido"
+
+
+def clave_gtin(codigo):
+    """Clave de deduplicación: el GTIN-14 (mismo producto con o sin ceros a la izquierda)."""
+    return codigo.zfill(14) if codigo.isdigit() else codigo.upper()
+
+
+class BarcodeIndex:
+    """Códigos normalizados y únicos, en el orden de la lista de entrada."""
+
+    def __init__(self, codigos=(), invalidos=(), stats=None, etag=None):
+        self.codigos = list(codigos)
+        self.invalidos = set(invalidos)  # estado "digito_invalido"
+        self.stats = dict(stats or {})
+        self.etag = etag
+        self._claves = {clave_gtin(c): c for c in self.codigos}
+
+    @classmethod
+    def desde_valores(cls, valores, etag=None):
+        indice = cls(etag=etag)
+        for valor in valores:
+            indice.agregar(valor)
+        return indice
+
+    def agregar(self, valor):
+        """Normaliza y agrega ``valor``; devuelve el estado (``duplicado`` si ya estaba)."""
+        self.stats["leidos"] = self.stats.get("leidos", 0) + 1
+        codigo, estado = normalizar_codigo(valor)
+        if codigo is not None:
+            clave = clave_gtin(codigo)
+            if clave in self._claves:
+                estado = "duplicado"
+            else:
+                self._claves[clave] = codigo
+                self.codigos.append(codigo)
+                if estado == "digito_invalido":
+                    self.invalidos.add(codigo)
+        self.stats[estado] = self.stats.get(estado, 0) + 1
+        return estado
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __contains__(self, valor):
+        codigo, _ = normalizar_codigo(valor)
+        return codigo is not None and clave_gtin(codigo) in self._claves
+
+    def lista(self, estricto=False):
+        """Códigos a consultar; ``estricto`` omite los de dígito verificador inválido."""
+        return [c for c in self.codigos if c not in self.invalidos] if estricto else list(self.codigos)
+
+    def shard(self, n, tam, estricto=False):
+        """Shard ``n`` (desde 1) de ``tam`` códigos: reemplaza a los ``upc_list_N.json``."""
+        return self.lista(estricto)[(n - 1) * tam:n * tam]
+
+    def to_json(self):
+        return json.dumps({
+            "version": VERSION,
+            "etag": self.etag,
+            "codigos": self.codigos,
+            "invalidos": sorted(self.invalidos),
+            "stats": self.stats,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, texto):
+        data = json.loads(texto)
+        if data.get("version") != VERSION:
+            return None
+        return cls(data["codigos"], data.get("invalidos", ()), data.get("stats"), data.get("etag"))
+
+
+def construir_indice(blob_client, etag=None, columna=COLUMNA_CODIGOS):
+    """Lee el CSV en streaming (todo como texto) y arma el índice."""
+    return BarcodeIndex.desde_valores((fila.get(columna) for fila in leer_csv_blob(blob_client)), etag=etag)
+
+
+def cargar_indice(container_client, blob_codigos=BLOB_CODIGOS):
+    """Índice vigente de ``blob_codigos``: de memoria, del blob del índice o reconstruido si el CSV cambió."""
+    origen = container_client.get_blob_client(blob_codigos)
+    etag = origen.get_blob_properties().etag
+    with _memoria_lock:
+        indice = _memoria.get(blob_codigos)
+    if indice is not None and indice.etag == etag:
+        return indice
+
+    destino = container_client.get_blob_client(INDICE_BLOB) if blob_codigos == BLOB_CODIGOS else None
+    indice = None
+    if destino is not None and destino.exists():
+        indice = BarcodeIndex.from_json(destino.download_blob().readall())
+    if indice is None or indice.etag != etag:
+        indice = construir_indice(origen, etag=etag)
+        logger.info(f"Índice de {blob_codigos} reconstruido: {indice.stats}")
+        if destino is not None:
+            destino.upload_blob(indice.to_json().encode("utf-8"), overwrite=True)
+
+    with _memoria_lock:
+        _memoria[blob_codigos] = indice
+    return indice
@@ -0,0 +1,89 @@
+"""Simulación de la agenda de refresco (``refresh_scheduler``) frente al barrido diario completo.
+
+Genera un catálogo sintético (códigos volátiles, estables y que ninguna
+farmacia tiene), corre ``--dias`` días con una invocación diaria y compara
+peticiones totales y frescura: cuántos cambios de precio se detectaron y
+con cuántos días de atraso en promedio.
+
+Uso:
+    python benchmarks/bench_agenda.py [--codigos 2000] [--dias 60] [--volatiles 0.1]
+        [--sin-precio 0.15] [--presupuesto 0]
+"""
+import argparse
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_store import DIA, CacheStore  # noqa: E402
+from refresh_scheduler import RefreshScheduler  # noqa: E402
+
+
+class Catalogo:
+    """Precios que cambian con probabilidad diaria según el tipo de código."""
+
+    def __init__(self, n, volatiles, sin_precio, semilla=1):
+        self.rnd = random.Random(semilla)
+        self.prob_cambio, self.precio = {}, {}
+        for i in range(n):
+            codigo = f"75{i:011d}"
+            r = self.rnd.random()
+            if r < sin_precio:
+                self.precio[codigo], self.prob_cambio[codigo] = None, 0.0
+            else:
+                self.precio[codigo] = float(self.rnd.randint(50, 900))
+                self.prob_cambio[codigo] = 0.3 if r < sin_precio + volatiles else 0.01
+        self.cambio_dia = {}  # código → día del último cambio aún no detectado
+
+    def avanzar(self, dia):
+        for codigo, p in self.prob_cambio.items():
+            if p and self.rnd.random() < p:
+                self.precio[codigo] = round(self.precio[codigo] * self.rnd.uniform(0.9, 1.1), 2)
+                self.cambio_dia.setdefault(codigo, dia)
+
+
+def simular(catalogo, dias, agenda, presupuesto):
+    peticiones, atrasos = 0, []
+    codigos = list(catalogo.precio)
+    for dia in range(dias):
+        catalogo.avanzar(dia)
+        ahora = dia * DIA
+        consulta = agenda.vencidos(codigos, presupuesto, ahora=ahora) if agenda else codigos
+        peticiones += len(consulta)
+        filas = []
+        for codigo in consulta:
+            filas.append({"Barra": codigo, "Precio": catalogo.precio[codigo]})
+            if codigo in catalogo.cambio_dia:
+                atrasos.append(dia - catalogo.cambio_dia.pop(codigo))
+        if agenda:
+            agenda.observar(filas, ahora=ahora)
+    sin_detectar = len(catalogo.cambio_dia)
+    return peticiones, atrasos, sin_detectar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codigos", type=int, default=2000)
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--volatiles", type=float, default=0.1)
+    parser.add_argument("--sin-precio", type=float, default=0.15)
+    parser.add_argument("--presupuesto", type=int, default=0, help="códigos por invocación (0 = sin límite)")
+    args = parser.parse_args()
+
+    print(f"{args.codigos} códigos · {args.dias} días · {args.volatiles:.0%} volátiles · {args.sin_precio:.0%} sin precio")
+    print(f"\n{'modo':<10} {'peticiones':>11} {'cambios':>8} {'atraso medio':>13} {'sin detectar':>13}")
+    for modo in ("completo", "agenda"):
+        catalogo = Catalogo(args.codigos, args.volatiles, args.sin_precio)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CacheStore(Path(tmp) / "agenda.sqlite")
+            agenda = RefreshScheduler(cache, "Barra", ["Precio"]) if modo == "agenda" else None
+            peticiones, atrasos, sin_detectar = simular(catalogo, args.dias, agenda, args.presupuesto or None)
+            cache.close()
+        atraso = sum(atrasos) / len(atrasos) if atrasos else 0
+        print(f"{modo:<10} {peticiones:>11} {len(atrasos):>8} {atraso:>12.2f}d {sin_detectar:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Reparto de lotes por cola (``work_queue``) frente a lotes fijos por instancia.
+
+Simula ``--lotes`` lotes con duración desigual (unos pocos ``--lentos``
+tardan ``--factor`` veces más) y ``--instancias`` consumidores:
+
+- fijo: cada instancia recibe de antemano su parte de los lotes, como con
+  ``upc_list_1..9.json`` y una llamada HTTP por archivo.
+- cola: todas consumen de una ``MemoryQueue`` con ``consumir`` (reintentos
+  por visibility timeout y poison), así que las libres toman lo que queda.
+
+Con ``--fallos`` una fracción de los intentos lanza una excepción.
+
+Uso:
+    python benchmarks/bench_cola.py [--lotes 60] [--instancias 6] [--duracion 0.05]
+        [--lentos 0.1] [--factor 8] [--fallos 0.05]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from work_queue import MemoryQueue, consumir  # noqa: E402
+
+
+def duraciones(lotes, base, lentos, factor, semilla=1):
+    rnd = random.Random(semilla)
+    return [base * (factor if rnd.random() < lentos else 1) for _ in range(lotes)]
+
+
+def en_hilos(n, objetivo):
+    hilos = [threading.Thread(target=objetivo, args=(i,)) for i in range(n)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return time.perf_counter() - t0
+
+
+def fijo(tiempos, instancias):
+    partes = [tiempos[i::instancias] for i in range(instancias)]
+    return en_hilos(instancias, lambda i: [time.sleep(t) for t in partes[i]])
+
+
+def cola(tiempos, instancias, fallos, semilla=1):
+    queue, poison = MemoryQueue(), MemoryQueue()
+    for n, t in enumerate(tiempos):
+        queue.send_message(json.dumps({"n": n, "t": t}))
+    rnd, lock = random.Random(semilla), threading.Lock()
+    stats = []
+
+    def handler(contenido, intento):
+        time.sleep(json.loads(contenido)["t"])
+        with lock:
+            falla = rnd.random() < fallos
+        if falla:
+            raise RuntimeError("fallo simulado")
+
+    def consumidor(_):
+        s = consumir(queue, handler, poison=poison, visibilidad_s=0.05, espera_s=0.01)
+        with lock:
+            stats.append(s)
+
+    segundos = en_hilos(instancias, consumidor)
+    total = {k: sum(s[k] for s in stats) for k in ("procesados", "reintentos", "poison")}
+    return segundos, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lotes", type=int, default=60)
+    parser.add_argument("--instancias", type=int, default=6)
+    parser.add_argument("--duracion", type=float, default=0.05, help="segundos de un lote normal")
+    parser.add_argument("--lentos", type=float, default=0.1, help="fracción de lotes lentos")
+    parser.add_argument("--factor", type=float, default=8)
+    parser.add_argument("--fallos", type=float, default=0.0, help="fracción de intentos que fallan")
+    args = parser.parse_args()
+
+    tiempos = duraciones(args.lotes, args.duracion, args.lentos, args.factor)
+    ideal = sum(tiempos) / args.instancias
+    print(f"{args.lotes} lotes · {args.instancias} instancias · trabajo total {sum(tiempos):.2f} s · ideal {ideal:.2f} s")
+
+    s_fijo = fijo(tiempos, args.instancias)
+    s_cola, total = cola(tiempos, args.instancias, args.fallos)
+    print(f"fijo  {s_fijo:6.2f} s  ({ideal / s_fijo:.0%} del ideal)")
+    print(f"cola  {s_cola:6.2f} s  ({ideal / s_cola:.0%} del ideal)  {total}")
+
+
+if __name__ == "__main__":
+    main()
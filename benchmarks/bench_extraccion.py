@@ -0,0 +1,136 @@
+"""Micro-benchmark de los motores de extracción de precio (Farmacias Especializadas).
+
+Uso:
+    python benchmarks/bench_extraccion.py [--fixtures DIR] [--repeticiones N]
+    python benchmarks/bench_extraccion.py --guardar 7501088504761 7501050614863
+
+``--guardar`` descarga la búsqueda y la página de producto de cada código
+en ``DIR`` (``<codigo>_busqueda.html`` / ``<codigo>_producto.html``). Si el
+directorio no tiene fixtures se usan páginas sintéticas con la estructura
+de Magento.
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from price_extraction import EXTRACTORES  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BASE_URL = "https://www.farmaciasespecializadas.com/catalogsearch/result/?q="
+
+
+def pagina_sintetica(precio, relleno=400):
+    """Página de producto tipo Magento: mucho HTML antes del bloque de precio."""
+    menu = "".join(
+        f'<li class="level0 nav-{i}"><a href="/categoria-{i}.html"><span>Categoría {i}</span></a></li>'
+        for i in range(relleno)
+    )
+    script = "<script>var config = {" + ",".join(f'"k{i}": "$ {i}.00"' for i in range(50)) + "};</script>"
+    return (
+        "<!doctype html><html><head><title>Producto</title>"
+        '<meta itemprop="priceCurrency" content="MXN">'
+        f"{script}</head><body><nav><ul>{menu}</ul></nav>"
+        '<div class="product-info-main"><h1 class="page-title"><span>Producto de prueba</span></h1>'
+        '<div class="price-box price-final_price">'
+        f'<span class="price-container"><span id="product-price-1" data-price-amount="{precio}" '
+        f'data-price-type="finalPrice" class="price-wrapper"><span class="price">${precio:,.2f}</span></span></span>'
+        f'</div><meta itemprop="price" content="{precio}"></div>'
+        "<footer>" + "<p>Texto legal</p>" * relleno + "</footer></body></html>"
+    )
+
+
+def busqueda_sintetica(url, relleno=200):
+    productos = "".join(
+        f'<li class="item product"><a class="product-item-link" href="{url}?v={i}">Producto {i}</a></li>'
+        for i in range(3)
+    )
+    menu = "".join(f"<li><a href='/c{i}'>Cat {i}</a></li>" for i in range(relleno))
+    return f"<html><body><ul>{menu}</ul><ol class='products list'>{productos}</ol></body></html>"
+
+
+def cargar_fixtures(directorio):
+    productos = sorted(directorio.glob("*_producto.html"))
+    busquedas = sorted(directorio.glob("*_busqueda.html"))
+    if productos:
+        return (
+            [p.read_text(encoding="utf-8", errors="replace") for p in busquedas],
+            [p.read_text(encoding="utf-8", errors="replace") for p in productos],
+        )
+    print("Sin fixtures guardados: se usan páginas sintéticas.")
+    return (
+        [busqueda_sintetica(f"https://example.com/p{i}.html") for i in range(5)],
+        [pagina_sintetica(100 + i * 17.5) for i in range(5)],
+    )
+
+
+def guardar_fixtures(directorio, codigos):
+    from http_client import ScraperHttp
+    from price_extraction import get_extractor
+
+    directorio.mkdir(parents=True, exist_ok=True)
+    http = ScraperHttp(pool_size=1, headers={"User-Agent": "Mozilla/5.0"})
+    extractor = get_extractor("rapido")
+    for codigo in codigos:
+        busqueda = http.get(BASE_URL + codigo).text
+        (directorio / f"{codigo}_busqueda.html").write_text(busqueda, encoding="utf-8")
+        url = extractor.enlace_producto(busqueda)
+        if url:
+            (directorio / f"{codigo}_producto.html").write_text(http.get(url).text, encoding="utf-8")
+        print(f"{codigo}: {'ok' if url else 'sin producto'}")
+
+
+def medir(fn, paginas, repeticiones):
+    tiempos, resultados = [], []
+    for _ in range(repeticiones):
+        for html in paginas:
+            t0 = time.perf_counter()
+            resultados.append(fn(html))
+            tiempos.append(time.perf_counter() - t0)
+    return tiempos, resultados[:len(paginas)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--guardar", nargs="+", metavar="CODIGO")
+    args = parser.parse_args()
+
+    if args.guardar:
+        guardar_fixtures(args.fixtures, args.guardar)
+        return
+
+    busquedas, productos = cargar_fixtures(args.fixtures)
+    referencia = None
+    print(f"{'motor':<8} {'etapa':<9} {'ms/pág p50':>11} {'ms/pág p95':>11} {'vs bs4':>8}")
+    base = {}
+    for nombre, cls in EXTRACTORES.items():
+        try:
+            extractor = cls()
+        except RuntimeError as e:
+            print(f"{nombre:<8} omitido: {e}")
+            continue
+        for etapa, fn, paginas in (("busqueda", extractor.enlace_producto, busquedas),
+                                   ("producto", extractor.precio, productos)):
+            if not paginas:
+                continue
+            tiempos, resultados = medir(fn, paginas, args.repeticiones)
+            p50 = statistics.median(tiempos) * 1000
+            p95 = statistics.quantiles(tiempos, n=20)[-1] * 1000 if len(tiempos) >= 20 else max(tiempos) * 1000
+            if nombre == "bs4":
+                base[etapa] = p50
+            ratio = f"{base[etapa] / p50:.1f}x" if etapa in base and p50 else "-"
+            print(f"{nombre:<8} {etapa:<9} {p50:>11.3f} {p95:>11.3f} {ratio:>8}")
+            if etapa == "producto":
+                if referencia is None:
+                    referencia = resultados
+                elif resultados != referencia:
+                    print(f"  ⚠️ {nombre} difiere de la referencia: {resultados} vs {referencia}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Benchmark de throughput de los scrapers contra farmacias simuladas (sin red).
+
+Levanta ``mock_farmacias`` en local y ejecuta la lógica de cada fuente
+registrada (``Scraper.procesar`` con el mismo cliente HTTP, AIMD y
+métricas que el motor) sobre los UPCs de ``upc_list_*.json``. Reporta
+items/s, latencia p50/p95 por item y por etapa, y el pico de memoria.
+
+Uso:
+    python benchmarks/bench_offline.py [--fuentes especializadas,farmatodo,sanpablo]
+        [--lotes 1,2] [--latencia 50] [--jitter 20] [--errores 0.02] [--tasa-429 0.02]
+        [--param concurrency=4 --param batch_size=5] [--json salida.json]
+        [--base base.json --tolerancia 0.15]
+
+Con ``--base`` compara items/s contra una corrida anterior guardada con
+``--json`` y termina con código 1 si alguna fuente empeora más que
+``--tolerancia``.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import farmacias  # noqa: E402,F401  (registra los scrapers)
+from barcode_index import BarcodeIndex  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from mock_farmacias import MockConfig, MockFarmacias  # noqa: E402
+from result_sink import LocalFileSink  # noqa: E402
+from scraper_registry import SCRAPERS, preparar_scraper  # noqa: E402
+
+
+def cargar_upcs(lotes):
+    upcs = []
+    for n in lotes:
+        with open(RAIZ / f"upc_list_{n}.json", encoding="utf-8") as f:
+            data = json.load(f)
+        upcs += data["upcs"] if isinstance(data, dict) else data
+    return BarcodeIndex.desde_valores(upcs).codigos
+
+
+def apuntar_a_mock(scraper, url):
+    """Redirige las URLs base de la fuente al servidor simulado."""
+    clave = scraper.clave_registro
+    if clave == "especializadas":
+        scraper.BASE_URL = f"{url}/esp/catalogsearch/result/?q="
+    elif clave == "farmatodo":
+        scraper.BASE_URL = f"{url}/ft/"
+    elif clave == "sanpablo":
+        import scrapper_san_pablo
+        scrapper_san_pablo.API_HOST = f"{url}/occ"
+    else:
+        raise ValueError(f"Sin servidor simulado para {clave}")
+
+
+def correr(clave, upcs, url, params):
+    cls = SCRAPERS[clave]
+    params = {"transport": "http", **params}
+    metrics = Metrics()
+    scraper, concurrency = preparar_scraper(cls, params, metrics, lote="bench")
+    apuntar_a_mock(scraper, url)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = LocalFileSink(Path(tmp) / f"{clave}.csv", scraper.columnas, chunk_size=cls.chunk_size)
+        sink.metrics = metrics
+        sink.on_flush = lambda rows: metrics.results(rows, cls.columnas_precio)
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        with sink:
+            scraper.procesar(upcs, sink, time.monotonic() + 3600)
+        segundos = time.perf_counter() - t0
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if scraper.parse_pool:
+        scraper.parse_pool.close()
+    if scraper.http:
+        scraper.http.close()
+
+    snap = metrics.snapshot()
+    item = snap["etapas"].get("item", {})
+    return {
+        "fuente": clave,
+        "items": sink.count,
+        "segundos": round(segundos, 2),
+        "items_s": round(sink.count / segundos, 2) if segundos else None,
+        "p50_ms": item.get("p50_ms"),
+        "p95_ms": item.get("p95_ms"),
+        "pico_mb": round(pico / 2 ** 20, 1),
+        "contadores": snap["contadores"],
+        "etapas": snap["etapas"],
+        **({"concurrencia": concurrency.snapshot()} if concurrency else {}),
+    }
+
+
+def imprimir(resultados):
+    print(f"\n{'fuente':<16} {'items':>6} {'seg':>7} {'items/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'pico MB':>8}")
+    for r in resultados:
+        print(f"{r['fuente']:<16} {r['items']:>6} {r['segundos']:>7} {r['items_s'] or '-':>8} "
+              f"{r['p50_ms'] or '-':>8} {r['p95_ms'] or '-':>8} {r['pico_mb']:>8}")
+    for r in resultados:
+        print(f"\n{r['fuente']}: {r['contadores']}")
+        for etapa, h in r["etapas"].items():
+            print(f"  {etapa:<18} n={h['n']:<6} p50={h['p50_ms']:>8} ms  p95={h['p95_ms']:>8} ms  total={h['total_s']} s")
+
+
+def comparar(resultados, base, tolerancia):
+    """Lista de regresiones de items/s frente a ``base``."""
+    previos = {r["fuente"]: r for r in base}
+    regresiones = []
+    for r in resultados:
+        p = previos.get(r["fuente"])
+        if not p or not p.get("items_s") or not r.get("items_s"):
+            continue
+        cambio = r["items_s"] / p["items_s"] - 1
+        print(f"{r['fuente']:<16} {p['items_s']:>8} → {r['items_s']:>8} items/s ({cambio:+.0%})")
+        if cambio < -tolerancia:
+            regresiones.append(r["fuente"])
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuentes", default=",".join(SCRAPERS))
+    parser.add_argument("--lotes", default="1")
+    parser.add_argument("--latencia", type=float, default=50)
+    parser.add_argument("--jitter", type=float, default=20)
+    parser.add_argument("--errores", type=float, default=0.0)
+    parser.add_argument("--tasa-429", type=float, default=0.0)
+    parser.add_argument("--param", action="append", default=[], metavar="CLAVE=VALOR",
+                        help="parámetro de la ruta (p. ej. concurrency=4, adaptativo=0)")
+    parser.add_argument("--json", type=Path)
+    parser.add_argument("--base", type=Path)
+    parser.add_argument("--tolerancia", type=float, default=0.15)
+    args = parser.parse_args()
+
+    params = dict(p.split("=", 1) for p in args.param)
+    upcs = cargar_upcs([n.strip() for n in args.lotes.split(",") if n.strip()])
+    config = MockConfig(args.latencia, args.jitter, args.errores, args.tasa_429)
+    print(f"{len(upcs)} UPCs · latencia {args.latencia}±{args.jitter} ms · errores {args.errores:.0%} · 429 {args.tasa_429:.0%}")
+
+    resultados = []
+    with MockFarmacias(config) as mock:
+        for clave in [f.strip() for f in args.fuentes.split(",") if f.strip()]:
+            try:
+                resultados.append(correr(clave, upcs, mock.url, params))
+            except Exception as e:
+                print(f"{clave}: omitido ({type(e).__name__}: {e})")
+    imprimir(resultados)
+
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.base:
+        regresiones = comparar(resultados, json.loads(args.base.read_text(encoding="utf-8")), args.tolerancia)
+        if regresiones:
+            print(f"⚠️ Regresión de throughput en: {', '.join(regresiones)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
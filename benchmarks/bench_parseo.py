@@ -0,0 +1,89 @@
+"""Escalamiento de la etapa de parseo en procesos (``parse_pool``) según núcleos.
+
+Simula el pipeline de las rutas HTTP: ``--hilos`` hilos de I/O "descargan"
+(esperan ``--latencia`` ms) y parsean páginas sintéticas, en el mismo hilo
+(``workers_parseo=0``, como antes) o en un ``ParsePool`` de N procesos.
+Reporta items/s y la aceleración frente al parseo en hilos.
+
+Uso:
+    python benchmarks/bench_parseo.py [--paginas 400] [--hilos 20] [--latencia 20]
+        [--motor bs4|lxml|rapido|farmatodo] [--workers 0,1,2,4,8]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parse_pool import ParsePool, parsear  # noqa: E402
+from price_extraction import EXTRACTORES, extraer_farmatodo  # noqa: E402
+
+from bench_extraccion import pagina_sintetica  # noqa: E402
+
+
+class Respuesta:
+    """Lo que ``parsear`` usa de una respuesta de requests."""
+
+    def __init__(self, html):
+        self.content = html.encode("utf-8")
+        self.encoding = "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding)
+
+
+def funcion_parseo(motor):
+    return extraer_farmatodo if motor == "farmatodo" else EXTRACTORES[motor]().precio
+
+
+def correr(paginas, parse, hilos, latencia_s, workers):
+    pool = ParsePool(workers) if workers else None
+    try:
+        if pool:  # arranque de los procesos fuera de la medición
+            parsear(pool, parse, paginas[0])
+
+        def tarea(resp):
+            time.sleep(latencia_s)
+            return parsear(pool, parse, resp)[0]
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as executor:
+            resultados = list(executor.map(tarea, paginas))
+        segundos = time.perf_counter() - t0
+    finally:
+        if pool:
+            pool.close()
+    assert all(r is not None for r in resultados)
+    return len(paginas) / segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, default=400)
+    parser.add_argument("--hilos", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=20)
+    parser.add_argument("--motor", default="bs4", choices=[*EXTRACTORES, "farmatodo"])
+    parser.add_argument("--workers", default=None, help="procesos de parseo a probar (0 = en los hilos)")
+    args = parser.parse_args()
+
+    nucleos = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",")] if args.workers else sorted({0, 1, 2, 4, nucleos})
+    paginas = [Respuesta(pagina_sintetica(100 + i % 900 + 0.5)) for i in range(args.paginas)]
+    parse = funcion_parseo(args.motor)
+    print(f"{args.paginas} páginas · motor {args.motor} · {args.hilos} hilos de I/O · "
+          f"latencia {args.latencia} ms · {nucleos} núcleos")
+
+    base = None
+    print(f"\n{'workers_parseo':>14} {'items/s':>9} {'aceleración':>12}")
+    for w in workers:
+        items_s = correr(paginas, parse, args.hilos, args.latencia / 1000, w)
+        base = base or items_s
+        print(f"{w:>14} {items_s:>9.1f} {items_s / base:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Servidores locales que imitan a las tres farmacias para benchmarks sin red.
+
+- ``/esp/...``  Farmacias Especializadas (búsqueda y producto tipo Magento)
+- ``/ft/...``   FarmaTodo (página de producto con rango de precio)
+- ``/occ/...``  API OCC de San Pablo (búsqueda, detalle y carritos anónimos)
+
+Cada respuesta espera ``latencia_ms`` ± ``jitter_ms`` y, con la
+probabilidad configurada, devuelve un 429 (con ``Retry-After``) o un 503.
+Los precios y los "no encontrado" se derivan del código, así dos corridas
+con la misma semilla son comparables.
+
+Uso directo (para probar a mano):
+    python benchmarks/mock_farmacias.py --puerto 8765 --latencia 50 --tasa-429 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench_extraccion import busqueda_sintetica, pagina_sintetica
+
+OCC_PREFIX = "/occ/rest/v2/fsp"
+
+
+class MockConfig:
+    def __init__(self, latencia_ms=50, jitter_ms=20, error_rate=0.0, rate_429=0.0, retry_after=1, semilla=1):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self._random = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def sorteo(self):
+        """``(espera_s, fallo)`` con ``fallo`` en ``None``, ``429`` o ``503``."""
+        with self._lock:
+            espera = max(0.0, self.latencia_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            r = self._random.random()
+        if r < self.rate_429:
+            return espera, 429
+        if r < self.rate_429 + self.error_rate:
+            return espera, 503
+        return espera, None
+
+
+def digitos(texto):
+    return re.sub(r"\D", "", texto or "")
+
+
+def existe(codigo):
+    """~9% de los códigos no existen en el catálogo simulado."""
+    return bool(codigo) and int(codigo[-6:]) % 11 != 0
+
+
+def precio(codigo):
+    return 50 + int(codigo[-4:]) % 900 + 0.5
+
+
+def precio_promocion(codigo):
+    return round(precio(codigo) * 0.85, 2) if int(codigo[-3:]) % 4 == 0 else precio(codigo)
+
+
+class MockFarmacias:
+    """Servidor HTTP multihilo en ``127.0.0.1``; ``url`` es la base para las tres farmacias."""
+
+    def __init__(self, config=None, puerto=0):
+        self.config = config or MockConfig()
+        self.carritos = {}
+        self.peticiones = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", puerto), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, cuerpo=b"", tipo="text/html; charset=utf-8", headers=None):
+                if isinstance(cuerpo, (dict, list)):
+                    cuerpo, tipo = json.dumps(cuerpo).encode(), "application/json"
+                elif isinstance(cuerpo, str):
+                    cuerpo = cuerpo.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _atender(self, metodo):
+                with mock._lock:
+                    mock.peticiones += 1
+                largo = int(self.headers.get("Content-Length") or 0)
+                cuerpo = self.rfile.read(largo) if largo else b""
+                espera, fallo = mock.config.sorteo()
+                time.sleep(espera)
+                if fallo == 429:
+                    return self._responder(429, "Too Many Requests", headers={"Retry-After": str(mock.config.retry_after)})
+                if fallo:
+                    return self._responder(fallo, "Service Unavailable")
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.startswith("/esp/"):
+                    return self._responder(*mock.especializadas(url.path, query))
+                if url.path.startswith("/ft/"):
+                    return self._responder(*mock.farmatodo(url.path))
+                if url.path.startswith(OCC_PREFIX):
+                    return self._responder(*mock.occ(metodo, url.path[len(OCC_PREFIX):], query, cuerpo))
+                return self._responder(404, "Not Found")
+
+            def do_GET(self):
+                self._atender("GET")
+
+            def do_POST(self):
+                self._atender("POST")
+
+            def do_DELETE(self):
+                self._atender("DELETE")
+
+        return Handler
+
+    # --- Farmacias Especializadas ---
+    def especializadas(self, path, query):
+        if path == "/esp/catalogsearch/result/":
+            codigo = digitos(query.get("q"))
+            if not existe(codigo):
+                return 200, "<html><body><p class='message notice'>Sin resultados</p></body></html>"
+            return 200, busqueda_sintetica(f"{self.url}/esp/producto/{codigo}.html")
+        m = re.fullmatch(r"/esp/producto/(\d+)\.html", path)
+        if m and existe(m.group(1)):
+            return 200, pagina_sintetica(precio(m.group(1)))
+        return 404, "Not Found"
+
+    # --- FarmaTodo ---
+    def farmatodo(self, path):
+        codigo = digitos(path)
+        if not existe(codigo):
+            return 404, "<html><body>Producto no encontrado</body></html>"
+        p, promo = precio(codigo), precio_promocion(codigo)
+        texto = f"${promo:,.2f}–${p:,.2f}" if promo < p else f"${p:,.2f}"
+        relleno = "".join(f"<li><a href='/c{i}'>Categoría {i}</a></li>" for i in range(150))
+        # Dos de cada tres páginas traen JSON-LD; las demás sólo el texto del precio
+        jsonld = ""
+        if int(codigo[-2:]) % 3:
+            oferta = {"@type": "AggregateOffer", "lowPrice": promo, "highPrice": p, "priceCurrency": "MXN"}
+            jsonld = "<script type='application/ld+json'>" + json.dumps(
+                {"@context": "https://schema.org", "@type": "Product", "name": f"Producto {codigo}", "sku": codigo, "offers": oferta}
+            ) + "</script>"
+        return 200, (
+            f"<html><head>{jsonld}</head><body><ul>{relleno}</ul><h1 class='product_title'>Producto {codigo}</h1>"
+            f"<p class='price'>{texto}</p></body></html>"
+        )
+
+    # --- API OCC (San Pablo) ---
+    def occ(self, metodo, path, query, cuerpo):
+        if metodo == "GET" and path == "/products/search":
+            upc = digitos(query.get("query"))
+            # Algunos resultados similares antes del correcto, como en el sitio real
+            productos = [{"code": f"S{upc[:-1]}{n}", "name": f"Similar {n}"} for n in range(int(upc[-1]) % 4 if upc else 0)]
+            if existe(upc):
+                productos.append({"code": f"P{upc}", "name": f"Producto {upc}"})
+            if "ean" in query.get("fields", ""):
+                for p in productos:
+                    p["ean"] = p["code"][1:]
+            return 200, {"products": productos}
+        m = re.fullmatch(r"/products/([PS])(\d+)", path)
+        if metodo == "GET" and m:
+            detalle = {"code": m.group(1) + m.group(2), "name": f"Producto {m.group(2)}", "ean": m.group(2)}
+            if query.get("fields") == "FULL":
+                # Respuesta FULL: imágenes, clasificaciones, stock… (mucho más pesada)
+                detalle["classifications"] = [
+                    {"features": [{"name": f"Atributo {i}", "featureValues": [{"value": f"valor {i}"}]} for i in range(40)]}
+                ]
+                detalle["images"] = [{"url": f"/medias/{m.group(2)}-{i}.jpg", "format": "zoom"} for i in range(12)]
+            return 200, detalle
+        if metodo == "POST" and path == "/users/anonymous/carts":
+            guid = uuid.uuid4().hex
+            with self._lock:
+                self.carritos[guid] = []
+            return 201, {"guid": guid, "code": guid[:8]}
+        m = re.fullmatch(r"/users/anonymous/carts/(\w+)(/entries(?:/(\d+))?)?", path)
+        if not m:
+            return 404, {"errors": [{"type": "UnknownResourceError"}]}
+        guid, entries, numero = m.group(1), m.group(2), m.group(3)
+        with self._lock:
+            carrito = self.carritos.get(guid)
+            if carrito is None:
+                return 404, {"errors": [{"type": "CartError", "reason": "notFound"}]}
+            if metodo == "POST" and entries and numero is None:
+                code = (json.loads(cuerpo or b"{}").get("product") or {}).get("code", "")
+                if not existe(digitos(code)):
+                    return 400, {"errors": [{"type": "UnknownIdentifierError"}]}
+                carrito.append(code)
+                return 200, {"statusCode": "success", "entry": {"entryNumber": len(carrito) - 1}}
+            if metodo == "DELETE" and numero is not None:
+                n = int(numero)
+                if n >= len(carrito):
+                    return 400, {"errors": [{"type": "CartEntryError"}]}
+                carrito.pop(n)  # OCC renumera las entradas restantes
+                return 200, ""
+            if metodo == "DELETE" and not entries:
+                del self.carritos[guid]
+                return 200, ""
+            if metodo == "GET" and not entries:
+                return 200, {"entries": [
+                    {
+                        "entryNumber": n,
+                        "product": {"code": code, "name": f"Producto {code[1:]}"},
+                        "basePrice": {"value": precio(code[1:])},
+                        "totalPrice": {"value": precio_promocion(code[1:])},
+                    }
+                    for n, code in enumerate(carrito)
+                ]}
+        return 405, {"errors": [{"type": "MethodNotAllowed"}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=50)
+    parser.add_argument("--jitter", type=float, default=20)
+    parser.add_argument("--errores", type=float, default=0.0)
+    parser.add_argument("--tasa-429", type=float, default=0.0)
+    args = parser.parse_args()
+    config = MockConfig(args.latencia, args.jitter, args.errores, args.tasa_429)
+    with MockFarmacias(config, args.puerto) as mock:
+        print(f"Mock escuchando en {mock.url} (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
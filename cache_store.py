@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+# === 🔹 Caché persistente (SQLite) sincronizable con Blob Storage ===
+# Cada entrada vive en un "namespace" (p. ej. resoluciones UPC → código de
+# San Pablo) y guarda su valor en JSON junto con la hora de actualización.
+# Las invalidaciones se guardan como lápidas (valor NULL) para que no
+# "revivan" al combinar con la copia remota.
+#
+# Al subirla (``to_blob``) se descartan, ya combinadas con la remota, las
+# entradas más viejas que el TTL de su namespace y las lápidas de más de
+# ``LAPIDA_TTL``: para entonces todas las copias ya las combinaron.
+
+logger = logging.getLogger("cache-store")
+
+CacheEntry = namedtuple("CacheEntry", ["value", "updated_at"])
+
+DIA = 24 * 60 * 60
+LAPIDA_TTL = 30 * DIA
+
+
+class CacheStore:
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+
+    # --- Lectura / escritura ---
+    def get(self, namespace, key):
+        """Devuelve un ``CacheEntry`` o ``None`` si no existe o está invalidada."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, updated_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return CacheEntry(json.loads(row[0]), row[1])
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def invalidate(self, namespace, key):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) VALUES (?, ?, NULL, ?)",
+                (namespace, key, time.time()),
+            )
+            self._conn.commit()
+
+    def purge(self, ttls, lapidas=LAPIDA_TTL):
+        """Elimina las entradas no actualizadas en ``ttls[namespace]`` segundos y las lápidas de más de ``lapidas``.
+
+        Los namespaces sin TTL conservan sus entradas. Devuelve cuántas se eliminaron.
+        """
+        ahora = time.time()
+        with self._lock:
+            borradas = self._conn.execute(
+                "DELETE FROM cache WHERE value IS NULL AND updated_at < ?", (ahora - lapidas,)
+            ).rowcount
+            for namespace, ttl in ttls.items():
+                borradas += self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND updated_at < ?", (namespace, ahora - ttl)
+                ).rowcount
+            self._conn.commit()
+        return borradas
+
+    def merge_from(self, other_path):
+        """Combina otra base SQLite: por cada clave gana la versión más reciente."""
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS remoto", (str(other_path),))
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) "
+                    "SELECT r.namespace, r.key, r.value, r.updated_at FROM remoto.cache r "
+                    "LEFT JOIN cache l ON l.namespace = r.namespace AND l.key = r.key "
+                    "WHERE l.updated_at IS NULL OR r.updated_at > l.updated_at"
+                )
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE remoto")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Sincronización con Blob Storage ---
+    @classmethod
+    def from_blob(cls, blob_client, path):
+        """Descarga la caché desde el blob (si existe) y la abre en ``path``."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if blob_client.exists():
+                with open(path, "wb") as f:
+                    blob_client.download_blob().readinto(f)
+        except Exception as e:
+            logger.warning(f"No se pudo descargar la caché {blob_client.blob_name}: {e}")
+        try:
+            return cls(path)
+        except sqlite3.DatabaseError:
+            logger.warning(f"Caché {path} corrupta; se crea una nueva.")
+            os.remove(path)
+            return cls(path)
+
+    def to_blob(self, blob_client, intentos=5, ttls=None):
+        """Combina con la versión remota más reciente, descarta lo vencido (``purge(ttls)``) y sube el resultado.
+
+        La subida usa concurrencia optimista (ETag), como
+        ``price_diff._guardar_estado``: varios lotes e instancias sincronizan
+        la misma caché; si otro la subió entre la descarga y la subida, se
+        vuelve a combinar con esa versión y se reintenta.
+        """
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+        remote_path = self.path + ".remoto"
+        for _ in range(intentos):
+            condicion = {}
+            try:
+                if blob_client.exists():
+                    descarga = blob_client.download_blob()
+                    condicion = {"etag": descarga.properties.etag, "match_condition": MatchConditions.IfNotModified}
+                    with open(remote_path, "wb") as f:
+                        descarga.readinto(f)
+                    self.merge_from(remote_path)
+            except Exception as e:
+                logger.warning(f"No se pudo combinar con la caché remota {blob_client.blob_name}: {e}")
+            finally:
+                if os.path.exists(remote_path):
+                    os.remove(remote_path)
+            # Después de combinar: si no, la copia remota devolvería lo descartado
+            borradas = self.purge(ttls or {})
+            if borradas:
+                logger.info(f"Caché {blob_client.blob_name}: {borradas} entradas vencidas descartadas")
+
+            try:
+                with self._lock:
+                    self._conn.commit()
+                    with open(self.path, "rb") as f:
+                        blob_client.upload_blob(f, overwrite=bool(condicion), **condicion)
+                return True
+            except (ResourceModifiedError, ResourceExistsError):
+                logger.info(f"Caché {blob_client.blob_name} modificada por otra ejecución; reintentando")
+        logger.warning(f"No se pudo subir la caché {blob_client.blob_name} tras {intentos} intentos")
+        return False
@@ -0,0 +1,200 @@
+import base64
+import logging
+import threading
+import uuid
+from pathlib import Path
+
+from result_sink import AppendBlobSink, TeeSink
+
+# === 🔹 Checkpoint y reanudación de ejecuciones ===
+# Cada ejecución lógica (``run_id``, p. ej. "farmatodo_20250101") puede
+# repartirse en varias invocaciones. Cada invocación escribe sus filas en
+# una "parte" propia y registra las claves (barras / UPCs) cuyas filas ya
+# quedaron persistidas. La siguiente invocación procesa sólo las claves
+# pendientes y, cuando no queda ninguna, las partes se combinan en el CSV
+# final.
+
+logger = logging.getLogger("checkpoint")
+
+CHECKPOINT_PREFIX = "Scrapping/_checkpoints"
+PARTS_PREFIX = "Scrapping/_partes"
+
+
+class LocalCheckpointStore:
+    """Claves completadas en un archivo de texto local (una por línea)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def read(self):
+        if not self.path.exists():
+            return []
+        return self.path.read_text(encoding="utf-8").splitlines()
+
+    def append(self, keys):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{k}\n" for k in keys))
+
+    def delete(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class BlobCheckpointStore:
+    """Claves completadas en un append blob (una por línea).
+
+    Varias instancias pueden agregar claves al mismo checkpoint (trabajos por
+    cola con un ``run_id`` compartido): el blob se crea sólo si no existe
+    (``If-None-Match: *``) y nunca se vuelve a crear, porque
+    ``create_append_blob`` reemplaza el existente por uno vacío.
+    """
+
+    def __init__(self, blob_client):
+        self.blob_client = blob_client
+        self._created = False
+
+    def read(self):
+        if not self.blob_client.exists():
+            return []
+        return self.blob_client.download_blob().readall().decode("utf-8").splitlines()
+
+    def _ensure_blob(self):
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+        try:
+            self.blob_client.create_append_blob(etag="*", match_condition=MatchConditions.IfMissing)
+        except (ResourceExistsError, ResourceModifiedError):
+            pass  # ya existe: se agrega al final
+        self._created = True
+
+    def append(self, keys):
+        if not self._created:
+            self._ensure_blob()
+        self.blob_client.append_block("".join(f"{k}\n" for k in keys).encode("utf-8"))
+
+    def delete(self):
+        if self.blob_client.exists():
+            self.blob_client.delete_blob()
+        self._created = False
+
+
+class Checkpoint:
+    def __init__(self, store):
+        self.store = store
+        self.done = set(k for k in store.read() if k)
+        self._lock = threading.Lock()
+
+    def is_done(self, key):
+        return key in self.done
+
+    def pending(self, keys):
+        return [k for k in keys if k not in self.done]
+
+    def mark(self, keys):
+        keys = [k for k in keys if k not in self.done]
+        if not keys:
+            return
+        with self._lock:
+            self.store.append(keys)
+            self.done.update(keys)
+
+    def reset(self):
+        self.store.delete()
+        self.done = set()
+
+
+class BlobRun:
+    """Estado de una ejecución reanudable sobre un contenedor de Blob Storage.
+
+    ``key_column`` es la columna de las filas que identifica cada elemento
+    procesado (``Barra`` o ``UPC``).
+    """
+
+    def __init__(self, container_client, run_id, final_blob, columns, key_column,
+                 encoding="utf-8", lineterminator="\n"):
+        self.container = container_client
+        self.run_id = run_id
+        self.final_blob = final_blob
+        self.columns = columns
+        self.key_column = key_column
+        self.encoding = encoding
+        self.lineterminator = lineterminator
+        self.parts_prefix = f"{PARTS_PREFIX}/{run_id}/"
+        self.merged = False  # True si esta invocación generó el CSV final
+        self.checkpoint = Checkpoint(BlobCheckpointStore(
+            container_client.get_blob_client(f"{CHECKPOINT_PREFIX}/{run_id}.txt")
+        ))
+
+    def _parts(self):
+        return sorted(b.name for b in self.container.list_blobs(name_starts_with=self.parts_prefix))
+
+    def pending(self, keys):
+        return self.checkpoint.pending(keys)
+
+    def part_sink(self, chunk_size=100, csv=True, extra=(), name=None):
+        """Sink para la parte de esta invocación; marca el checkpoint tras cada volcado.
+
+        ``extra`` son sinks adicionales (p. ej. Parquet) que reciben las mismas
+        filas; con ``csv=False`` no se escribe la parte CSV. ``name`` fija el
+        nombre de la parte; si no, ``parte_NNN-<uuid>``: la numeración no es
+        atómica y dos invocaciones de la misma ejecución pueden tomar el
+        mismo número (como en ``ParquetSink``, el sufijo evita que una
+        reemplace la parte de la otra).
+        """
+        sinks = list(extra)
+        if csv:
+            name = name or f"parte_{len(self._parts()) + 1:03d}-{uuid.uuid4().hex[:12]}"
+            name = f"{self.parts_prefix}{name}.csv"
+            sinks.insert(0, AppendBlobSink(
+                self.container.get_blob_client(name), self.columns, chunk_size=chunk_size,
+                encoding=self.encoding, lineterminator=self.lineterminator,
+            ))
+        if not sinks:
+            raise ValueError("part_sink requiere al menos un sink (csv o extra)")
+        sink = sinks[0] if len(sinks) == 1 else TeeSink(sinks, chunk_size=chunk_size)
+        sink.on_flush = lambda rows: self.checkpoint.mark([str(r[self.key_column]) for r in rows])
+        return sink
+
+    def merge(self):
+        """Combina las partes en ``final_blob`` (un bloque por parte, un solo encabezado)."""
+        from azure.storage.blob import BlobBlock
+
+        final = self.container.get_blob_client(self.final_blob)
+        blocks = []
+        for n, name in enumerate(self._parts()):
+            data = self.container.get_blob_client(name).download_blob().readall()
+            if n > 0:
+                # Sólo la primera parte conserva BOM y encabezado
+                data = data[3:] if data.startswith(b"\xef\xbb\xbf") else data
+                data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+            if not data:
+                continue
+            block_id = base64.b64encode(f"{n:06d}".encode()).decode()
+            final.stage_block(block_id, data)
+            blocks.append(BlobBlock(block_id=block_id))
+        final.commit_block_list(blocks)
+        logger.info(f"Ejecución {self.run_id}: {len(blocks)} partes combinadas en {self.final_blob}")
+
+    def finish(self, pending):
+        """Si no quedan claves pendientes combina las partes; devuelve si la ejecución terminó."""
+        if pending:
+            return False
+        if self._parts():
+            self.merge()
+            self.cleanup()
+            self.merged = True
+        return True
+
+    def cleanup(self):
+        for name in self._parts():
+            self.container.delete_blob(name)
+
+    def reset(self, extra_prefixes=()):
+        """Descarta partes y checkpoint; ``extra_prefixes``, otras salidas de la ejecución (p. ej. Parquet)."""
+        self.cleanup()
+        for prefix in extra_prefixes:
+            for blob in self.container.list_blobs(name_starts_with=prefix):
+                self.container.delete_blob(blob.name)
+        self.checkpoint.reset()
@@ -0,0 +1,212 @@
+import logging
+import time
+
+from cache_store import DIA
+from price_extraction import extraer_farmatodo, get_extractor, precio_store_api
+from scraper_registry import COLUMNAS_SALIDA, Scraper, registrar_scraper
+
+# === 🔹 Scrapers por farmacia ===
+# Sólo la lógica propia de cada sitio (búsqueda, descarga y parseo); el
+# pool, la caché, los reintentos, la salida y las métricas los pone el
+# motor de ``scraper_registry``.
+
+logger = logging.getLogger("farmacias")
+
+# --- Cabeceras HTTP ---
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Connection": "keep-alive",
+    "Referer": "https://www.google.com/"
+}
+
+
+# =================================================================
+# 🔹 Farmacias Especializadas
+# =================================================================
+URL_CACHE_NS = "especializadas_url"
+URL_TTL_FOUND = 30 * DIA     # revalidar URLs conocidas cada 30 días
+URL_TTL_NOT_FOUND = 7 * DIA  # volver a buscar los "no encontrado" cada semana
+
+
+def url_en_cache(cache, codigo):
+    """Entrada vigente ``{"url": ...}`` (``url`` None = no encontrado) o ``None`` si hay que buscar."""
+    if cache is None:
+        return None
+    hit = cache.get(URL_CACHE_NS, codigo)
+    if not hit:
+        return None
+    ttl = URL_TTL_FOUND if hit.value.get("url") else URL_TTL_NOT_FOUND
+    if time.time() - hit.updated_at > ttl:
+        return None
+    return hit.value
+
+
+@registrar_scraper("especializadas")
+class EspecializadasScraper(Scraper):
+    origen = "Farmacias Especializadas"
+    run_id = "farmacias_especializadas_{fecha}"
+    blob_salida = "Scrapping/Farmacias_Especializadas/precios_farmacias_especializadas_{fecha}.csv"
+    max_workers = 5
+    max_workers_limite = 20
+    headers = HEADERS
+    # Caché código de barras → URL de producto y validadores HTTP
+    cache_blob = "Scrapping/_cache/especializadas.sqlite"
+    cache_local = "/tmp/cache_especializadas.sqlite"
+    cache_ttl = {URL_CACHE_NS: URL_TTL_FOUND}
+
+    BASE_URL = "https://www.farmaciasespecializadas.com/catalogsearch/result/?q="
+
+    def __init__(self, params, **kwargs):
+        super().__init__(params, **kwargs)
+        # Motor de extracción: rapido (por defecto), lxml o bs4
+        self.extractor = get_extractor(params.get("extractor") or "rapido")
+
+    def buscar_url(self, codigo):
+        """URL del producto según la búsqueda; se guarda en caché (también los "no encontrado")."""
+        resp = self.http.get(self.BASE_URL + codigo, timeout=20, stage="busqueda")
+        if resp.status_code != 200:
+            return None
+        product_url = self.parsear(self.extractor.enlace_producto, resp, stage="parseo_busqueda")
+        if self.cache:
+            self.cache.set(URL_CACHE_NS, codigo, {"url": product_url})
+        return product_url
+
+    def obtener(self, codigo):
+        try:
+            hit = url_en_cache(self.cache, codigo)
+            product_url = hit["url"] if hit else self.buscar_url(codigo)
+            if not product_url:
+                return {"Barra": codigo, "Precio": None}
+
+            # data-price-amount → itemprop=price → span.price → regex (ver price_extraction);
+            # con ETag/Last-Modified o el mismo contenido se reutiliza el precio anterior
+            status, precio = self.fetcher.fetch(product_url, self.extractor.precio, timeout=20)
+            if status == 404 and hit:
+                # El producto cambió de URL: se invalida y se vuelve a buscar
+                self.cache.invalidate(URL_CACHE_NS, codigo)
+                product_url = self.buscar_url(codigo)
+                if not product_url:
+                    return {"Barra": codigo, "Precio": None}
+                status, precio = self.fetcher.fetch(product_url, self.extractor.precio, timeout=20)
+            return {"Barra": codigo, "Precio": precio if status == 200 else None}
+
+        except Exception as e:
+            logger.warning(f"Error con código {codigo}: {e}")
+            self.metrics.count("errores")
+            return {"Barra": codigo, "Precio": None}
+
+
+# =================================================================
+# 🔹 FarmaTodo
+# =================================================================
+def etapa_estrategia(resultado):
+    """Etapa de métricas con el costo de parseo de cada estrategia."""
+    return f"parseo_{(resultado or {}).get('estrategia') or 'sin_precio'}"
+
+
+@registrar_scraper("farmatodo")
+class FarmaTodoScraper(Scraper):
+    origen = "FarmaTodo"
+    run_id = "farmatodo_{fecha}"
+    blob_salida = "Scrapping/FarmaTodo/precios_farmatodo_{fecha}.csv"
+    # Estrategia que encontró el precio: api, jsonld, variaciones, meta o texto
+    columnas = COLUMNAS_SALIDA + ["Estrategia"]
+    max_workers = 10
+    max_workers_limite = 30
+    # Validadores HTTP y precios parseados de la corrida anterior
+    cache_blob = "Scrapping/_cache/farmatodo.sqlite"
+    cache_local = "/tmp/cache_farmatodo.sqlite"
+
+    BASE_URL = "https://www.farmatodo.com.mx/"
+    # Endpoint JSON de productos de la tienda (Store API de WooCommerce)
+    STORE_API_URL = "https://www.farmatodo.com.mx/wp-json/wc/store/v1/products?sku="
+    HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+    def __init__(self, params, **kwargs):
+        super().__init__(params, **kwargs)
+        # ?api=1: consulta primero el endpoint JSON y sólo si no responde descarga la página
+        self.usar_api = params.get("api") == "1"
+
+    def precio_api(self, codigo):
+        resp = self.http.get(self.STORE_API_URL + codigo, headers=self.HEADERS, timeout=20, stage="api")
+        if resp.status_code == 404:
+            logger.warning("FarmaTodo no expone la Store API; se usa sólo la página de producto")
+            self.usar_api = False
+        if resp.status_code != 200:
+            return None
+        with self.metrics.stage("parseo_api"):
+            return precio_store_api(resp.text, codigo)
+
+    def obtener(self, codigo):
+        try:
+            if self.usar_api:
+                precio = self.precio_api(codigo)
+                if precio is not None:
+                    self.metrics.count("estrategia_api")
+                    return {"Barra": codigo, "Precio": precio, "Estrategia": "api"}
+
+            # JSON-LD → variaciones → meta → regex sobre el texto (ver price_extraction)
+            _, resultado = self.fetcher.fetch(
+                self.BASE_URL + codigo, extraer_farmatodo, headers=self.HEADERS, timeout=20, parse_stage=etapa_estrategia
+            )
+            resultado = resultado or {}
+            estrategia = resultado.get("estrategia")
+            if estrategia:
+                self.metrics.count(f"estrategia_{estrategia}")
+            return {"Barra": codigo, "Precio": resultado.get("precio"), "Estrategia": estrategia}
+        except Exception:
+            self.metrics.count("errores")
+            return {"Barra": codigo, "Precio": None, "Estrategia": None}
+
+
+# =================================================================
+# 🔹 San Pablo (por lotes: carrito OCC vía Playwright / HTTP)
+# =================================================================
+@registrar_scraper("sanpablo")
+class SanPabloScraper(Scraper):
+    origen = "San Pablo"
+    run_id = "sanpablo_{lote}_{fecha}"
+    blob_salida = "Scrapping/SanPablo/precios_{lote}_{fecha}.csv"
+    columna_clave = "UPC"
+    columnas_precio = ["Precio sin promoción", "Precio con promoción"]
+    csv_kwargs = {"encoding": "utf-8-sig", "lineterminator": "\r\n"}
+    chunk_size = 20
+    tam_shard = 100  # UPCs por shard (equivale a un upc_list_N.json)
+    usa_http = False  # transporte propio (scrapper_san_pablo)
+    # Caché UPC → código de producto
+    cache_blob = "Scrapping/_cache/san_pablo_upc.sqlite"
+    cache_local = "/tmp/cache_san_pablo_{lote}.sqlite"
+
+    @property
+    def columnas(self):
+        # Import perezoso: las otras fuentes no pagan el costo de Playwright
+        from scrapper_san_pablo import COLUMNS
+        return COLUMNS
+
+    @property
+    def cache_ttl(self):
+        from scrapper_san_pablo import UPC_CACHE_NS, UPC_TTL_FOUND
+        return {UPC_CACHE_NS: UPC_TTL_FOUND}
+
+    def procesar(self, codigos, sink, limite, semaforo=None):
+        from scrapper_san_pablo import main as scraping_san_pablo
+
+        # Concurrencia (>1 activa el modo asíncrono) y peticiones/seg por host
+        rate = self.params.get("rate")
+        scraping_san_pablo(
+            upcs=codigos,
+            sink=sink,
+            headed=False,
+            concurrency=int(self.params.get("concurrency") or 1),
+            rate=float(rate) if rate else None,
+            batch_size=int(self.params.get("batch_size") or 1),
+            cache=self.cache,
+            transport=self.params.get("transport") or "playwright",
+            deadline=limite,
+            metrics=self.metrics
+        )
+
+    def metricas(self):
+        return {"lote": self.lote}
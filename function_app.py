@@ -1,34 +1,56 @@
+import time
+_T_IMPORT = time.perf_counter()
+
 import azure.functions as func
 import logging
-import requests
-from bs4 import BeautifulSoup
 import json
 import os
-import pandas as pd
-import io
 from azure.storage.blob import BlobServiceClient
-from datetime import datetime
 import concurrent.futures
-import re
-from scrapper_san_pablo import main as scraping_san_pablo
+import threading
+import farmacias  # noqa: F401  (registra los scrapers)
+from barcode_index import BarcodeIndex, cargar_indice
+from scraper_registry import SCRAPERS, TIEMPO_MAX_S, ejecutar_scraper, repartir
+from work_queue import POISON_QUEUE_NAME, QUEUE_NAME, encolar_trabajo, procesar_mensaje, registrar_fallido
 from pathlib import Path
 
-# --- Limpieza de texto de precio ---
-def limpiar_precio(texto):
-    texto = texto.replace("$", "").replace(",", "").replace("MXN", "").replace(" ", "").strip()
-    try:
-        return float(texto)
-    except:
-        return None
+# --- Métricas de arranque en frío ---
+IMPORT_S = round(time.perf_counter() - _T_IMPORT, 3)
+_rutas_iniciadas = set()
 
-# --- Cabeceras HTTP ---
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "Connection": "keep-alive",
-    "Referer": "https://www.google.com/"
-}
+def registrar_arranque(ruta, **extra):
+    """En la primera invocación de cada ruta registra el costo de arranque en frío."""
+    if ruta in _rutas_iniciadas:
+        return None
+    _rutas_iniciadas.add(ruta)
+    arranque = {
+        "ruta": ruta,
+        "import_s": IMPORT_S,
+        "desde_import_s": round(time.perf_counter() - _T_IMPORT, 3),
+        **extra,
+    }
+    logging.info("cold_start " + json.dumps(arranque, ensure_ascii=False))
+    return arranque
+
+def respuesta_json(datos, status_code=200):
+    return func.HttpResponse(json.dumps(datos, ensure_ascii=False), mimetype="application/json", status_code=status_code)
+
+# --- Blob Storage y lista de códigos de barra ---
+CONTAINER_NAME = "farma-envios-file-system"
+
+def contenedor():
+    blob_service = BlobServiceClient.from_connection_string(os.environ["BLOB_CONNECTION"])
+    return blob_service.get_container_client(CONTAINER_NAME)
+
+def leer_codigos(container_client, params):
+    """Códigos a consultar del índice de ``codigo_barra_scrapping.csv`` (normalizados, sin duplicados).
+
+    Devuelve ``(codigos, entrada)``; ``entrada`` resume la normalización para
+    la respuesta. ``?estricto=1`` omite los de dígito verificador inválido.
+    """
+    indice = cargar_indice(container_client)
+    codigos = indice.lista(estricto=params.get("estricto") == "1")
+    return codigos, {**indice.stats, "consultados": len(codigos)}
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 __all__ = ["app"]
@@ -40,111 +62,17 @@ __all__ = ["app"]
 
 def scrapingFarmacia(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Scraping Farmacias Especializadas iniciado...')
+    arranque = registrar_arranque("scrapingFarmacia")
 
     try:
-        # --- 1. Conexión a Blob Storage ---
-        blob_connection = os.environ["BLOB_CONNECTION"]
-        container_name = "farma-envios-file-system"
-        blob_name_in = "codigo_barra_scrapping.csv"
-
-        blob_service = BlobServiceClient.from_connection_string(blob_connection)
-        blob_client_in = blob_service.get_blob_client(container=container_name, blob=blob_name_in)
-
-        # --- 2. Leer CSV de entrada desde blob ---
-        stream = blob_client_in.download_blob()
-        df = pd.read_csv(stream)
-        codigos = df["Barra"].astype(str).tolist()
-        BASE_URL = "https://www.farmaciasespecializadas.com/catalogsearch/result/?q="
-
-        # --- 3. Función para obtener precio de un producto ---
-        def obtener_precio(codigo):
-            try:
-                search_url = BASE_URL + codigo
-                resp = requests.get(search_url, headers=HEADERS, timeout=20)
-                if resp.status_code != 200:
-                    return {"Barra": codigo, "Precio": None}
-
-                soup = BeautifulSoup(resp.text, "html.parser")
-                link_producto = soup.find("a", class_="product-item-link")
-                if link_producto and link_producto.get("href"):
-                    product_url = link_producto["href"]
-                else:
-                    return {"Barra": codigo, "Precio": None}
-
-                resp2 = requests.get(product_url, headers=HEADERS, timeout=20)
-                if resp2.status_code != 200:
-                    return {"Barra": codigo, "Precio": None}
-
-                soup2 = BeautifulSoup(resp2.text, "html.parser")
-
-                # 1. data-price-amount
-                tag = soup2.find("span", attrs={"data-price-amount": True})
-                if tag:
-                    return {"Barra": codigo, "Precio": float(tag["data-price-amount"])}
-
-                # 2. itemprop="price"
-                meta_price = soup2.find("meta", itemprop="price")
-                if meta_price and meta_price.get("content"):
-                    return {"Barra": codigo, "Precio": limpiar_precio(meta_price["content"])}
-
-                # 3. Clases comunes
-                tag = soup2.find("span", class_="price")
-                if tag:
-                    return {"Barra": codigo, "Precio": limpiar_precio(tag.get_text(strip=True))}
-
-                tag = soup2.find("span", class_="special-price")
-                if tag:
-                    return {"Barra": codigo, "Precio": limpiar_precio(tag.get_text(strip=True))}
-
-                # 4. Fallback con regex
-                match = re.search(r"\$\s?[\d\.,]+", soup2.text)
-                if match:
-                    return {"Barra": codigo, "Precio": limpiar_precio(match.group())}
-
-                return {"Barra": codigo, "Precio": None}
-
-            except Exception as e:
-                logging.warning(f"Error con código {codigo}: {e}")
-                return {"Barra": codigo, "Precio": None}
-
-        # --- 4. Ejecutar scraping concurrente ---
-        resultados = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futuros = {executor.submit(obtener_precio, c): c for c in codigos}
-            for future in concurrent.futures.as_completed(futuros):
-                resultados.append(future.result())
-
-        # --- 5. Generar DataFrame de salida ---
-        df_out = pd.DataFrame(resultados, columns=["Barra", "Precio"])
-        df_out["Fecha"] = datetime.now().strftime("%Y-%m-%d")
-        df_out["Origen"] = "Farmacias Especializadas"
-
-        # --- 6. Exportar CSV al blob ---
-        csv_buffer = io.StringIO()
-        df_out.to_csv(csv_buffer, index=False)
-        blob_name_out = f"Scrapping/Farmacias_Especializadas/precios_farmacias_especializadas_{datetime.now().strftime('%Y%m%d')}.csv"
-
-        blob_client_out = blob_service.get_blob_client(container=container_name, blob=blob_name_out)
-        blob_client_out.upload_blob(csv_buffer.getvalue(), overwrite=True)
-
-        # --- 7. Retornar respuesta ---
-        return func.HttpResponse(
-            json.dumps({
-                "status": "ok",
-                "mensaje": f"Archivo {blob_name_out} generado en contenedor {container_name}",
-                "registros": len(resultados)
-            }, ensure_ascii=False),
-            mimetype="application/json",
-            status_code=200
-        )
+        container = contenedor()
+        codigos, entrada = leer_codigos(container, req.params)
+        resultado = ejecutar_scraper("especializadas", req.params, container, codigos)
+        return respuesta_json({**resultado, "entrada": entrada, **({"arranque": arranque} if arranque else {})})
 
     except Exception as e:
         logging.error(f"Error en scrapingFarmacia: {e}", exc_info=True)
-        return func.HttpResponse(
-            json.dumps({"status": "error", "mensaje": str(e)}),
-            mimetype="application/json",
-            status_code=500
-        )
+        return respuesta_json({"status": "error", "mensaje": str(e)}, status_code=500)
 
 # =================================================================
 # 🔹 Scraping FarmaTodo
@@ -152,82 +80,17 @@ def scrapingFarmacia(req: func.HttpRequest) -> func.HttpResponse:
 @app.route(route="scrapingFarmaTodo")
 def scrapingFarmaTodo(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Scraping FarmaTodo iniciado...')
+    arranque = registrar_arranque("scrapingFarmaTodo")
 
     try:
-        blob_connection = os.environ["BLOB_CONNECTION"]
-        container_name = "farma-envios-file-system"
-        blob_name_in = "codigo_barra_scrapping.csv"
-
-        blob_service = BlobServiceClient.from_connection_string(blob_connection)
-
-        blob_client_in = blob_service.get_blob_client(container=container_name, blob=blob_name_in)
-        stream = blob_client_in.download_blob()
-        df = pd.read_csv(stream)
-
-        codigos = df["Barra"].astype(str).tolist()
-        BASE_URL = "https://www.farmatodo.com.mx/"
-
-        def obtener_precio(codigo):
-            url = BASE_URL + codigo
-            headers = {"User-Agent": "Mozilla/5.0"}
-            try:
-                resp = requests.get(url, headers=headers, timeout=20)
-                if resp.status_code != 200:
-                    return {"Barra": codigo, "Precio": None}
-
-                soup = BeautifulSoup(resp.text, "html.parser")
-                texto = soup.get_text()
-
-                # Buscar rango tipo $122.00–$130.00
-                match = re.search(r"\$[0-9\.,]+\s*–\s*\$[0-9\.,]+", texto)
-                if match:
-                    rango = match.group(0)
-                    minimo = rango.split("–")[0]
-                    return {"Barra": codigo, "Precio": limpiar_precio(minimo)}
-
-                # Fallback: precio único
-                unico = re.search(r"\$([0-9\.,]+)", texto)
-                if unico:
-                    return {"Barra": codigo, "Precio": limpiar_precio(unico.group(1))}
-
-                return {"Barra": codigo, "Precio": None}
-            except Exception:
-                return {"Barra": codigo, "Precio": None}
-
-        resultados = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futuros = {executor.submit(obtener_precio, c): c for c in codigos}
-            for future in concurrent.futures.as_completed(futuros):
-                resultados.append(future.result())
-
-        df_out = pd.DataFrame(resultados, columns=["Barra", "Precio"])
-        df_out["Fecha"] = datetime.now().strftime("%Y-%m-%d")
-        df_out["Origen"] = "FarmaTodo"
-
-        csv_buffer = io.StringIO()
-        df_out.to_csv(csv_buffer, index=False)
-
-        blob_name_out = f"Scrapping/FarmaTodo/precios_farmatodo_{datetime.now().strftime('%Y%m%d')}.csv"
-        blob_client_out = blob_service.get_blob_client(container=container_name, blob=blob_name_out)
-        blob_client_out.upload_blob(csv_buffer.getvalue(), overwrite=True)
-
-        return func.HttpResponse(
-            json.dumps({
-                "status": "ok",
-                "mensaje": f"Archivo {blob_name_out} generado en contenedor {container_name}",
-                "registros": len(resultados)
-            }, ensure_ascii=False),
-            mimetype="application/json",
-            status_code=200
-        )
+        container = contenedor()
+        codigos, entrada = leer_codigos(container, req.params)
+        resultado = ejecutar_scraper("farmatodo", req.params, container, codigos)
+        return respuesta_json({**resultado, "entrada": entrada, **({"arranque": arranque} if arranque else {})})
 
     except Exception as e:
         logging.error(f"Error en scrapingFarmaTodo: {e}", exc_info=True)
-        return func.HttpResponse(
-            json.dumps({"status": "error", "mensaje": str(e)}),
-            mimetype="application/json",
-            status_code=500
-        )
+        return respuesta_json({"status": "error", "mensaje": str(e)}, status_code=500)
     
 # =================================================================
 # 🔹 Scraping SanPablo
@@ -236,45 +99,191 @@ def scrapingFarmaTodo(req: func.HttpRequest) -> func.HttpResponse:
 def scrapingSanPablo(req: func.HttpRequest) -> func.HttpResponse:
     
     logging.info('Scraping Farmacia San Pablo iniciado...')
+    t0 = time.perf_counter()
 
     try:
-        # Leer el nombre del JSON a procesar (viene del pipeline)
-        upc_path = req.params.get("upc_path") or "upc_list.json"
-        logging.info(f"Procesando lote: {upc_path}")
+        # Import perezoso: las otras rutas no pagan el costo de Playwright
+        from scrapper_san_pablo import PROVISION_STATS, load_upcs
+        import_san_pablo_s = round(time.perf_counter() - t0, 3)
+
+        container = contenedor()
+        if req.params.get("shard"):
+            # Shard N del índice compartido (mismos códigos que las demás rutas)
+            n = int(req.params["shard"])
+            indice = cargar_indice(container)
+            upcs = indice.shard(n, int(req.params.get("tam_shard") or SCRAPERS["sanpablo"].tam_shard),
+                                estricto=req.params.get("estricto") == "1")
+            lote = upc_path = f"indice_{n:02d}"
+        else:
+            # JSON del lote (viene del pipeline), normalizado y sin duplicados
+            upc_path = req.params.get("upc_path") or "upc_list.json"
+            indice = BarcodeIndex.desde_valores(load_upcs(upc_path))
+            upcs = indice.lista(estricto=req.params.get("estricto") == "1")
+            lote = Path(upc_path).stem
+        logging.info(f"Procesando lote: {upc_path} ({len(upcs)} UPCs)")
+
+        resultado = ejecutar_scraper("sanpablo", req.params, container, upcs, lote=lote)
+
+        arranque = registrar_arranque(
+            "scrapingSanPablo",
+            import_modulo_s=import_san_pablo_s,
+            chromium_s=PROVISION_STATS["chromium_s"],
+            chromium_instalado=PROVISION_STATS["chromium_instalado"],
+        )
+        return respuesta_json({
+            **resultado, "lote": upc_path, "entrada": {**indice.stats, "consultados": len(upcs)},
+            **({"arranque": arranque} if arranque else {})
+        })
 
-        out_csv = f"/tmp/salida_{Path(upc_path).stem}.csv"
+    except Exception as e:
+        logging.error(f"Error en scrapingSanPablo: {e}", exc_info=True)
+        return respuesta_json({"status": "error", "mensaje": str(e)}, status_code=500)
 
-        scraping_san_pablo(
-            upc_path=upc_path,
-            out_csv=out_csv,
-            headed=False
-        )
+# =================================================================
+# 🔹 Orquestador: todas las farmacias en una sola invocación
+# =================================================================
+MAX_CONEXIONES = 15        # peticiones simultáneas compartidas por las fuentes HTTP
+SHARDS_PARALELOS = 3       # shards (p. ej. navegadores de San Pablo) a la vez
+
+@app.route(route="scrapingTodo")
+def scrapingTodo(req: func.HttpRequest) -> func.HttpResponse:
+    """Lee la lista de códigos una vez y ejecuta todas las fuentes registradas en paralelo.
+
+    ``?fuentes=especializadas,farmatodo,sanpablo`` elige las fuentes,
+    ``?max_conexiones=`` limita las peticiones simultáneas de las fuentes
+    HTTP y las fuentes con ``tam_shard`` (San Pablo) se reparten en shards
+    de ``?tam_shard=`` códigos, de los que corren ``?shards_paralelos=`` a
+    la vez. Todas comparten el mismo tiempo límite; lo que no alcance queda
+    pendiente en el checkpoint de cada fuente / shard y se reanuda al volver
+    a invocar.
+    """
+    logging.info('Orquestador de scraping iniciado...')
+    arranque = registrar_arranque("scrapingTodo")
+    t0 = time.monotonic()
 
-        # Subir a blob
-        blob_connection = os.environ["BLOB_CONNECTION"]
-        container_name = "farma-envios-file-system"
-        blob_service = BlobServiceClient.from_connection_string(blob_connection)
-        blob_name_out = f"Scrapping/SanPablo/precios_{Path(upc_path).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-        blob_client_out = blob_service.get_blob_client(container=container_name, blob=blob_name_out)
-        with open(out_csv, "rb") as data:
-            blob_client_out.upload_blob(data, overwrite=True)
-
-        os.remove(out_csv)
-
-        return func.HttpResponse(
-            json.dumps({
-                "status": "ok",
-                "mensaje": f"Lote {upc_path} procesado correctamente. Archivo {blob_name_out} subido."
-            }, ensure_ascii=False),
-            mimetype="application/json",
-            status_code=200
-        )
+    try:
+        fuentes = [f.strip() for f in (req.params.get("fuentes") or ",".join(SCRAPERS)).split(",") if f.strip()]
+        desconocidas = set(fuentes) - set(SCRAPERS)
+        if desconocidas:
+            raise ValueError(f"Fuentes desconocidas: {', '.join(sorted(desconocidas))}. Opciones: {', '.join(SCRAPERS)}")
+
+        # Cada fuente / shard usa su propio run_id
+        params = {k: v for k, v in req.params.items() if k != "run_id"}
+        limite = t0 + float(req.params.get("tiempo_max") or TIEMPO_MAX_S)
+        semaforo = threading.BoundedSemaphore(int(req.params.get("max_conexiones") or MAX_CONEXIONES))
+        shards_paralelos = int(req.params.get("shards_paralelos") or SHARDS_PARALELOS)
+
+        # --- Una sola conexión y una sola lectura de la lista de códigos ---
+        container = contenedor()
+        codigos, entrada = leer_codigos(container, req.params)
+        logging.info(f"Orquestador: {len(codigos)} códigos, fuentes {fuentes}")
+
+        tareas, shards_tareas = {}, {}
+        for clave in fuentes:
+            cls = SCRAPERS[clave]
+            if cls.tam_shard is None:
+                tareas[cls.origen] = (
+                    lambda p, clave=clave: ejecutar_scraper(clave, p, container, codigos, semaforo=semaforo)
+                )
+                continue
+            shards = repartir(codigos, int(req.params.get("tam_shard") or cls.tam_shard))
+            for i, shard in enumerate(shards, 1):
+                shards_tareas[f"{cls.origen} {i}/{len(shards)}"] = (
+                    lambda p, clave=clave, shard=shard, i=i: ejecutar_scraper(clave, p, container, shard, lote=f"todo_{i:02d}")
+                )
+
+        def ejecutar(nombre, tarea):
+            # Los shards que arrancan tarde sólo disponen del tiempo restante
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return {"status": "parcial", "mensaje": "Sin tiempo restante; se procesará en la siguiente invocación"}
+            try:
+                resultado = tarea({**params, "tiempo_max": str(restante)})
+            except Exception as e:
+                logging.error(f"Orquestador: error en {nombre}: {e}", exc_info=True)
+                resultado = {"status": "error", "mensaje": str(e)}
+            logging.info(
+                f"Orquestador: {nombre} → {resultado['status']} "
+                f"({resultado.get('registros', 0)} registros, {resultado.get('pendientes', '-')} pendientes, {resultado.get('duracion_s', '-')} s)"
+            )
+            return resultado
+
+        # Las fuentes sin shards se envían primero; los shards ocupan
+        # ``shards_paralelos`` hilos y el resto espera en la cola del executor
+        hilos = len(tareas) + min(len(shards_tareas), shards_paralelos)
+        tareas.update(shards_tareas)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, hilos)) as executor:
+            futuros = {nombre: executor.submit(ejecutar, nombre, tarea) for nombre, tarea in tareas.items()}
+            resultados = {nombre: f.result() for nombre, f in futuros.items()}
+
+        estados = {r["status"] for r in resultados.values()}
+        estado = "error" if "error" in estados else "parcial" if "parcial" in estados else "ok"
+        return respuesta_json({
+            "status": estado,
+            "codigos": len(codigos),
+            "entrada": entrada,
+            "duracion_s": round(time.monotonic() - t0, 1),
+            "fuentes": resultados,
+            **({"arranque": arranque} if arranque else {})
+        })
 
     except Exception as e:
-        logging.error(f"Error en scrapingSanPablo: {e}", exc_info=True)
-        return func.HttpResponse(
-            json.dumps({"status": "error", "mensaje": str(e)}),
-            mimetype="application/json",
-            status_code=500
-        )
+        logging.error(f"Error en scrapingTodo: {e}", exc_info=True)
+        return respuesta_json({"status": "error", "mensaje": str(e)}, status_code=500)
+
+# =================================================================
+# 🔹 Trabajo distribuido por cola (work_queue.py)
+# =================================================================
+def cola_lotes():
+    """Cola ``scraping-lotes`` en la cuenta de ``AzureWebJobsStorage`` (la misma que lee el trigger)."""
+    from azure.core.exceptions import ResourceExistsError
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    # El queue trigger espera mensajes en base64
+    cola = QueueClient.from_connection_string(
+        os.environ["AzureWebJobsStorage"], QUEUE_NAME, message_encode_policy=TextBase64EncodePolicy()
+    )
+    try:
+        cola.create_queue()
+    except ResourceExistsError:
+        pass
+    return cola
+
+@app.route(route="encolarScraping")
+def encolarScraping(req: func.HttpRequest) -> func.HttpResponse:
+    """Publica los códigos pendientes de cada fuente en la cola, en lotes de ``?tam_lote=``.
+
+    ``?fuentes=`` elige las fuentes (todas por defecto). El resto de los
+    parámetros (``run_id``, ``formato``, ``rate``…) viaja en cada mensaje.
+    """
+    logging.info('Encolando scraping por lotes...')
+    try:
+        fuentes = [f.strip() for f in (req.params.get("fuentes") or ",".join(SCRAPERS)).split(",") if f.strip()]
+        params = {k: v for k, v in req.params.items() if k not in ("fuentes", "tam_lote", "estricto")}
+        container = contenedor()
+        codigos, entrada = leer_codigos(container, req.params)
+        cola = cola_lotes()
+        trabajos = [
+            encolar_trabajo(cola, container, clave, codigos, tam_lote=req.params.get("tam_lote"), params=params)
+            for clave in fuentes
+        ]
+        return respuesta_json({"status": "ok", "cola": QUEUE_NAME, "entrada": entrada, "trabajos": trabajos})
+
+    except Exception as e:
+        logging.error(f"Error en encolarScraping: {e}", exc_info=True)
+        return respuesta_json({"status": "error", "mensaje": str(e)}, status_code=500)
+
+@app.queue_trigger(arg_name="msg", queue_name=QUEUE_NAME, connection="AzureWebJobsStorage")
+def procesarLote(msg: func.QueueMessage) -> None:
+    """Un lote por invocación; si lanza, el host reintenta el mensaje (y tras maxDequeueCount va a poison)."""
+    registrar_arranque("procesarLote")
+    resultado = procesar_mensaje(contenedor(), msg.get_body().decode("utf-8"), msg.dequeue_count or 1)
+    logging.info(
+        f"Lote {resultado['lote']} de {resultado['run_id']}: {resultado['registros']} registros, "
+        f"trabajo {resultado['trabajo']['status']}"
+    )
+
+@app.queue_trigger(arg_name="msg", queue_name=POISON_QUEUE_NAME, connection="AzureWebJobsStorage")
+def loteFallido(msg: func.QueueMessage) -> None:
+    resultado = registrar_fallido(contenedor(), msg.get_body().decode("utf-8"))
+    logging.info(f"Trabajo {resultado['run_id']}: {resultado['status']}")
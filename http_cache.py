@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import threading
+
+from cache_store import DIA
+from metrics import NULL_METRICS
+from parse_pool import parsear
+
+# === 🔹 Descarga condicional de páginas de producto ===
+# Guarda por URL los validadores HTTP (ETag / Last-Modified), el hash del
+# contenido y el resultado ya parseado (p. ej. el precio). En la siguiente
+# corrida envía If-None-Match / If-Modified-Since: con un 304, o si el
+# contenido descargado tiene el mismo hash, se reutiliza el resultado
+# anterior sin volver a parsear. Con ``pool`` (``parse_pool.ParsePool``) el
+# parseo corre en otro proceso.
+
+logger = logging.getLogger("http-cache")
+
+HTTP_CACHE_NS = "http"
+HTTP_CACHE_TTL = 30 * DIA  # URLs que no se volvieron a pedir en 30 días
+
+
+def _parser_id(parse):
+    return f"{getattr(parse, '__module__', '')}.{getattr(parse, '__qualname__', repr(parse))}"
+
+
+class ConditionalFetcher:
+    def __init__(self, http, cache, namespace=HTTP_CACHE_NS, metrics=None, pool=None):
+        self.http = http
+        self.cache = cache
+        self.pool = pool
+        self.namespace = namespace
+        self.metrics = metrics or getattr(http, "metrics", NULL_METRICS)
+        self.stats = {"304": 0, "sin_cambios": 0, "parseadas": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def fetch(self, url, parse, headers=None, timeout=20, stage="pagina", parse_stage=None):
+        """Descarga ``url`` y devuelve ``(status, parse(html))``, reutilizando el resultado si no cambió.
+
+        ``parse_stage(resultado)`` da una etapa adicional para el tiempo de
+        parseo (p. ej. por estrategia de extracción).
+        """
+        parser = _parser_id(parse)
+        hit = self.cache.get(self.namespace, url) if self.cache else None
+        previo = hit.value if hit and hit.value.get("parser") == parser else None
+
+        condicionales = {}
+        if previo and previo.get("etag"):
+            condicionales["If-None-Match"] = previo["etag"]
+        if previo and previo.get("last_modified"):
+            condicionales["If-Modified-Since"] = previo["last_modified"]
+
+        resp = self.http.get(url, headers={**(headers or {}), **condicionales}, timeout=timeout, stage=stage)
+        if resp.status_code == 304 and previo:
+            self._count("304")
+            self._store(url, previo)  # renueva la antigüedad de la entrada
+            return 200, previo["resultado"]
+        if resp.status_code != 200:
+            return resp.status_code, None
+
+        digest = hashlib.sha256(resp.content).hexdigest()
+        if previo and previo.get("hash") == digest:
+            self._count("sin_cambios")
+            resultado = previo["resultado"]
+        else:
+            self._count("parseadas")
+            resultado, segundos = parsear(self.pool, parse, resp)
+            self.metrics.observe("parseo", segundos)
+            if parse_stage:
+                self.metrics.observe(parse_stage(resultado), segundos)
+
+        self._store(url, {
+            "parser": parser,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "hash": digest,
+            "resultado": resultado,
+        })
+        return 200, resultado
+
+    def _store(self, url, value):
+        if self.cache:
+            self.cache.set(self.namespace, url, value)
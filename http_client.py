@@ -0,0 +1,343 @@
+import json
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import NULL_METRICS
+
+try:  # httpx es opcional: habilita HTTP/2 y el modo asíncrono sin navegador
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = httpx is not None
+except ImportError:  # pragma: no cover
+    HTTP2 = False
+
+logger = logging.getLogger("http-client")
+
+# === 🔹 Transporte HTTP sin navegador ===
+# Implementa el subconjunto de ``APIRequestContext`` de Playwright que usan
+# ``OCC`` y ``Cart`` (get/post/delete con ``params``, ``data``, ``headers`` y
+# ``timeout`` en milisegundos), sobre un cliente con keep-alive y pool de
+# conexiones.
+
+
+class HttpResponse:
+    """Respuesta con la misma interfaz que ``APIResponse`` (sync)."""
+
+    def __init__(self, resp):
+        self._resp = resp
+        self.status = resp.status_code
+        self.ok = 200 <= resp.status_code < 300
+        self.headers = resp.headers
+
+    def json(self):
+        return self._resp.json()
+
+    def text(self):
+        return self._resp.text
+
+    def body(self):
+        return self._resp.content
+
+
+class AsyncHttpResponse(HttpResponse):
+    """Respuesta con la misma interfaz que ``APIResponse`` (async)."""
+
+    async def json(self):
+        return json.loads(self._resp.content)
+
+    async def text(self):
+        return self._resp.text
+
+    async def body(self):
+        return self._resp.content
+
+
+class HttpTransport:
+    """Cliente HTTP síncrono: httpx (HTTP/2) si está disponible, si no ``requests.Session``."""
+
+    def __init__(self, headers=None, pool_size=10):
+        self.headers = dict(headers or {})
+        if httpx is not None:
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            self._client = httpx.Client(http2=HTTP2, limits=limits, headers=self.headers, follow_redirects=True)
+        else:
+            self._client = build_session(pool_size, self.headers)
+
+    def _send(self, method, url, params=None, data=None, headers=None, timeout=15000):
+        body = {"content": data} if httpx is not None else {"data": data}
+        resp = self._client.request(method, url, params=params, headers=headers, timeout=timeout / 1000, **body)
+        return HttpResponse(resp)
+
+    def get(self, url, **kwargs):
+        return self._send("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._send("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._send("DELETE", url, **kwargs)
+
+    def close(self):
+        self._client.close()
+
+
+class AsyncHttpTransport:
+    """Cliente HTTP asíncrono sobre ``httpx.AsyncClient`` (requiere httpx)."""
+
+    def __init__(self, headers=None, pool_size=10):
+        if httpx is None:
+            raise RuntimeError("El transporte HTTP asíncrono requiere httpx")
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._client = httpx.AsyncClient(http2=HTTP2, limits=limits, headers=dict(headers or {}), follow_redirects=True)
+
+    async def _send(self, method, url, params=None, data=None, headers=None, timeout=15000):
+        resp = await self._client.request(
+            method, url, params=params, content=data, headers=headers, timeout=timeout / 1000
+        )
+        return AsyncHttpResponse(resp)
+
+    async def get(self, url, **kwargs):
+        return await self._send("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self._send("POST", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self._send("DELETE", url, **kwargs)
+
+    async def dispose(self):
+        await self._client.aclose()
+
+
+# === 🔹 Sesión compartida para los scrapers basados en requests ===
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def build_session(pool_size=10, headers=None):
+    """``requests.Session`` con un pool de conexiones por host de ``pool_size``."""
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def retry_after_seconds(resp):
+    """Segundos indicados por ``Retry-After`` (entero o fecha HTTP), o ``None``."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class HostRateLimiter:
+    """Espaciado mínimo entre peticiones hacia un mismo host (thread-safe)."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class AdaptiveLimiter:
+    """Límite de peticiones simultáneas hacia un host con control AIMD.
+
+    Cada ``limit`` respuestas sanas seguidas (sin error y con latencia bajo
+    ``latency_factor`` veces la línea base) el límite sube en 1; un 429,
+    5xx, timeout o error de conexión lo multiplica por ``decrease``, como
+    mucho una vez por ``cooldown`` segundos para no desplomarlo con las
+    respuestas de una misma ráfaga.
+    """
+
+    def __init__(self, initial=5, minimum=1, maximum=30, decrease=0.5, latency_factor=2.0, cooldown=1.0):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.peak = int(self.limit)
+        self.decreases = 0
+        self._healthy = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, ok, latency=None):
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self._on_success(latency)
+            else:
+                self._on_congestion()
+            self._cond.notify_all()
+
+    def _on_success(self, latency):
+        if latency is not None:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                # La línea base sube despacio si el sitio se vuelve más lento de forma sostenida
+                self._baseline += (latency - self._baseline) * 0.05
+            if latency > self.latency_factor * self._baseline:
+                self._healthy = 0
+                return
+        self._healthy += 1
+        if self._healthy >= int(self.limit) and self.limit < self.maximum:
+            self.limit += 1
+            self.peak = max(self.peak, int(self.limit))
+            self._healthy = 0
+
+    def _on_congestion(self):
+        self._healthy = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, int(self.limit * self.decrease))
+        self.decreases += 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "limite": int(self.limit),
+                "maximo_alcanzado": self.peak,
+                "reducciones": self.decreases,
+                "latencia_base_s": round(self._baseline, 3) if self._baseline is not None else None,
+            }
+
+
+class HostConcurrency:
+    """Un ``AdaptiveLimiter`` por host (thread-safe)."""
+
+    def __init__(self, initial=5, minimum=1, maximum=30, **kwargs):
+        self.kwargs = dict(initial=initial, minimum=minimum, maximum=maximum, **kwargs)
+        self.maximum = maximum
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def limiter(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = AdaptiveLimiter(**self.kwargs)
+            return self._hosts[host]
+
+    def snapshot(self):
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: lim.snapshot() for host, lim in hosts.items()}
+
+
+class ScraperHttp:
+    """Cliente HTTP compartido por los workers de una ruta.
+
+    Reutiliza conexiones (keep-alive), limita las peticiones por host y
+    reintenta 429/5xx y errores de conexión con backoff exponencial con
+    jitter, respetando ``Retry-After``. Con ``concurrency`` (un
+    ``HostConcurrency``) las peticiones simultáneas por host se ajustan
+    según las respuestas del sitio. Con ``metrics`` (``metrics.Metrics``)
+    registra la latencia de cada intento por etapa y host.
+    """
+
+    def __init__(self, pool_size=10, headers=None, retries=3, backoff=0.5, max_backoff=30.0, rate=None, concurrency=None, metrics=None):
+        if concurrency is not None:
+            pool_size = max(pool_size, concurrency.maximum)
+        self.session = build_session(pool_size, headers)
+        self.limiter = HostRateLimiter(rate)
+        self.concurrency = concurrency
+        self.metrics = metrics or NULL_METRICS
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_count = 0
+        self._lock = threading.Lock()
+
+    def _delay(self, attempt, resp=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        wait = retry_after_seconds(resp) if resp is not None else None
+        if wait is not None:
+            delay = max(delay, min(wait, self.max_backoff))
+        return delay
+
+    def _send(self, url, headers, timeout):
+        if self.concurrency is None:
+            return self.session.get(url, headers=headers, timeout=timeout)
+        limiter = self.concurrency.limiter(url)
+        limiter.acquire()
+        t0 = time.monotonic()
+        ok = False
+        try:
+            resp = self.session.get(url, headers=headers, timeout=timeout)
+            ok = resp.status_code not in RETRY_STATUS
+            return resp
+        finally:
+            limiter.release(ok, time.monotonic() - t0 if ok else None)
+
+    def get(self, url, headers=None, timeout=20, stage="http"):
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(url)
+            self.metrics.count("peticiones")
+            try:
+                with self.metrics.stage(stage, host):
+                    resp = self._send(url, headers, timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.count("errores_conexion")
+                if attempt == self.retries:
+                    raise
+                delay = self._delay(attempt)
+                logger.debug(f"Reintento {attempt + 1} de {url} en {delay:.1f}s: {e}")
+            else:
+                if resp.status_code != 200:
+                    self.metrics.count(f"http_{resp.status_code}")
+                if resp.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return resp
+                delay = self._delay(attempt, resp)
+                logger.debug(f"Reintento {attempt + 1} de {url} en {delay:.1f}s: HTTP {resp.status_code}")
+            with self._lock:
+                self.retry_count += 1
+            self.metrics.count("reintentos")
+            with self.metrics.stage("espera_reintento"):
+                time.sleep(delay)
+
+    def close(self):
+        self.session.close()
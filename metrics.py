@@ -0,0 +1,191 @@
+import cProfile
+import io
+import json
+import logging
+import math
+import os
+import pstats
+import tempfile
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# === 🔹 Instrumentación de ejecuciones ===
+# ``Metrics`` acumula latencias por etapa (búsqueda, detalle, carrito,
+# parseo, volcado a blob…) y por host en histogramas de cubetas
+# logarítmicas (memoria constante), más contadores (peticiones, reintentos,
+# encontrados / no encontrados / errores). ``snapshot()`` va en la respuesta
+# JSON y ``log_event()`` lo emite como evento estructurado para Application
+# Insights. ``Profiler`` es el volcado opcional de cProfile (``?perfil=1``).
+
+logger = logging.getLogger("metrics")
+
+
+class Histogram:
+    """Histograma de latencias con cubetas logarítmicas (1 ms × 1.25^k)."""
+
+    BASE = 0.001
+    FACTOR = 1.25
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        i = 0 if seconds <= self.BASE else math.ceil(math.log(seconds / self.BASE, self.FACTOR))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Cota superior de la cubeta que contiene el percentil ``q`` (0–1)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        acumulado = 0
+        for i in sorted(self.buckets):
+            acumulado += self.buckets[i]
+            if acumulado >= rank:
+                return min(self.BASE * self.FACTOR ** i, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "n": self.count,
+            "total_s": round(self.total, 3),
+            "p50_ms": round(self.percentile(0.5) * 1000, 1),
+            "p95_ms": round(self.percentile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.stages = {}
+        self.hosts = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, host=None):
+        with self._lock:
+            self.stages.setdefault(stage, Histogram()).add(seconds)
+            if host:
+                self.hosts.setdefault(host, Histogram()).add(seconds)
+
+    @contextmanager
+    def stage(self, name, host=None):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - t0, host)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def results(self, rows, price_columns):
+        """Cuenta filas con precio (``encontrados``) y sin precio (``no_encontrados``)."""
+        encontrados = sum(1 for r in rows if any(r.get(c) not in (None, "", "-") for c in price_columns))
+        self.count("encontrados", encontrados)
+        self.count("no_encontrados", len(rows) - encontrados)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "etapas": {k: h.summary() for k, h in sorted(self.stages.items())},
+                "hosts": {k: h.summary() for k, h in sorted(self.hosts.items())},
+                "contadores": dict(sorted(self.counters.items())),
+            }
+
+    def log_event(self, evento, **extra):
+        logger.info(f"{evento} " + json.dumps({**extra, **self.snapshot()}, ensure_ascii=False))
+
+
+class NullMetrics:
+    """Sustituto sin costo cuando no se instrumenta."""
+
+    def observe(self, stage, seconds, host=None):
+        pass
+
+    @contextmanager
+    def stage(self, name, host=None):
+        yield
+
+    def count(self, name, n=1):
+        pass
+
+    def results(self, rows, price_columns):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Profiler:
+    """cProfile opcional.
+
+    En Python < 3.12 cProfile sólo perfila el hilo que lo activa: ``call``
+    usa un perfil por hilo y ``stats`` los combina. En 3.12+ el primer
+    perfil activo cubre todos los hilos y los demás ``call`` lo reutilizan.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, **kwargs):
+        if getattr(self._local, "active", False):
+            return fn(*args, **kwargs)
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError:  # otro perfil ya activo (3.12+): ya cubre este hilo
+            return fn(*args, **kwargs)
+        self._local.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+
+    def stats(self):
+        with self._lock:
+            profiles = [p for p in self._profiles if p.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for p in profiles[1:]:
+            stats.add(p)
+        return stats
+
+    def top(self, n=25):
+        stats = self.stats()
+        if stats is None:
+            return ""
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(n)
+        return out.getvalue()
+
+    def dump(self):
+        """Estadísticas en formato ``.prof`` (``pstats`` / snakeviz)."""
+        stats = self.stats()
+        if stats is None:
+            return b""
+        fd, path = tempfile.mkstemp(suffix=".prof")
+        os.close(fd)
+        try:
+            stats.dump_stats(path)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
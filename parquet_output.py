@@ -0,0 +1,112 @@
+import io
+import logging
+import uuid
+from datetime import datetime
+
+try:  # pyarrow es opcional: sólo se necesita con ?formato=parquet|ambos
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+from price_diff import slug
+from result_sink import ResultSink
+
+# === 🔹 Salida Parquet con esquema unificado ===
+# Las tres farmacias escriben el mismo esquema tipado: precios float (null
+# en lugar de "-" o vacío) y fecha de captura como timestamp. Los archivos
+# se particionan estilo Hive por fuente y día:
+#
+#   Scrapping/parquet/fuente=farmatodo/fecha=2025-01-01/<run_id>-<uuid>.parquet
+#
+# Parquet no admite append: cada volcado del sink es un archivo nuevo de la
+# partición, y los lectores (Fabric, Spark, pyarrow.dataset) leen la
+# carpeta completa.
+
+logger = logging.getLogger("parquet-output")
+
+PARQUET_PREFIX = "Scrapping/parquet"
+FORMATOS = ("csv", "parquet", "ambos")
+
+COLUMNAS = ["barra", "origen", "precio", "precio_promocion", "nombre", "capturado"]
+
+
+def esquema():
+    return pa.schema([
+        ("barra", pa.string()),
+        ("origen", pa.string()),
+        ("precio", pa.float64()),
+        ("precio_promocion", pa.float64()),
+        ("nombre", pa.string()),
+        ("capturado", pa.timestamp("s")),
+    ])
+
+
+def _float(v):
+    if v is None or isinstance(v, float):
+        return v
+    v = str(v).replace("$", "").replace(",", "").strip()
+    if v in ("", "-"):
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return None
+
+
+def _fecha(v):
+    if isinstance(v, datetime):
+        return v
+    for formato in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(v), formato)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def normalizar(fila, origen):
+    """Fila de cualquier ruta (``Barra``/``Precio`` o columnas de San Pablo) al esquema unificado."""
+    nombre = fila.get("Nombre del producto")
+    return {
+        "barra": str(fila.get("Barra") or fila.get("UPC") or ""),
+        "origen": fila.get("Origen") or origen,
+        "precio": _float(fila.get("Precio", fila.get("Precio sin promoción"))),
+        "precio_promocion": _float(fila.get("Precio con promoción")),
+        "nombre": nombre if nombre and nombre != "No encontrado" else None,
+        "capturado": _fecha(fila.get("Fecha Scrapping") or fila.get("Fecha")) or datetime.now(),
+    }
+
+
+def tabla(filas, origen):
+    normalizadas = [normalizar(f, origen) for f in filas]
+    return pa.Table.from_pydict({c: [f[c] for f in normalizadas] for c in COLUMNAS}, schema=esquema())
+
+
+def particion(origen, fecha=None):
+    fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+    return f"{PARQUET_PREFIX}/fuente={slug(origen)}/fecha={fecha}"
+
+
+class ParquetSink(ResultSink):
+    """Sink Parquet sobre Blob Storage: un archivo por volcado dentro de la partición."""
+
+    def __init__(self, container_client, origen, run_id, chunk_size=100, fecha=None, compression="zstd"):
+        if pa is None:
+            raise RuntimeError("La salida Parquet requiere el paquete pyarrow")
+        super().__init__(COLUMNAS, chunk_size)
+        self.container = container_client
+        self.origen = origen
+        self.prefix = f"{particion(origen, fecha)}/{run_id}-"
+        self.compression = compression
+        self.archivos = []
+
+    def _persist(self, rows):
+        if not rows:
+            return
+        out = io.BytesIO()
+        pq.write_table(tabla(rows, self.origen), out, compression=self.compression)
+        name = f"{self.prefix}{uuid.uuid4().hex[:12]}.parquet"
+        self.container.get_blob_client(name).upload_blob(out.getvalue(), overwrite=True)
+        self.archivos.append(name)
+        logger.info(f"{len(rows)} filas → {name}")
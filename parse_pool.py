@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from metrics import NULL_METRICS
+
+# === 🔹 Etapa de parseo en procesos ===
+# Los hilos de I/O descargan y pasan los bytes crudos de la respuesta a un
+# ``ProcessPoolExecutor``: decodificar y parsear el HTML ya no compite por
+# el GIL con el resto de los hilos y usa todos los núcleos de la instancia.
+# La cola entre etapas es acotada (``cola`` cupos): si los procesos no dan
+# abasto, los hilos de I/O esperan antes de encolar más páginas
+# (backpressure) en lugar de acumular HTML en memoria.
+#
+# Las funciones de parseo deben poder serializarse con pickle (funciones
+# de módulo o métodos de objetos sin estado, como los extractores de
+# ``price_extraction``).
+
+COLA_POR_WORKER = 4  # cupos de la cola por proceso de parseo
+
+
+def _parsear_en_proceso(fn, content, encoding):
+    """Corre en el proceso hijo: decodifica, parsea y devuelve ``(resultado, segundos)``."""
+    t0 = perf_counter()
+    resultado = fn(content.decode(encoding or "utf-8", errors="replace"))
+    return resultado, perf_counter() - t0
+
+
+class ParsePool:
+    def __init__(self, workers, cola=None, metrics=None):
+        self.workers = workers
+        self.cola = cola or workers * COLA_POR_WORKER
+        self.metrics = metrics or NULL_METRICS
+        self._cupos = threading.BoundedSemaphore(self.cola)
+        # spawn: no se hace fork de un proceso con hilos (sesiones HTTP, locks)
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def parse(self, fn, content, encoding=None):
+        """``(fn(html), segundos de parseo en el hijo)``; bloquea mientras la cola esté llena."""
+        t0 = perf_counter()
+        self._cupos.acquire()
+        try:
+            resultado, segundos = self._executor.submit(_parsear_en_proceso, fn, content, encoding).result()
+        finally:
+            self._cupos.release()
+        # Cola + serialización entre procesos
+        self.metrics.observe("espera_parseo", max(0.0, perf_counter() - t0 - segundos))
+        return resultado, segundos
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def snapshot(self):
+        return {"workers": self.workers, "cola": self.cola}
+
+
+def parsear(pool, fn, resp):
+    """Parsea ``resp`` con ``fn`` en ``pool`` o, sin pool, en el hilo actual. Devuelve ``(resultado, segundos)``."""
+    if pool is None:
+        t0 = perf_counter()
+        resultado = fn(resp.text)
+        return resultado, perf_counter() - t0
+    return pool.parse(fn, resp.content, resp.encoding)
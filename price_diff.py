@@ -0,0 +1,135 @@
+import codecs
+import csv
+import json
+import logging
+from datetime import datetime
+
+from result_sink import AppendBlobSink
+
+# === 🔹 Salida incremental de cambios de precio ===
+# Al cerrar una ejecución se compara el snapshot con el último precio
+# conocido por clave (barra / UPC) y origen. Se genera un CSV compacto de
+# cambios junto al snapshot y se actualiza el archivo de estado, de modo
+# que las cargas posteriores (Fabric / Power BI) sólo procesan novedades.
+#
+#   nuevo        la clave no tenía precio conocido y ahora sí
+#   cambio       el precio es distinto al último conocido
+#   desaparecido tenía precio y en esta ejecución no se encontró
+
+logger = logging.getLogger("price-diff")
+
+ESTADO_PREFIX = "Scrapping/_estado"
+
+
+def _precio(v):
+    if v is None:
+        return None
+    v = str(v).strip()
+    if v in ("", "-"):
+        return None
+    try:
+        return round(float(v.replace(",", "")), 2)
+    except ValueError:
+        return None
+
+
+def leer_csv_blob(blob_client):
+    """Itera las filas (dict) de un CSV en blob sin descargarlo completo."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def lineas():
+        pendiente = ""
+        for chunk in blob_client.download_blob().chunks():
+            pendiente += decoder.decode(chunk)
+            *completas, pendiente = pendiente.split("\n")
+            for linea in completas:
+                yield linea + "\n"
+        pendiente += decoder.decode(b"", final=True)
+        if pendiente:
+            yield pendiente
+
+    return csv.DictReader(lineas())
+
+
+def slug(origen):
+    return origen.lower().replace(" ", "_")
+
+
+def diff_precios(anterior, actual):
+    """Compara ``{clave: [precios]}``; devuelve ``[(clave, tipo, antes, ahora)]``."""
+    cambios = []
+    for clave, ahora in actual.items():
+        antes = anterior.get(clave)
+        tiene_antes = bool(antes) and any(p is not None for p in antes)
+        tiene_ahora = any(p is not None for p in ahora)
+        if tiene_ahora and not tiene_antes:
+            cambios.append((clave, "nuevo", antes, ahora))
+        elif tiene_antes and not tiene_ahora:
+            cambios.append((clave, "desaparecido", antes, ahora))
+        elif tiene_ahora and list(antes) != list(ahora):
+            cambios.append((clave, "cambio", antes, ahora))
+    return cambios
+
+
+def _guardar_estado(estado_blob, origen, actual, fecha, intentos=5):
+    """Combina ``actual`` en el estado con concurrencia optimista (ETag).
+
+    Varios lotes del mismo origen (p. ej. San Pablo) pueden cerrar a la vez;
+    las claves no procesadas en esta ejecución conservan su último precio.
+    """
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+    for _ in range(intentos):
+        precios, condicion = {}, {}
+        if estado_blob.exists():
+            descarga = estado_blob.download_blob()
+            precios = json.loads(descarga.readall()).get("precios", {})
+            condicion = {"etag": descarga.properties.etag, "match_condition": MatchConditions.IfNotModified}
+        precios.update(actual)
+        datos = json.dumps({"origen": origen, "actualizado": fecha, "precios": precios}, separators=(",", ":"))
+        try:
+            estado_blob.upload_blob(datos, overwrite=bool(condicion), **condicion)
+            return
+        except (ResourceModifiedError, ResourceExistsError):
+            logger.info(f"Estado {estado_blob.blob_name} modificado por otra ejecución; reintentando")
+    raise RuntimeError(f"No se pudo actualizar {estado_blob.blob_name} tras {intentos} intentos")
+
+
+def registrar_cambios(container_client, origen, snapshot_blob, clave, columnas_precio, cambios_blob=None):
+    """Genera el CSV de cambios de ``snapshot_blob`` y actualiza el estado de ``origen``.
+
+    Devuelve un resumen ``{"nuevo": n, "cambio": n, "desaparecido": n, "archivo": ...}``.
+    """
+    estado_blob = container_client.get_blob_client(f"{ESTADO_PREFIX}/ultimo_precio_{slug(origen)}.json")
+    estado = {"precios": {}}
+    if estado_blob.exists():
+        estado = json.loads(estado_blob.download_blob().readall())
+    anterior = estado.get("precios", {})
+
+    actual = {}
+    for fila in leer_csv_blob(container_client.get_blob_client(snapshot_blob)):
+        actual[str(fila[clave])] = [_precio(fila.get(c)) for c in columnas_precio]
+
+    cambios = diff_precios(anterior, actual)
+
+    cambios_blob = cambios_blob or snapshot_blob.replace(".csv", "_cambios.csv")
+    columnas = [clave, "Origen", "Tipo"]
+    for c in columnas_precio:
+        columnas += [f"{c} anterior", f"{c} nuevo"]
+    columnas.append("Fecha")
+    fecha = datetime.now().strftime("%Y-%m-%d")
+    with AppendBlobSink(container_client.get_blob_client(cambios_blob), columnas, chunk_size=500) as sink:
+        for k, tipo, antes, ahora in cambios:
+            fila = {clave: k, "Origen": origen, "Tipo": tipo, "Fecha": fecha}
+            for i, c in enumerate(columnas_precio):
+                fila[f"{c} anterior"] = antes[i] if antes else None
+                fila[f"{c} nuevo"] = ahora[i]
+            sink.write(fila)
+
+    _guardar_estado(estado_blob, origen, actual, fecha)
+
+    resumen = {t: sum(1 for c in cambios if c[1] == t) for t in ("nuevo", "cambio", "desaparecido")}
+    resumen["archivo"] = cambios_blob
+    logger.info(f"Cambios {origen}: {resumen}")
+    return resumen
@@ -0,0 +1,332 @@
+import html as html_lib
+import json
+import re
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:  # pragma: no cover
+    BeautifulSoup = None
+
+try:  # lxml es opcional: motor "lxml"
+    import lxml.html
+except ImportError:  # pragma: no cover
+    lxml = None
+
+# === 🔹 Motores de extracción de precio (Farmacias Especializadas) ===
+# Todos siguen el mismo orden de prioridad que la implementación original:
+#   1. span[data-price-amount]
+#   2. meta[itemprop=price]
+#   3. span.price / span.special-price
+#   4. regex "$ 123.45" sobre el texto del documento
+# "bs4" parsea el documento completo con html.parser (referencia), "lxml"
+# usa el parser en C de lxml y "rapido" recorre el HTML crudo con
+# expresiones regulares y se detiene en la primera coincidencia. Como bs4,
+# ninguno busca etiquetas ni texto en comentarios, <script> o <style>.
+
+
+# --- Limpieza de texto de precio ---
+def limpiar_precio(texto):
+    texto = texto.replace("$", "").replace(",", "").replace("MXN", "").replace(" ", "").strip()
+    try:
+        return float(texto)
+    except:
+        return None
+
+
+RE_PRECIO_TEXTO = re.compile(r"\$\s?[\d\.,]+")
+
+
+class ExtractorBS4:
+    nombre = "bs4"
+
+    def __init__(self):
+        if BeautifulSoup is None:
+            raise RuntimeError("El motor 'bs4' requiere beautifulsoup4")
+
+    def enlace_producto(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+        link = soup.find("a", class_="product-item-link")
+        return link["href"] if link and link.get("href") else None
+
+    def precio(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+
+        tag = soup.find("span", attrs={"data-price-amount": True})
+        if tag:
+            return float(tag["data-price-amount"])
+
+        meta_price = soup.find("meta", itemprop="price")
+        if meta_price and meta_price.get("content"):
+            return limpiar_precio(meta_price["content"])
+
+        tag = soup.find("span", class_="price")
+        if tag:
+            return limpiar_precio(tag.get_text(strip=True))
+
+        tag = soup.find("span", class_="special-price")
+        if tag:
+            return limpiar_precio(tag.get_text(strip=True))
+
+        match = RE_PRECIO_TEXTO.search(soup.text)
+        if match:
+            return limpiar_precio(match.group())
+        return None
+
+
+class ExtractorLxml:
+    nombre = "lxml"
+
+    def __init__(self):
+        if lxml is None:
+            raise RuntimeError("El motor 'lxml' requiere el paquete lxml")
+
+    def enlace_producto(self, html):
+        doc = lxml.html.fromstring(html)
+        hrefs = doc.xpath("//a[contains(concat(' ', normalize-space(@class), ' '), ' product-item-link ')]/@href")
+        return hrefs[0] if hrefs else None
+
+    def precio(self, html):
+        doc = lxml.html.fromstring(html)
+
+        vals = doc.xpath("//span[@data-price-amount]/@data-price-amount")
+        if vals:
+            return float(vals[0])
+
+        vals = doc.xpath("//meta[@itemprop='price']/@content")
+        if vals and vals[0]:
+            return limpiar_precio(vals[0])
+
+        for clase in ("price", "special-price"):
+            tags = doc.xpath(f"//span[contains(concat(' ', normalize-space(@class), ' '), ' {clase} ')]")
+            if tags:
+                return limpiar_precio(tags[0].text_content().strip())
+
+        for tag in doc.xpath("//script|//style"):
+            tag.drop_tree()
+        match = RE_PRECIO_TEXTO.search(doc.text_content())
+        if match:
+            return limpiar_precio(match.group())
+        return None
+
+
+# --- Motor "rapido": escaneo de etiquetas sin construir el árbol ---
+RE_TAG_A_PRODUCTO = re.compile(r"<a\b([^>]*\bproduct-item-link\b[^>]*)>", re.I)
+RE_TAG_SPAN_AMOUNT = re.compile(r"<span\b[^>]*\bdata-price-amount\s*=\s*([\"'])(.*?)\1", re.I | re.S)
+RE_TAG_META = re.compile(r"<meta\b([^>]*)>", re.I)
+RE_TAG_SPAN = re.compile(r"<span\b([^>]*)>", re.I)
+RE_ATTR = re.compile(r"([\w:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.S)
+RE_TAGS = re.compile(r"<[^>]+>")
+RE_COMENTARIOS = re.compile(r"<!--.*?-->", re.S)
+RE_SCRIPTS = re.compile(r"<(script|style)\b.*?</\1>", re.I | re.S)
+
+
+def _attrs(texto):
+    return {m.group(1).lower(): html_lib.unescape(m.group(2) or m.group(3) or m.group(4) or "") for m in RE_ATTR.finditer(texto)}
+
+
+def _tiene_clase(attrs, clase):
+    return clase in attrs.get("class", "").split()
+
+
+def _sin_ocultos(html):
+    """HTML sin comentarios ni ``<script>`` / ``<style>``, que bs4 no recorre al buscar."""
+    return RE_SCRIPTS.sub("", RE_COMENTARIOS.sub("", html))
+
+
+def _texto_span(html, inicio):
+    """Texto del span que abre en ``inicio`` (considera spans anidados)."""
+    nivel, pos = 1, inicio
+    for m in re.finditer(r"<(/?)span\b[^>]*>", html[inicio:], re.I):
+        nivel += -1 if m.group(1) else 1
+        if nivel == 0:
+            pos = inicio + m.start()
+            break
+    else:
+        pos = len(html)
+    return html_lib.unescape(RE_TAGS.sub("", html[inicio:pos])).strip()
+
+
+class ExtractorRapido:
+    nombre = "rapido"
+
+    def enlace_producto(self, html):
+        html = _sin_ocultos(html)
+        for m in RE_TAG_A_PRODUCTO.finditer(html):
+            attrs = _attrs(m.group(1))
+            if _tiene_clase(attrs, "product-item-link"):
+                return attrs.get("href") or None
+        return None
+
+    def precio(self, html):
+        html = _sin_ocultos(html)
+        m = RE_TAG_SPAN_AMOUNT.search(html)
+        if m:
+            return float(html_lib.unescape(m.group(2)))
+
+        for m in RE_TAG_META.finditer(html):
+            attrs = _attrs(m.group(1))
+            if attrs.get("itemprop") == "price":
+                if attrs.get("content"):
+                    return limpiar_precio(attrs["content"])
+                break
+
+        for clase in ("price", "special-price"):
+            for m in RE_TAG_SPAN.finditer(html):
+                if _tiene_clase(_attrs(m.group(1)), clase):
+                    return limpiar_precio(_texto_span(html, m.end()))
+
+        match = RE_PRECIO_TEXTO.search(html_lib.unescape(RE_TAGS.sub("", html)))
+        if match:
+            return limpiar_precio(match.group())
+        return None
+
+
+# === 🔹 FarmaTodo ===
+# Estrategias en orden de confianza; cada fila registra cuál encontró el precio:
+#   1. "jsonld":      <script type="application/ld+json"> con un Product y sus offers
+#   2. "variaciones": JSON de variaciones de WooCommerce (data-product_variations)
+#   3. "meta":        meta product:price:amount / itemprop=price
+#   4. "texto":       regex "$122.00–$130.00" / "$122.00" sobre el texto (último recurso:
+#                     puede tomar un precio de un banner o de un producto relacionado)
+# Ninguna construye el árbol del documento.
+RE_RANGO_FARMATODO = re.compile(r"\$[0-9\.,]+\s*–\s*\$[0-9\.,]+")
+RE_UNICO_FARMATODO = re.compile(r"\$([0-9\.,]+)")
+RE_JSON_LD = re.compile(r"<script\b[^>]*\btype\s*=\s*[\"']application/ld\+json[\"'][^>]*>(.*?)</script>", re.I | re.S)
+RE_TAG_FORM_VARIACIONES = re.compile(r"<form\b([^>]*\bdata-product_variations\b[^>]*)>", re.I)
+
+
+def _numero(valor):
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return limpiar_precio(str(valor)) if valor not in (None, "") else None
+
+
+def _nodos_producto(data):
+    """Nodos ``@type: Product`` de un documento JSON-LD (objeto, lista o ``@graph``)."""
+    if isinstance(data, list):
+        for item in data:
+            yield from _nodos_producto(item)
+    elif isinstance(data, dict):
+        tipo = data.get("@type")
+        if tipo == "Product" or (isinstance(tipo, list) and "Product" in tipo):
+            yield data
+        yield from _nodos_producto(data.get("@graph"))
+
+
+def _precios_oferta(offers):
+    if isinstance(offers, list):
+        for offer in offers:
+            yield from _precios_oferta(offer)
+    elif isinstance(offers, dict):
+        # AggregateOffer trae lowPrice; Offer trae price o priceSpecification
+        spec = offers.get("priceSpecification")
+        spec = spec[0] if isinstance(spec, list) and spec else spec
+        for valor in (offers.get("lowPrice"), offers.get("price"), (spec or {}).get("price")):
+            precio = _numero(valor)
+            if precio is not None:
+                yield precio
+                break
+
+
+def precio_jsonld(html):
+    """Precio mínimo de las ofertas del primer Product con precio en JSON-LD."""
+    for m in RE_JSON_LD.finditer(html):
+        try:
+            data = json.loads(m.group(1).strip())
+        except ValueError:
+            continue
+        for producto in _nodos_producto(data):
+            precios = list(_precios_oferta(producto.get("offers")))
+            if precios:
+                return min(precios)
+    return None
+
+
+def precio_variaciones(html):
+    """Mínimo ``display_price`` del JSON de variaciones de un producto variable de WooCommerce."""
+    m = RE_TAG_FORM_VARIACIONES.search(html)
+    if not m:
+        return None
+    try:
+        variaciones = json.loads(_attrs(m.group(1)).get("data-product_variations") or "[]")
+    except ValueError:
+        return None
+    precios = [_numero(v.get("display_price")) for v in variaciones if isinstance(v, dict)]
+    precios = [p for p in precios if p is not None]
+    return min(precios) if precios else None
+
+
+def precio_meta(html):
+    for m in RE_TAG_META.finditer(html):
+        attrs = _attrs(m.group(1))
+        if attrs.get("property") == "product:price:amount" or attrs.get("itemprop") == "price":
+            precio = _numero(attrs.get("content"))
+            if precio is not None:
+                return precio
+    return None
+
+
+def precio_texto_farmatodo(html):
+    """Mínimo de un rango tipo $122.00–$130.00 o, si no hay rango, el primer precio del texto."""
+    texto = html_lib.unescape(RE_TAGS.sub("", RE_SCRIPTS.sub("", html)))
+
+    match = RE_RANGO_FARMATODO.search(texto)
+    if match:
+        return limpiar_precio(match.group(0).split("–")[0])
+
+    unico = RE_UNICO_FARMATODO.search(texto)
+    if unico:
+        return limpiar_precio(unico.group(1))
+    return None
+
+
+ESTRATEGIAS_PRECIO_FARMATODO = {
+    "jsonld": precio_jsonld,
+    "variaciones": precio_variaciones,
+    "meta": precio_meta,
+    "texto": precio_texto_farmatodo,
+}
+
+
+def extraer_farmatodo(html):
+    """``{"precio": ..., "estrategia": ...}`` con la primera estrategia que encuentra precio."""
+    for estrategia, extraer in ESTRATEGIAS_PRECIO_FARMATODO.items():
+        precio = extraer(html)
+        if precio is not None:
+            return {"precio": precio, "estrategia": estrategia}
+    return {"precio": None, "estrategia": None}
+
+
+def precio_store_api(texto, codigo):
+    """Precio del producto con SKU ``codigo`` en la respuesta de la Store API de WooCommerce.
+
+    Los montos vienen en unidades menores (``currency_minor_unit``); en
+    productos variables se toma el mínimo de ``price_range``.
+    """
+    try:
+        productos = json.loads(texto)
+    except ValueError:
+        return None
+    for producto in productos if isinstance(productos, list) else []:
+        if not isinstance(producto, dict) or str(producto.get("sku") or "") != codigo:
+            continue
+        prices = producto.get("prices") or {}
+        monto = (prices.get("price_range") or {}).get("min_amount") or prices.get("price")
+        precio = _numero(monto)
+        if precio is not None:
+            return precio / 10 ** int(prices.get("currency_minor_unit") or 0)
+    return None
+
+
+EXTRACTORES = {
+    "bs4": ExtractorBS4,
+    "lxml": ExtractorLxml,
+    "rapido": ExtractorRapido,
+}
+
+
+def get_extractor(nombre="rapido"):
+    try:
+        return EXTRACTORES[nombre]()
+    except KeyError:
+        raise ValueError(f"Extractor desconocido: {nombre}. Opciones: {', '.join(EXTRACTORES)}")
@@ -0,0 +1,109 @@
+import hashlib
+import time
+
+from cache_store import DIA
+from price_diff import _precio
+
+# === 🔹 Agenda de refresco adaptativa ===
+# Historial por código (y por origen: cada fuente tiene su propia caché) en
+# el namespace ``agenda`` de la ``CacheStore``: último precio, cuántas
+# veces se observó y cambió, fallos consecutivos (sin precio) y la próxima
+# fecha de consulta. Con ``?agenda=1`` cada invocación consulta sólo los
+# códigos vencidos, hasta ``?presupuesto=`` códigos (≈ peticiones).
+#
+#   precio igual       el intervalo crece ×1.5 (hasta 14 días)
+#   precio distinto    el intervalo se reduce a la mitad (mínimo 6 horas)
+#   sin precio         1, 2, 4… días según los fallos consecutivos (hasta 30)
+#   perdió el precio   se vuelve a consultar al día siguiente para confirmar
+#
+# Los códigos sin historial van primero; después, los más atrasados
+# respecto de su intervalo. Un ±10 % fijo por código reparte los
+# vencimientos para que no coincidan todos el mismo día.
+
+AGENDA_NS = "agenda"
+INTERVALO_BASE = DIA
+INTERVALO_MIN = 6 * 60 * 60
+INTERVALO_MAX = 14 * DIA
+INTERVALO_MAX_SIN_PRECIO = 30 * DIA
+AGENDA_TTL = 3 * INTERVALO_MAX_SIN_PRECIO  # códigos que dejaron de venir en la entrada
+CRECIMIENTO = 1.5
+DISPERSION = 0.1
+
+
+def _dispersion(clave):
+    """Factor fijo en ``[1 - DISPERSION, 1 + DISPERSION]`` derivado de la clave."""
+    h = int(hashlib.md5(clave.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return 1 + DISPERSION * (2 * h - 1)
+
+
+def siguiente(entrada, precios, ahora):
+    """Nueva entrada de la agenda tras observar ``precios`` (lista; ``None`` = sin precio)."""
+    entrada = dict(entrada or {})
+    anterior = entrada.get("precio")
+    tenia = bool(anterior) and any(p is not None for p in anterior)
+    tiene = any(p is not None for p in precios)
+    intervalo = entrada.get("intervalo") or INTERVALO_BASE
+
+    entrada["obs"] = entrada.get("obs", 0) + 1
+    if tiene:
+        if tenia and list(anterior) != list(precios):
+            entrada["cambios"] = entrada.get("cambios", 0) + 1
+            intervalo = max(INTERVALO_MIN, intervalo / 2)
+        elif tenia:
+            intervalo = min(INTERVALO_MAX, intervalo * CRECIMIENTO)
+        else:
+            intervalo = INTERVALO_BASE
+        entrada["fallos"] = 0
+    else:
+        entrada["fallos"] = entrada.get("fallos", 0) + 1
+        # Si antes tenía precio se confirma pronto; si nunca lo tuvo se espacia
+        intervalo = INTERVALO_BASE if tenia else min(INTERVALO_MAX_SIN_PRECIO, INTERVALO_BASE * 2 ** (entrada["fallos"] - 1))
+        if tenia:
+            entrada["fallos"] = 1
+    entrada["precio"] = precios
+    entrada["intervalo"] = intervalo
+    entrada["ultimo"] = ahora
+    return entrada
+
+
+class RefreshScheduler:
+    def __init__(self, cache, columna_clave, columnas_precio):
+        self.cache = cache
+        self.columna_clave = columna_clave
+        self.columnas_precio = columnas_precio
+        self.stats = {}
+
+    def vencidos(self, codigos, presupuesto=None, ahora=None):
+        """Códigos a consultar ahora: sin historial primero, luego los más atrasados; como mucho ``presupuesto``."""
+        ahora = time.time() if ahora is None else ahora
+        nuevos, atrasados = [], []
+        for codigo in codigos:
+            hit = self.cache.get(AGENDA_NS, codigo)
+            if hit is None:
+                nuevos.append(codigo)
+                continue
+            entrada = hit.value
+            proximo = entrada["ultimo"] + entrada["intervalo"] * _dispersion(codigo)
+            if proximo <= ahora:
+                atrasados.append(((ahora - proximo) / entrada["intervalo"], codigo))
+        atrasados.sort(key=lambda x: -x[0])
+        seleccion = nuevos + [c for _, c in atrasados]
+        if presupuesto is not None:
+            seleccion = seleccion[:presupuesto]
+        self.stats = {
+            "total": len(codigos),
+            "nuevos": len(nuevos),
+            "vencidos": len(nuevos) + len(atrasados),
+            "al_dia": len(codigos) - len(nuevos) - len(atrasados),
+            "seleccionados": len(seleccion),
+        }
+        return seleccion
+
+    def observar(self, filas, ahora=None):
+        """Actualiza el historial con las filas ya persistidas (``on_flush``)."""
+        ahora = time.time() if ahora is None else ahora
+        for fila in filas:
+            clave = str(fila[self.columna_clave])
+            hit = self.cache.get(AGENDA_NS, clave)
+            precios = [_precio(fila.get(c)) for c in self.columnas_precio]
+            self.cache.set(AGENDA_NS, clave, siguiente(hit.value if hit else None, precios, ahora))
@@ -0,0 +1,145 @@
+import csv
+import io
+import logging
+import threading
+from pathlib import Path
+from time import perf_counter
+
+from metrics import NULL_METRICS
+
+# === 🔹 Salida incremental de resultados ===
+# Los scrapers escriben cada fila en un "sink" a medida que se completa; el
+# sink acumula ``chunk_size`` filas y las vuelca como CSV. Así la memoria
+# queda acotada y, si la ejecución se corta, lo ya volcado persiste.
+
+logger = logging.getLogger("result-sink")
+
+MAX_APPEND_BLOCK = 4 * 1024 * 1024  # límite de append_block en Azure
+
+
+class ResultSink:
+    def __init__(self, columns, chunk_size=100, encoding="utf-8", lineterminator="\n"):
+        self.columns = list(columns)
+        self.on_flush = None  # callback(filas) tras cada volcado persistido
+        self.metrics = NULL_METRICS  # etapa "volcado" (metrics.Metrics)
+        self.chunk_size = max(1, chunk_size)
+        self.bom = encoding.lower() == "utf-8-sig"
+        self.lineterminator = lineterminator
+        self.count = 0
+        self._buffer = []
+        self._header_done = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            self.count += 1
+            if len(self._buffer) >= self.chunk_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+    def _flush_locked(self):
+        if not self._buffer and self._header_done:
+            return
+        t0 = perf_counter()
+        self._persist(self._buffer)
+        self.metrics.observe("volcado", perf_counter() - t0)
+        self._header_done = True
+        rows, self._buffer = self._buffer, []
+        if rows and self.on_flush:
+            self.on_flush(rows)
+
+    def _persist(self, rows):
+        """Escribe ``rows`` como CSV (con encabezado si el destino está vacío)."""
+        out = io.StringIO()
+        w = csv.DictWriter(out, fieldnames=self.columns, extrasaction="ignore", lineterminator=self.lineterminator)
+        first = not self._header_done and self._starts_empty()
+        if first:
+            w.writeheader()
+        w.writerows(rows)
+        data = out.getvalue().encode("utf-8")
+        if first and self.bom:
+            data = b"\xef\xbb\xbf" + data
+        if data:
+            self._write_chunk(data)
+
+    def _starts_empty(self):
+        return True
+
+    def _write_chunk(self, data):
+        raise NotImplementedError
+
+
+class LocalFileSink(ResultSink):
+    """Sink sobre un archivo local (modo append; el encabezado sólo si el archivo es nuevo)."""
+
+    def __init__(self, path, columns, chunk_size=100, encoding="utf-8", lineterminator="\n"):
+        super().__init__(columns, chunk_size, encoding, lineterminator)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _starts_empty(self):
+        return not self.path.exists() or self.path.stat().st_size == 0
+
+    def _write_chunk(self, data):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+
+class AppendBlobSink(ResultSink):
+    """Sink sobre un append blob: cada volcado es un ``append_block``."""
+
+    def __init__(self, blob_client, columns, chunk_size=100, encoding="utf-8", lineterminator="\n", overwrite=True):
+        super().__init__(columns, chunk_size, encoding, lineterminator)
+        self.blob_client = blob_client
+        self._created = False
+        self._overwrite = overwrite
+
+    def _ensure_blob(self):
+        if self._created:
+            return
+        if self._overwrite or not self.blob_client.exists():
+            self.blob_client.create_append_blob()
+            self._empty = True
+        else:
+            self._empty = self.blob_client.get_blob_properties().size == 0
+        self._created = True
+
+    def _starts_empty(self):
+        self._ensure_blob()
+        return self._empty
+
+    def _write_chunk(self, data):
+        self._ensure_blob()
+        for i in range(0, len(data), MAX_APPEND_BLOCK):
+            self.blob_client.append_block(data[i:i + MAX_APPEND_BLOCK])
+
+
+class TeeSink(ResultSink):
+    """Escribe las mismas filas en varios sinks (p. ej. CSV y Parquet).
+
+    El volcado es conjunto: ``on_flush`` se llama cuando todos los sinks
+    persistieron el bloque.
+    """
+
+    def __init__(self, sinks, chunk_size=100):
+        super().__init__(sinks[0].columns, chunk_size)
+        self.sinks = list(sinks)
+
+    def _persist(self, rows):
+        for sink in self.sinks:
+            with sink._lock:
+                sink._persist(rows)
+                sink._header_done = True
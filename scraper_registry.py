@@ -0,0 +1,357 @@
+import concurrent.futures
+import logging
+import time
+from datetime import datetime
+
+from cache_store import CacheStore
+from checkpoint import BlobRun
+from http_cache import HTTP_CACHE_NS, HTTP_CACHE_TTL, ConditionalFetcher
+from http_client import HostConcurrency, ScraperHttp
+from metrics import NULL_METRICS, Metrics, Profiler
+from parse_pool import ParsePool, parsear
+from parquet_output import FORMATOS, ParquetSink, particion
+from price_diff import registrar_cambios
+from refresh_scheduler import AGENDA_NS, AGENDA_TTL, RefreshScheduler
+
+# === 🔹 Registro de scrapers y motor de ejecución común ===
+# Cada farmacia es una subclase de ``Scraper`` registrada con
+# ``@registrar_scraper("clave")``. Sólo implementa la descarga y el parseo
+# de un código (``obtener``) o, si trabaja por lotes, ``procesar``. El
+# motor (``ejecutar_scraper``) se encarga del resto: cliente HTTP con pool
+# y reintentos, caché persistente en blob, descarga condicional,
+# checkpoint / reanudación, salida CSV / Parquet, cambios de precio y
+# métricas de la respuesta.
+
+logger = logging.getLogger("scraper-registry")
+
+# --- Columnas del CSV de salida (Especializadas / FarmaTodo) ---
+COLUMNAS_SALIDA = ["Barra", "Precio", "Fecha", "Origen"]
+
+# --- Ejecución reanudable con tiempo límite ---
+TIEMPO_MAX_S = 540  # margen bajo el functionTimeout de 10 minutos (host.json)
+
+PERFILES_PREFIX = "Scrapping/_perfiles"
+
+SCRAPERS = {}
+
+
+def registrar_scraper(clave):
+    def decorador(cls):
+        cls.clave_registro = clave
+        SCRAPERS[clave] = cls
+        return cls
+    return decorador
+
+
+def get_scraper(clave):
+    try:
+        return SCRAPERS[clave]
+    except KeyError:
+        raise ValueError(f"Scraper desconocido: {clave}. Opciones: {', '.join(SCRAPERS)}")
+
+
+class Scraper:
+    """Interfaz de una farmacia.
+
+    Atributos de clase (plantillas con ``{fecha}`` y ``{lote}``):
+
+    - ``origen``: valor de la columna ``Origen`` y nombre de la fuente.
+    - ``run_id`` / ``blob_salida``: ejecución reanudable y CSV final.
+    - ``columnas``, ``columna_clave``, ``columnas_precio``, ``csv_kwargs``: formato del CSV.
+    - ``max_workers`` / ``max_workers_limite`` / ``chunk_size`` / ``tam_shard``:
+      hints de concurrencia. Con el control adaptativo (por defecto) el
+      límite por host arranca en ``max_workers`` y sube hasta
+      ``max_workers_limite`` mientras el sitio responda bien
+      (``tam_shard`` != None: el orquestador reparte los códigos en shards).
+    - ``usa_http`` / ``headers``: el motor crea un ``ScraperHttp`` compartido
+      y, con ``?workers_parseo=N``, un ``ParsePool`` de N procesos para el
+      parseo (``parse_pool``; ``?cola_parseo=`` acota la cola entre etapas).
+    - ``cache_blob`` / ``cache_local``: caché SQLite persistente (``?cache=0`` la omite).
+      ``cache_ttl`` da el TTL (segundos) de los namespaces propios de la
+      fuente; al subirla se descartan sus entradas vencidas.
+    """
+
+    origen = ""
+    run_id = ""
+    blob_salida = ""
+    columnas = COLUMNAS_SALIDA
+    columna_clave = "Barra"
+    columnas_precio = ["Precio"]
+    csv_kwargs = {}
+    max_workers = 5
+    max_workers_limite = 20
+    chunk_size = 100
+    tam_shard = None
+    usa_http = True
+    headers = None
+    cache_blob = None
+    cache_local = None
+    cache_ttl = {}
+
+    def __init__(self, params, http=None, cache=None, fetcher=None, lote=None, workers=None, metrics=None, profiler=None,
+                 parse_pool=None):
+        self.params = params
+        self.metrics = metrics or NULL_METRICS
+        self.profiler = profiler
+        self.workers = workers or self.max_workers
+        self.http = http
+        self.cache = cache
+        self.fetcher = fetcher
+        self.parse_pool = parse_pool
+        self.lote = lote
+
+    # --- Hooks por código ---
+    def obtener(self, codigo):
+        """Descarga y parsea un código; devuelve la fila (sin ``Fecha`` / ``Origen``)."""
+        raise NotImplementedError
+
+    def parsear(self, fn, resp, stage="parseo"):
+        """``fn(html)`` sobre una respuesta, en el pool de procesos si lo hay."""
+        resultado, segundos = parsear(self.parse_pool, fn, resp)
+        self.metrics.observe(stage, segundos)
+        return resultado
+
+    def _llamar(self, fn, *args):
+        return self.profiler.call(fn, *args) if self.profiler else fn(*args)
+
+    # --- Hooks por lote ---
+    def procesar(self, codigos, sink, limite, semaforo=None):
+        """Procesa ``codigos`` escribiendo cada fila en ``sink`` hasta ``limite`` (``time.monotonic()``).
+
+        Por defecto reparte ``obtener`` en un pool de ``workers`` hilos.
+        """
+        fecha = datetime.now().strftime("%Y-%m-%d")
+
+        def tarea(codigo):
+            if time.monotonic() > limite:
+                return None
+            with self.metrics.stage("item"):
+                if semaforo is None:
+                    return self._llamar(self.obtener, codigo)
+                with semaforo:
+                    return self._llamar(self.obtener, codigo)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futuros = {executor.submit(tarea, c): c for c in codigos}
+            for future in concurrent.futures.as_completed(futuros):
+                resultado = future.result()
+                if resultado is not None:
+                    sink.write({**resultado, "Fecha": fecha, "Origen": self.origen})
+
+    def metricas(self):
+        """Campos adicionales de la respuesta."""
+        return {}
+
+    def cerrar(self):
+        pass
+
+
+# --- Piezas del motor ---
+def abrir_ejecucion(params, container_client, run_id, blob_name_out, columnas, clave, origen=None, **kwargs):
+    """Crea el ``BlobRun`` de la ejecución (``?run_id=`` lo sobrescribe, ``?reiniciar=1`` la reinicia).
+
+    Al reiniciar también se borran los Parquet de la ejecución en la
+    partición de hoy de ``origen``; si no, sus filas quedarían duplicadas.
+    """
+    run = BlobRun(container_client, params.get("run_id") or run_id, blob_name_out, columnas, clave, **kwargs)
+    if params.get("reiniciar") == "1":
+        run.reset(extra_prefixes=[f"{particion(origen)}/{run.run_id}-"] if origen else ())
+    return run
+
+
+def formato_salida(params):
+    """``?formato=csv|parquet|ambos`` (por defecto ``ambos``)."""
+    formato = params.get("formato") or "ambos"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS)}")
+    return formato
+
+
+def abrir_sink(run, origen, formato, chunk_size, parte=None):
+    """Sink de la parte de esta invocación: CSV, Parquet (esquema unificado) o ambos."""
+    extra = []
+    if formato in ("parquet", "ambos"):
+        extra.append(ParquetSink(run.container, origen, run.run_id, chunk_size=chunk_size))
+    return run.part_sink(chunk_size=chunk_size, csv=formato in ("csv", "ambos"), extra=extra, name=parte)
+
+
+def repartir(codigos, tam):
+    """Divide ``codigos`` en shards contiguos de ``tam`` elementos como máximo."""
+    tam = max(1, tam)
+    return [codigos[i:i + tam] for i in range(0, len(codigos), tam)]
+
+
+def cerrar_ejecucion(run, pendientes, origen, columnas_precio):
+    """Combina las partes si ya no hay pendientes y, al generar el CSV final, registra los cambios de precio.
+
+    Devuelve ``(completo, cambios)``; ``cambios`` es ``None`` si no se generó el CSV en esta invocación.
+    """
+    completo = run.finish(pendientes)
+    if not (completo and run.merged):
+        return completo, None
+    return completo, registrar_cambios(run.container, origen, run.final_blob, run.key_column, columnas_precio)
+
+
+def resultado_ejecucion(run, completo, registros, pendientes, **extra):
+    if completo:
+        estado, mensaje = "ok", f"Archivo {run.final_blob} generado"
+    else:
+        estado, mensaje = "parcial", f"Ejecución {run.run_id} incompleta: {len(pendientes)} pendientes. Volver a invocar para reanudar."
+    return {
+        "status": estado,
+        "mensaje": mensaje,
+        "run_id": run.run_id,
+        "registros": registros,
+        "pendientes": len(pendientes),
+        **extra
+    }
+
+
+def guardar_perfil(profiler, container_client, run_id):
+    """Sube el volcado de cProfile (``.prof``) y registra las funciones más costosas."""
+    datos = profiler.dump()
+    if not datos:
+        return None
+    nombre = f"{PERFILES_PREFIX}/{run_id}_{datetime.now().strftime('%H%M%S')}.prof"
+    container_client.get_blob_client(nombre).upload_blob(datos, overwrite=True)
+    logger.info(f"Perfil {nombre}\n{profiler.top()}")
+    return nombre
+
+
+# --- Motor ---
+def preparar_scraper(cls, params, metrics, cache=None, lote=None, profiler=None):
+    """Instancia ``cls`` con su cliente HTTP (pool, reintentos, AIMD) y descarga condicional.
+
+    Devuelve ``(scraper, concurrency)``; ``concurrency`` es el ``HostConcurrency``
+    o ``None`` si la concurrencia es fija o la fuente no usa HTTP.
+    """
+    http = concurrency = pool = None
+    workers = cls.max_workers
+    if cls.usa_http:
+        rate = float(params.get("rate")) if params.get("rate") else None
+        if params.get("adaptativo", "1") != "0":
+            # AIMD por host: los hilos son el techo, el limitador decide cuántos piden a la vez
+            workers = max(cls.max_workers, int(params.get("max_workers") or cls.max_workers_limite))
+            concurrency = HostConcurrency(initial=cls.max_workers, maximum=workers)
+        http = ScraperHttp(pool_size=workers, headers=cls.headers, rate=rate, concurrency=concurrency, metrics=metrics)
+        # Parseo en procesos: los hilos (``workers``) sólo hacen I/O
+        workers_parseo = int(params.get("workers_parseo") or 0)
+        if workers_parseo > 0:
+            pool = ParsePool(workers_parseo, cola=int(params.get("cola_parseo") or 0) or None, metrics=metrics)
+    fetcher = ConditionalFetcher(http, cache, pool=pool) if http else None
+    scraper = cls(params, http=http, cache=cache, fetcher=fetcher, lote=lote, workers=workers, metrics=metrics,
+                  profiler=profiler, parse_pool=pool)
+    return scraper, concurrency
+
+
+def ejecutar_scraper(clave, params, container_client, codigos, lote=None, semaforo=None, parte=None, cerrar=True):
+    """Ejecuta el scraper ``clave`` sobre ``codigos`` y devuelve el resultado de la ejecución.
+
+    ``semaforo`` limita las peticiones simultáneas compartidas con otras
+    fuentes (orquestador). ``parte`` nombra la parte de esta invocación y con
+    ``cerrar=False`` no se combinan las partes al terminar ``codigos``: la
+    ejecución abarca más códigos y la cierra quien la coordina (``work_queue``). ``?adaptativo=0`` fija la concurrencia en
+    ``max_workers``; ``?max_workers=`` cambia el techo del control adaptativo
+    y ``?workers_parseo=`` lleva el parseo a un pool de procesos.
+    Las latencias por etapa / host y los contadores van en ``metricas`` y en
+    el evento ``run_metrics``; ``?perfil=1`` guarda un volcado de cProfile.
+    Con ``?agenda=1`` sólo se consultan los códigos vencidos según su
+    historial (``refresh_scheduler``), hasta ``?presupuesto=`` códigos; cada
+    invocación es una ejecución propia que se cierra con lo consultado y
+    borra su checkpoint.
+    """
+    cls = get_scraper(clave)
+    t0 = time.monotonic()
+    metrics = Metrics()
+    profiler = Profiler() if params.get("perfil") == "1" else None
+    usa_agenda = params.get("agenda") == "1"
+    # Con agenda cada invocación genera su propio snapshot (sólo lo refrescado)
+    fecha_id = datetime.now().strftime("%Y%m%d_%H%M%S" if usa_agenda else "%Y%m%d")
+    plantilla = {"fecha": fecha_id, "lote": lote}
+
+    cache = cache_blob = None
+    if cls.cache_blob and params.get("cache", "1") != "0":
+        cache_blob = container_client.get_blob_client(cls.cache_blob)
+        with metrics.stage("cache_descarga"):
+            cache = CacheStore.from_blob(cache_blob, cls.cache_local.format(**plantilla))
+    agenda = None
+    if usa_agenda:
+        if cache is None:
+            raise ValueError("?agenda=1 requiere la caché persistente (sin ?cache=0)")
+        agenda = RefreshScheduler(cache, cls.columna_clave, cls.columnas_precio)
+        with metrics.stage("agenda"):
+            codigos = agenda.vencidos(codigos, int(params["presupuesto"]) if params.get("presupuesto") else None)
+    scraper, concurrency = preparar_scraper(cls, params, metrics, cache=cache, lote=lote, profiler=profiler)
+    http, fetcher, pool = scraper.http, scraper.fetcher, scraper.parse_pool
+
+    # --- Ejecución reanudable: sólo códigos pendientes, partes en blob ---
+    run = abrir_ejecucion(
+        params, container_client, cls.run_id.format(**plantilla), cls.blob_salida.format(**plantilla),
+        scraper.columnas, cls.columna_clave, origen=cls.origen, **cls.csv_kwargs
+    )
+    formato = formato_salida(params)
+    pendientes = run.pending(codigos)
+    registros = 0
+    try:
+        if pendientes:
+            limite = time.monotonic() + float(params.get("tiempo_max") or TIEMPO_MAX_S)
+            sink = abrir_sink(run, cls.origen, formato, int(params.get("chunk") or cls.chunk_size), parte=parte)
+            sink.metrics = metrics
+            marcar = sink.on_flush
+
+            def on_flush(rows):
+                marcar(rows)
+                metrics.results(rows, cls.columnas_precio)
+                if agenda:
+                    agenda.observar(rows)
+
+            sink.on_flush = on_flush
+            with sink, metrics.stage("procesar"):
+                if profiler:
+                    profiler.call(scraper.procesar, pendientes, sink, limite, semaforo)
+                else:
+                    scraper.procesar(pendientes, sink, limite, semaforo=semaforo)
+            registros = sink.count
+    finally:
+        scraper.cerrar()
+        if pool:
+            pool.close()
+        if http:
+            http.close()
+        if cache:
+            with metrics.stage("cache_subida"):
+                cache.to_blob(cache_blob, ttls={HTTP_CACHE_NS: HTTP_CACHE_TTL, AGENDA_NS: AGENDA_TTL, **scraper.cache_ttl})
+            cache.close()
+
+    # --- Combinar partes si ya no hay pendientes y registrar cambios ---
+    pendientes = run.pending(codigos)
+    completo, cambios, extra = not pendientes, None, {}
+    if cerrar:
+        with metrics.stage("cierre"):
+            # Con agenda lo no consultado sigue vencido y entra en la próxima invocación
+            completo, cambios = cerrar_ejecucion(run, [] if agenda else pendientes, cls.origen, cls.columnas_precio)
+            if agenda and completo:
+                # El run_id de cada invocación con agenda no se reanuda: su checkpoint ya no sirve
+                run.checkpoint.reset()
+    elif completo:
+        extra["mensaje"] = f"Códigos de la parte {parte or run.run_id} completados"
+    duracion_s = round(time.monotonic() - t0, 1)
+    metrics.log_event("run_metrics", origen=cls.origen, run_id=run.run_id, registros=registros,
+                      pendientes=len(pendientes), duracion_s=duracion_s)
+    perfil = guardar_perfil(profiler, container_client, run.run_id) if profiler else None
+    return resultado_ejecucion(
+        run, completo, registros, pendientes,
+        cambios=cambios,
+        formato=formato,
+        parquet=particion(cls.origen) if formato != "csv" else None,
+        duracion_s=duracion_s,
+        **({"reintentos": http.retry_count} if http else {}),
+        **({"concurrencia": concurrency.snapshot()} if concurrency else {}),
+        **({"cache_http": fetcher.stats} if fetcher else {}),
+        **({"parseo": pool.snapshot()} if pool else {}),
+        **({"agenda": agenda.stats} if agenda else {}),
+        **scraper.metricas(),
+        metricas=metrics.snapshot(),
+        **({"perfil": perfil} if perfil else {}),
+        **extra
+    )
@@ -1,77 +1,96 @@
+import asyncio
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
 import json
-import csv
 import re
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
-from time import sleep
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from time import monotonic, perf_counter, sleep, time
+from urllib.parse import urlparse
 
-import os
-import subprocess
-import sys
-import json
+from cache_store import DIA
+from http_client import AsyncHttpTransport, HttpTransport
+from metrics import NULL_METRICS
+from result_sink import LocalFileSink
 
 TMP_PLAYWRIGHT = "/tmp/playwright"
 os.environ["PLAYWRIGHT_BROWSERS_PATH"] = TMP_PLAYWRIGHT
 
-chromium_exe = os.path.join(
-    TMP_PLAYWRIGHT,
-    "chromium-1187",
-    "chrome-linux",
-    "headless_shell"
-)
+# Revisión de Chromium con la que se probó el scraper (playwright==1.55.0)
+CHROMIUM_REVISION = "1187"
+
+# === 🔹 Aprovisionamiento perezoso de Chromium ===
+# Sólo se instala cuando una ejecución realmente necesita el navegador
+# (transporte "playwright" en modo secuencial). La instalación está
+# protegida con un lock y su resultado queda en caché para el proceso.
+_chromium_lock = threading.Lock()
+_chromium_exe = None
+PROVISION_STATS = {"chromium_s": None, "chromium_instalado": False}
 
-# --- 🔹 Instalación garantizada de Chromium con salida controlada ---
-try:
-    if not os.path.exists(chromium_exe):
-        print("=== Instalando Chromium con dependencias del sistema ===")
-        log_path = "/tmp/playwright_install.log"
-
-        result = subprocess.run(
-            [sys.executable, "-m", "playwright", "install", "--with-deps", "chromium"],
-            env={**os.environ, "PLAYWRIGHT_BROWSERS_PATH": TMP_PLAYWRIGHT},
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            timeout=300,  # hasta 5 minutos por si el entorno es lento
-        )
-
-        with open(log_path, "w") as f:
-            f.write(result.stdout)
-
-        if result.returncode != 0:
-            print("⚠️ Error al instalar Chromium, revisando salida...")
-            raise RuntimeError(f"Fallo instalación Chromium:\n{result.stdout[:2000]}")
-        else:
-            print("✅ Chromium instalado correctamente")
-
-except Exception as e:
-    # --- Respuesta directa si esto se ejecuta dentro de Azure Function ---
-    print("❌ Error crítico instalando Chromium:", e)
-    # Crear un archivo para diagnóstico
-    with open("/tmp/playwright_install_error.log", "w") as f:
-        f.write(str(e))
-
-    # Si la función está siendo llamada dentro de Azure Functions:
+def chromium_revision():
+    """Revisión de Chromium que espera el paquete de Playwright instalado."""
     try:
-        import azure.functions as func
-        def main(req: func.HttpRequest) -> func.HttpResponse:
-            return func.HttpResponse(
-                json.dumps({
-                    "status": "error",
-                    "mensaje": f"Fallo instalación de Chromium o dependencias: {str(e)}"
-                }, ensure_ascii=False),
-                mimetype="application/json",
-                status_code=500
-            )
-    except Exception:
-        raise e  # si no es Azure Function, relanzar error normal
+        import playwright
+        browsers = Path(playwright.__file__).parent / "driver" / "package" / "browsers.json"
+        with open(browsers, "r", encoding="utf-8") as f:
+            for b in json.load(f).get("browsers", []):
+                if b.get("name") == "chromium":
+                    return str(b.get("revision"))
+    except Exception as e:
+        logging.getLogger("fsp-scraper").debug(f"No se pudo leer browsers.json: {e}")
+    return CHROMIUM_REVISION
+
+def _find_chromium(revision):
+    for folder in (f"chromium-{revision}", f"chromium_headless_shell-{revision}"):
+        exe = os.path.join(TMP_PLAYWRIGHT, folder, "chrome-linux", "headless_shell")
+        if os.path.exists(exe):
+            return exe
+    return None
 
+def ensure_chromium():
+    """Devuelve la ruta del ejecutable de Chromium, instalándolo la primera vez si falta."""
+    global _chromium_exe
+    if _chromium_exe:
+        return _chromium_exe
+    with _chromium_lock:
+        if _chromium_exe:
+            return _chromium_exe
+        log = logging.getLogger("fsp-scraper")
+        t0 = perf_counter()
+        revision = chromium_revision()
+        if revision != CHROMIUM_REVISION:
+            log.warning(f"Playwright espera Chromium {revision}, el scraper se probó con {CHROMIUM_REVISION}")
 
-from playwright.sync_api import sync_playwright  # <-- se importa después de la instalación
+        exe = _find_chromium(revision)
+        if not exe:
+            log.info("=== Instalando Chromium con dependencias del sistema ===")
+            result = subprocess.run(
+                [sys.executable, "-m", "playwright", "install", "--with-deps", "chromium"],
+                env={**os.environ, "PLAYWRIGHT_BROWSERS_PATH": TMP_PLAYWRIGHT},
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                timeout=300,  # hasta 5 minutos por si el entorno es lento
+            )
+            with open("/tmp/playwright_install.log", "w") as f:
+                f.write(result.stdout)
+            if result.returncode != 0:
+                raise RuntimeError(f"Fallo instalación Chromium:\n{result.stdout[:2000]}")
+            exe = _find_chromium(revision)
+            if not exe:
+                raise RuntimeError(f"Chromium {revision} instalado pero no se encontró headless_shell en {TMP_PLAYWRIGHT}")
+            PROVISION_STATS["chromium_instalado"] = True
+            log.info("✅ Chromium instalado correctamente")
+
+        PROVISION_STATS["chromium_s"] = round(perf_counter() - t0, 3)
+        _chromium_exe = exe
+        return exe
 
 # === 🔹 Configuración de logging ===
 DEBUG = os.getenv("SCRAPER_DEBUG", "").strip().lower() in ("1", "true", "yes", "on", "debug")
@@ -122,16 +141,7 @@ def money(v):
     v = num(v)
     return "" if v is None else f"{v:.2f}"
 
-def write_rows(rows, out_csv):
-    Path(out_csv).parent.mkdir(parents=True, exist_ok=True)
-    headers = ["UPC", "Precio sin promoción", "Precio con promoción", "Nombre del producto", "Fecha Scrapping"]
-    new = not Path(out_csv).exists()
-    with open(out_csv, "a", newline="", encoding="utf-8-sig") as f:
-        w = csv.DictWriter(f, fieldnames=headers)
-        if new:
-            w.writeheader()
-        for r in rows:
-            w.writerow(r)
+COLUMNS = ["UPC", "Precio sin promoción", "Precio con promoción", "Nombre del producto", "Fecha Scrapping"]
 
 def clean_digits(s):
     return re.sub(r"\D", "", str(s or ""))
@@ -142,10 +152,59 @@ def safe_text(r):
     except Exception:
         return "<sin cuerpo>"
 
+# === 🔹 Instrumentación de llamadas OCC ===
+def occ_stage(method, url):
+    """Etapa de una llamada a la API (para ``metrics``): búsqueda, detalle o carrito."""
+    if "/products/search" in url:
+        return "occ.search"
+    if "/products/" in url:
+        return "occ.detail"
+    if "/entries" in url:
+        return "carrito.agregar" if method == "POST" else "carrito.quitar"
+    return {"POST": "carrito.crear", "GET": "carrito.leer", "DELETE": "carrito.borrar"}.get(method, "occ")
+
+class TimedRequest:
+    """Cliente OCC que registra latencia por etapa y host de cada llamada."""
+
+    def __init__(self, context, metrics=None):
+        self._request = getattr(context, "request", context)
+        self.metrics = metrics or NULL_METRICS
+
+    def _call(self, method, send, url, kwargs):
+        self.metrics.count("peticiones")
+        with self.metrics.stage(occ_stage(method, url), urlparse(url).netloc):
+            r = send(url, **kwargs)
+        if not r.ok:
+            self.metrics.count(f"http_{r.status}")
+        return r
+
+    def get(self, url, **kwargs):
+        return self._call("GET", self._request.get, url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._call("POST", self._request.post, url, kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._call("DELETE", self._request.delete, url, kwargs)
+
 # === 🔹 Cliente API OCC ===
+# La búsqueda pide los identificadores para filtrar sin consultar detalles;
+# el detalle pide sólo los campos que usa ``upc_matches`` (en lugar de FULL).
+ID_FIELDS = ("gtin", "ean", "upc", "sku", "visualCode")
+SEARCH_FIELDS = f"products(code,name,{','.join(ID_FIELDS)})"
+DETAIL_FIELDS = (
+    f"code,name,{','.join(ID_FIELDS)},eans,gtins,upcs,"
+    "classifications(features(value,featureValues(value)))"
+)
+DETAIL_PARALLEL = 4  # detalles simultáneos por UPC en modo asíncrono
+
+# ``search`` / ``detail`` devuelven ``None`` si la petición falló (429, 5xx,
+# cuerpo ilegible) para distinguirlo de un resultado vacío: sólo un "no hay
+# coincidencias" confirmado se guarda en el caché como "No encontrado".
 class OCC:
     def __init__(self, context):
-        self.req = context.request
+        # BrowserContext de Playwright o cualquier cliente con get/post/delete (http_client)
+        self.req = getattr(context, "request", context)
 
     def search(self, q):
         url = f"{API_HOST}{PREFIX}/{SITE_ID}/products/search"
@@ -155,26 +214,26 @@ class OCC:
             "lang": LANG,
             "pageSize": "24",
             "currentPage": "0",
-            "fields": "products(code,name)",
+            "fields": SEARCH_FIELDS,
         }
         r = self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
         if not r.ok:
-            return []
+            return None
         try:
             return r.json().get("products") or []
         except Exception:
-            return []
+            return None
 
     def detail(self, code):
         url = f"{API_HOST}{PREFIX}/{SITE_ID}/products/{code}"
-        params = {"fields": "FULL", "curr": CURR, "lang": LANG}
+        params = {"fields": DETAIL_FIELDS, "curr": CURR, "lang": LANG}
         r = self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
         if not r.ok:
-            return {}
+            return None
         try:
             return r.json()
         except Exception:
-            return {}
+            return None
 
 # === 🔹 Comparación de UPC ===
 def upc_matches(detail_json, upc):
@@ -202,9 +261,29 @@ def upc_matches(detail_json, upc):
     return False
 
 # === 🔹 Gestión de carrito anónimo ===
+CART_FIELDS = (
+    "entries(entryNumber,product(code,name),"
+    "basePrice(value,formattedValue),totalPrice(value,formattedValue))"
+)
+
+def parse_entries(cart_json):
+    """Convierte la respuesta del carrito en ``{código: entrada}``."""
+    out = {}
+    for e in cart_json.get("entries") or []:
+        code = (e.get("product") or {}).get("code")
+        if not code:
+            continue
+        out[code] = {
+            "entryNumber": e.get("entryNumber"),
+            "base": num((e.get("basePrice") or {}).get("value")),
+            "total": num((e.get("totalPrice") or {}).get("value")),
+            "name": ((e.get("product") or {}).get("name") or "").strip(),
+        }
+    return out
+
 class Cart:
     def __init__(self, context):
-        self.req = context.request
+        self.req = getattr(context, "request", context)
 
     def create(self):
         base = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts"
@@ -229,42 +308,68 @@ class Cart:
         r = self.req.post(url, params=params, data=body, headers=headers, timeout=15000)
         return r.ok
 
-    def get_prices(self, cart_id, entry_idx=0):
-        fields = (
-            "entries(entryNumber,product(code,name),"
-            "basePrice(value,formattedValue),totalPrice(value,formattedValue))"
-        )
+    def get_prices(self, cart_id):
+        """Entradas del carrito indexadas por código de producto (``None`` si no se pudo leer)."""
         url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}"
-        params = {"fields": fields, "lang": LANG, "curr": CURR}
+        params = {"fields": CART_FIELDS, "lang": LANG, "curr": CURR}
         r = self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
         if not r.ok:
             return None
         try:
-            j = r.json()
-            ents = j.get("entries") or []
-            if not ents:
-                return None
-            e = ents[entry_idx]
-            base = num((e.get("basePrice") or {}).get("value"))
-            total = num((e.get("totalPrice") or {}).get("value"))
-            name = ((e.get("product") or {}).get("name") or "").strip()
-            return base, total, name
+            return parse_entries(r.json())
         except Exception:
             return None
 
-    def remove(self, cart_id, entry_idx=0):
-        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}/entries/{entry_idx}"
+    def remove(self, cart_id, entry_number):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}/entries/{entry_number}"
         try:
-            self.req.delete(url, headers=COMMON_HEADERS, timeout=10000)
+            return self.req.delete(url, headers=COMMON_HEADERS, timeout=10000).ok
         except Exception:
-            pass
+            return False
+
+    def clear(self, cart_id, entries):
+        # OCC renumera las entradas al borrar: se eliminan de la última a la primera
+        ok = True
+        for n in sorted((e["entryNumber"] for e in entries.values()), reverse=True):
+            ok = self.remove(cart_id, n) and ok
+        return ok
+
+    def delete(self, cart_id):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}"
+        try:
+            return self.req.delete(url, headers=COMMON_HEADERS, timeout=10000).ok
+        except Exception:
+            return False
+
+    def empty(self, cart_id, entries):
+        """Vacía el carrito y devuelve el id del carrito a usar a continuación.
+
+        Con más de dos entradas es más barato borrar el carrito completo y
+        crear uno nuevo (2 peticiones) que eliminar entrada por entrada.
+        """
+        if len(entries) > 2 and self.delete(cart_id):
+            new_id = self.create()
+            if new_id:
+                return new_id
+        self.clear(cart_id, entries)
+        return cart_id
+
+    def recycle(self, cart_id):
+        """Verifica que ``cart_id`` siga vigente y vacío; si no, crea otro (``None`` si no se pudo)."""
+        entries = self.get_prices(cart_id)
+        if entries:
+            self.clear(cart_id, entries)
+            entries = self.get_prices(cart_id)
+        if entries == {}:
+            return cart_id
+        logger.warning(f"Carrito {cart_id} expirado o con entradas residuales; se reemplaza.")
+        return self.create()
 
 # === 🔹 Carga de UPCs ===
 def load_upcs(path):
     p = Path(path)
     if not p.exists():
-        logger.error(f"No existe {path}. Crea un JSON lista de UPCs.")
-        sys.exit(1)
+        raise FileNotFoundError(f"No existe {path}. Crea un JSON lista de UPCs.")
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     if isinstance(data, list):
@@ -272,85 +377,709 @@ def load_upcs(path):
     elif isinstance(data, dict) and "upcs" in data:
         return [str(x) for x in data["upcs"]]
     else:
-        logger.error("upc_list.json debe ser lista JSON o un objeto con clave 'upcs'.")
-        sys.exit(1)
+        raise ValueError(f"{path} debe ser lista JSON o un objeto con clave 'upcs'.")
+
+# === 🔹 Construcción de filas de salida ===
+def empty_row(upc, name="No encontrado"):
+    return {"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": name, "Fecha Scrapping": now_str()}
+
+def price_row(upc, base, total, name):
+    promo = total if total is not None and base is not None and total < base else None
+    return {"UPC": upc, "Precio sin promoción": money(base), "Precio con promoción": money(promo), "Nombre del producto": name, "Fecha Scrapping": now_str()}
+
+def entry_row(upc, name, entries, added):
+    """Fila de precio para un UPC a partir de las entradas leídas del carrito."""
+    entry = entries.get(added) if added else None
+    if not entry:
+        return empty_row(upc, name)
+    return price_row(upc, entry["base"], entry["total"], entry["name"] or name)
+
+# === 🔹 Salida en orden de entrada ===
+_EMITTED = object()
+
+def local_sink(out_csv):
+    """Sink por defecto: CSV local utf-8-sig en modo append."""
+    return LocalFileSink(out_csv, COLUMNS, chunk_size=20, encoding="utf-8-sig", lineterminator="\r\n")
+
+class OrderedRows:
+    """Filas indexadas por posición del UPC.
+
+    Cada fila se envía al sink apenas ella y todas las anteriores están
+    completas, así la salida conserva el orden de entrada sin retener el
+    lote completo en memoria.
+
+    Entre ``start(i)`` y la fila ``i`` se mide la latencia del UPC
+    (etapa ``item``, como en ``Scraper.procesar``), incluida la espera del
+    lote de carrito.
+    """
+
+    def __init__(self, n, sink, metrics=NULL_METRICS):
+        self._rows = [None] * n
+        self._next = 0
+        self._started = {}
+        self.sink = sink
+        self.metrics = metrics
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def start(self, i):
+        self._started[i] = perf_counter()
+
+    def __setitem__(self, i, row):
+        t0 = self._started.pop(i, None)
+        if t0 is not None:
+            self.metrics.observe("item", perf_counter() - t0)
+        self._rows[i] = row
+        while self._next < len(self._rows) and self._rows[self._next] is not None:
+            self.sink.write(self._rows[self._next])
+            self._rows[self._next] = _EMITTED
+            self._next += 1
+
+    def drain(self):
+        """Escribe las filas completas que quedaron detrás de un hueco (ejecución interrumpida)."""
+        for i in range(self._next, len(self._rows)):
+            row = self._rows[i]
+            if row is not None and row is not _EMITTED:
+                self.sink.write(row)
+                self._rows[i] = _EMITTED
+
+# === 🔹 Etapas: resolución UPC → producto y precio en carrito ===
+def rank_candidates(prods, upc):
+    """Ordena los resultados de búsqueda según la probabilidad de corresponder al UPC.
+
+    La búsqueda ya trae los identificadores (``SEARCH_FIELDS``): si alguno
+    coincide se devuelve ``((code, name), [])`` sin pedir detalles. Si no,
+    ``(None, candidatos)``: primero los que tienen el UPC en el código,
+    luego los que no traen identificadores y al final los que traen otro
+    (el UPC aún puede estar en sus clasificaciones).
+    """
+    t = clean_digits(upc)
+    ranked = []
+    for n, pdt in enumerate(prods or []):
+        code = pdt.get("code")
+        if not code:
+            continue
+        ids = [clean_digits(pdt.get(k)) for k in ID_FIELDS if pdt.get(k)]
+        if t and t in ids:
+            return (code, (pdt.get("name") or "").strip()), []
+        ranked.append(((0 if t and t in clean_digits(code) else 2 if ids else 1, n), pdt))
+    return None, [pdt for _, pdt in sorted(ranked, key=lambda x: x[0])]
+
+def resolve_upc(occ, upc):
+    """Busca el producto que corresponde al UPC.
+
+    Devuelve ``(code, name)``, ``None`` si no hay coincidencia o ``MISS``
+    si alguna búsqueda o detalle falló y no se puede descartar el UPC.
+
+    Los detalles (campos acotados) se piden en orden de ``rank_candidates``
+    y se detiene en la primera coincidencia. El cliente síncrono de
+    Playwright no es thread-safe, por eso aquí van en serie; el modo
+    asíncrono los pide en paralelo.
+    """
+    prods = occ.search(upc)
+    ok = prods is not None
+    if not prods:
+        prods = occ.search(f":relevance:freeText:{upc}")
+        ok = ok and prods is not None
+    found, candidates = rank_candidates(prods or [], upc)
+    if found:
+        return found
+    for pdt in candidates:
+        dj = occ.detail(pdt["code"])
+        ok = ok and dj is not None
+        if dj and upc_matches(dj, upc):
+            return pdt["code"], (pdt.get("name") or "").strip()
+    return None if ok else MISS
+
+# --- Caché de resoluciones (ver cache_store.CacheStore) ---
+UPC_CACHE_NS = "san_pablo_upc"
+UPC_TTL_FOUND = 30 * DIA       # revalidar códigos encontrados cada 30 días
+UPC_TTL_NOT_FOUND = 7 * DIA    # reintentar "No encontrado" cada semana
+MISS = object()
+
+def cached_resolution(cache, upc):
+    """Resolución vigente del caché: ``(code, name)``, ``None`` (no encontrado) o ``MISS``."""
+    if cache is None:
+        return MISS
+    hit = cache.get(UPC_CACHE_NS, upc)
+    if not hit:
+        return MISS
+    ttl = UPC_TTL_FOUND if hit.value.get("code") else UPC_TTL_NOT_FOUND
+    if time() - hit.updated_at > ttl:
+        return MISS
+    return (hit.value["code"], hit.value.get("name") or "") if hit.value.get("code") else None
+
+def unresolved(rows, i, upc, metrics):
+    """Fila de un UPC cuya búsqueda falló (429, 5xx): no se guarda como "No encontrado"."""
+    logger.warning(f"Búsqueda incompleta para UPC {upc}; no se guarda en el caché")
+    metrics.count("errores")
+    rows[i] = empty_row(upc, f"Error: búsqueda incompleta para {upc}")
+
+def remember_resolution(cache, upc, found):
+    if cache is None:
+        return
+    code, name = found if found else (None, None)
+    cache.set(UPC_CACHE_NS, upc, {"code": code, "name": name})
+
+def forget_unpriced(cache, items, entries):
+    """Invalida los UPCs cuyo código no aparece en el carrito para volver a resolverlos.
+
+    Sólo con el carrito leído (``entries`` no es ``None``): si expiró o no
+    se pudo leer, las resoluciones siguen siendo válidas.
+    """
+    if cache is None or entries is None:
+        return
+    for upc, code, _ in items:
+        if code not in entries:
+            cache.invalidate(UPC_CACHE_NS, upc)
+
+def price_batch(cart, cart_id, items, metrics=NULL_METRICS, retry=True, cache=None):
+    """Precios de un lote ``[(upc, code, name)]`` con un solo GET del carrito.
+
+    Cada código se agrega una sola vez aunque varios UPCs lo compartan.
+    Devuelve ``(filas, cart_id)``: al vaciar el carrito puede haberse
+    sustituido por uno nuevo.
+
+    Si el carrito no se pudo leer se verifica con ``Cart.recycle`` (como
+    ``CartPool``): si expiró se crea otro y el lote se reintenta una vez en
+    el nuevo. Un código rechazado en un carrito vigente queda sin precio y
+    el resto del lote se conserva. Si no se pudo reemplazar el carrito
+    leído, se verifica que el mismo haya quedado vacío.
+    """
+    added = {}
+    for _, code, _ in items:
+        if code not in added:
+            added[code] = cart.add_entry(cart_id, code, qty=1)
+
+    entries = None
+    if any(added.values()):
+        with metrics.stage("espera_carrito"):
+            sleep(0.3)
+        entries = cart.get_prices(cart_id)
+
+    if entries is None:
+        next_id = cart.recycle(cart_id)
+        if not next_id:
+            raise RuntimeError(f"Carrito {cart_id} expirado y no se pudo crear otro")
+        if next_id != cart_id and retry:
+            return price_batch(cart, next_id, items, metrics, retry=False, cache=cache)
+    else:
+        next_id = cart.empty(cart_id, entries) if entries else cart_id
+        if next_id == cart_id and len(entries) > 2:
+            next_id = cart.recycle(next_id) or next_id
+    forget_unpriced(cache, items, entries)
+    return [entry_row(upc, name, entries or {}, added[code] and code) for upc, code, name in items], next_id
+
+# === 🔹 Transportes ===
+TRANSPORTS = ("playwright", "http")
+
+@contextmanager
+def open_transport(transport="playwright", headed=False):
+    """Cliente para la API OCC: Chromium (Playwright) o HTTP puro (``http_client``)."""
+    if transport == "http":
+        client = HttpTransport(headers={"User-Agent": COMMON_HEADERS["User-Agent"]})
+        try:
+            yield client
+        finally:
+            client.close()
+        return
+
+    from playwright.sync_api import sync_playwright
+
+    executable_path = ensure_chromium()
+    # Perfil propio por invocación: Chromium no abre dos instancias sobre el
+    # mismo directorio y varios lotes pueden correr a la vez en la instancia
+    # (shards de scrapingTodo, lotes paralelos del pipeline, cola)
+    user_data_dir = tempfile.mkdtemp(prefix="user_data_cart_", dir="/tmp")
+    try:
+        with sync_playwright() as p:
+            context = p.chromium.launch_persistent_context(
+                user_data_dir=user_data_dir,
+                executable_path=executable_path,
+                headless=not headed,
+                viewport={"width": 1280, "height": 800},
+                locale="es-MX",
+                timezone_id="America/Mexico_City",
+                args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-extensions", "--disable-gpu"],
+            )
+            try:
+                yield context
+            finally:
+                context.close()
+    finally:
+        shutil.rmtree(user_data_dir, ignore_errors=True)
 
 # === 🔹 Función principal ===
-def main(upc_path="upc_list.json", out_csv="/tmp/salida_san_pablo.csv", headed=False):
-    upcs = load_upcs(upc_path)
-    logger.info(f"Iniciando scraping. Archivo UPCs: {upc_path}. Total UPCs: {len(upcs)}")
-    rows = []
-
-    with sync_playwright() as p:
-        context = p.chromium.launch_persistent_context(
-            user_data_dir="/tmp/user_data_cart",  # ruta temporal y escribible
-            executable_path=os.path.join(
-                TMP_PLAYWRIGHT,
-                "chromium-1187",
-                "chrome-linux",
-                "headless_shell"
-            ),
-            headless=not headed,
-            viewport={"width": 1280, "height": 800},
-            locale="es-MX",
-            timezone_id="America/Mexico_City",
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-extensions", "--disable-gpu"],
-        )
-        occ = OCC(context)
-        cart = Cart(context)
-
-        cart_id = cart.create()
+def main(upc_path="upc_list.json", out_csv="/tmp/salida_san_pablo.csv", headed=False, concurrency=1, rate=None, batch_size=1, cache=None, transport="playwright", sink=None, upcs=None, deadline=None, metrics=None):
+    """Procesa un lote de UPCs.
+
+    Con ``concurrency > 1`` se usa el pipeline asíncrono (``main_async``),
+    que procesa varios UPCs a la vez con un límite de peticiones por
+    segundo (``rate``) hacia cada host. ``batch_size`` controla cuántos
+    productos se agregan al carrito antes de leer los precios.
+
+    Si se pasa ``cache`` (un ``CacheStore``), los UPCs con resolución
+    vigente se saltan la búsqueda y el detalle y van directo al carrito.
+
+    ``transport="http"`` usa un cliente HTTP con pool de conexiones en lugar
+    de Chromium; si la API lo rechaza (no se puede crear el carrito) se
+    vuelve automáticamente a Playwright.
+
+    Las filas se escriben en ``sink`` (``result_sink``) a medida que se
+    completan; por defecto, en ``out_csv``.
+
+    ``upcs`` permite pasar la lista ya filtrada (p. ej. sólo los pendientes
+    de un checkpoint) en lugar de leer ``upc_path``. Pasado ``deadline``
+    (``time.monotonic()``) no se empiezan UPCs nuevos.
+
+    ``metrics`` (``metrics.Metrics``) recibe la latencia de cada llamada
+    OCC por etapa (``occ.search``, ``occ.detail``, ``carrito.*``) y la
+    espera fija antes de leer el carrito.
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Transporte desconocido: {transport}")
+    metrics = metrics or NULL_METRICS
+    if concurrency and concurrency > 1:
+        return asyncio.run(main_async(upc_path=upc_path, out_csv=out_csv, concurrency=concurrency, rate=rate, batch_size=batch_size, cache=cache, transport=transport, sink=sink, upcs=upcs, deadline=deadline, metrics=metrics))
+
+    upcs = load_upcs(upc_path) if upcs is None else upcs
+    batch_size = max(1, batch_size or 1)
+    logger.info(f"Iniciando scraping. Archivo UPCs: {upc_path}. Total UPCs: {len(upcs)}. Lote de carrito: {batch_size}. Transporte: {transport}")
+    sink = sink or local_sink(out_csv)
+    rows = OrderedRows(len(upcs), sink, metrics)
+    pending = []  # (índice, upc, code, name) esperando precio
+
+    with ExitStack() as stack:
+        context = stack.enter_context(open_transport(transport, headed))
+        cart_id = Cart(TimedRequest(context, metrics)).create()
+        if not cart_id and transport == "http":
+            logger.warning("La API rechazó el cliente HTTP; se usa Playwright como respaldo.")
+            context = stack.enter_context(open_transport("playwright", headed))
+            cart_id = Cart(TimedRequest(context, metrics)).create()
+
+        client = TimedRequest(context, metrics)
+        occ = OCC(client)
+        cart = Cart(client)
+
         if not cart_id:
-            logger.error("Error: No se pudo crear carrito.")
-            sys.exit(1)
+            # Excepción (no sys.exit): el orquestador corre los shards en el mismo proceso
+            raise RuntimeError("No se pudo crear carrito.")
 
-        for i, upc in enumerate(upcs, 1):
-            logger.info(f"[{i}/{len(upcs)}] Procesando UPC {upc}")
+        def flush():
+            nonlocal cart_id
+            items = [(upc, code, name) for _, upc, code, name in pending]
             try:
-                prods = occ.search(upc) or occ.search(f":relevance:freeText:{upc}")
-                if not prods:
-                    rows.append({"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": "No encontrado", "Fecha Scrapping": now_str()})
-                    continue
+                priced, cart_id = price_batch(cart, cart_id, items, metrics, cache=cache)
+            except Exception as e:
+                logger.exception("Error obteniendo precios del lote")
+                metrics.count("errores", len(pending))
+                priced = [empty_row(upc, f"Error general al procesar {upc}: {e}") for _, upc, _, _ in pending]
+            for (i, _, _, _), row in zip(pending, priced):
+                rows[i] = row
+            pending.clear()
 
-                picked = None
-                for pdt in prods:
-                    code = pdt.get("code")
-                    if not code:
+        for i, upc in enumerate(upcs):
+            if deadline and monotonic() > deadline:
+                logger.warning(f"Tiempo límite alcanzado: {len(upcs) - i} UPCs quedan pendientes")
+                break
+            logger.info(f"[{i + 1}/{len(upcs)}] Procesando UPC {upc}")
+            rows.start(i)
+            try:
+                found = cached_resolution(cache, upc)
+                if found is MISS:
+                    found = resolve_upc(occ, upc)
+                    if found is MISS:
+                        unresolved(rows, i, upc, metrics)
                         continue
-                    dj = occ.detail(code)
-                    if dj and upc_matches(dj, upc):
-                        picked = pdt
-                        break
-                if not picked:
-                    rows.append({"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": "No encontrado", "Fecha Scrapping": now_str()})
+                    remember_resolution(cache, upc, found)
+                if not found:
+                    rows[i] = empty_row(upc)
                     continue
+                pending.append((i, upc, *found))
+                if len(pending) >= batch_size:
+                    flush()
+            except Exception as e:
+                logger.exception(f"Error procesando UPC {upc}")
+                metrics.count("errores")
+                rows[i] = empty_row(upc, f"Error general al procesar {upc}: {e}")
+        if pending:
+            flush()
 
-                code = picked.get("code")
-                name = (picked.get("name") or "").strip()
+    rows.drain()
+    sink.close()
+    logger.info(f"Proceso completado: {len(upcs)} UPCs procesados ({sink.count} filas escritas)")
 
-                if not cart.add_entry(cart_id, code, qty=1):
-                    rows.append({"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": name, "Fecha Scrapping": now_str()})
-                    continue
+# === 🔹 Modo asíncrono (APIRequestContext) ===
+class AsyncRateLimiter:
+    """Espaciado mínimo entre peticiones hacia un mismo host."""
 
-                sleep(0.3)
-                got = cart.get_prices(cart_id)
-                if not got:
-                    rows.append({"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": name, "Fecha Scrapping": now_str()})
-                    continue
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class AsyncHttp:
+    """Envoltorio de ``APIRequestContext`` con límite de peticiones por host y latencia por etapa."""
+
+    def __init__(self, request, rate=None, metrics=None):
+        self.request = request
+        self.rate = rate
+        self.metrics = metrics or NULL_METRICS
+        self._limiters = {}
+
+    def _limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = AsyncRateLimiter(self.rate)
+        return self._limiters[host]
+
+    async def _call(self, method, send, url, kwargs):
+        await self._limiter(url).wait()
+        self.metrics.count("peticiones")
+        with self.metrics.stage(occ_stage(method, url), urlparse(url).netloc):
+            r = await send(url, **kwargs)
+        if not r.ok:
+            self.metrics.count(f"http_{r.status}")
+        return r
+
+    async def get(self, url, **kwargs):
+        return await self._call("GET", self.request.get, url, kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self._call("POST", self.request.post, url, kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self._call("DELETE", self.request.delete, url, kwargs)
+
+class AsyncOCC:
+    def __init__(self, http):
+        self.req = http
+
+    async def search(self, q):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/products/search"
+        params = {
+            "query": q,
+            "curr": CURR,
+            "lang": LANG,
+            "pageSize": "24",
+            "currentPage": "0",
+            "fields": SEARCH_FIELDS,
+        }
+        r = await self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
+        if not r.ok:
+            return None
+        try:
+            return (await r.json()).get("products") or []
+        except Exception:
+            return None
+
+    async def detail(self, code):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/products/{code}"
+        params = {"fields": DETAIL_FIELDS, "curr": CURR, "lang": LANG}
+        r = await self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
+        if not r.ok:
+            return None
+        try:
+            return await r.json()
+        except Exception:
+            return None
 
-                base, total, name2 = got
-                if name2:
-                    name = name2
-                promo = total if total is not None and base is not None and total < base else None
+class AsyncCart:
+    def __init__(self, http):
+        self.req = http
 
-                rows.append({"UPC": upc, "Precio sin promoción": money(base), "Precio con promoción": money(promo), "Nombre del producto": name, "Fecha Scrapping": now_str()})
-                cart.remove(cart_id)
+    async def create(self):
+        base = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts"
+        r = await self.req.post(base, params={"lang": LANG, "curr": CURR}, headers=COMMON_HEADERS, timeout=15000)
+        if not r.ok:
+            return None
+        try:
+            j = await r.json()
+        except Exception:
+            return None
+        return j.get("guid") or j.get("code") or None
+
+    async def add_entry(self, cart_id, code, qty=1):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}/entries"
+        params = {"lang": LANG, "curr": CURR}
+        headers = {**COMMON_HEADERS, "Content-Type": "application/json"}
+        body = json.dumps({"product": {"code": code}, "quantity": qty})
+        r = await self.req.post(url, params=params, data=body, headers=headers, timeout=15000)
+        return r.ok
+
+    async def get_prices(self, cart_id):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}"
+        params = {"fields": CART_FIELDS, "lang": LANG, "curr": CURR}
+        r = await self.req.get(url, params=params, headers=COMMON_HEADERS, timeout=15000)
+        if not r.ok:
+            return None
+        try:
+            return parse_entries(await r.json())
+        except Exception:
+            return None
+
+    async def remove(self, cart_id, entry_number):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}/entries/{entry_number}"
+        try:
+            return (await self.req.delete(url, headers=COMMON_HEADERS, timeout=10000)).ok
+        except Exception:
+            return False
+
+    async def clear(self, cart_id, entries):
+        ok = True
+        for n in sorted((e["entryNumber"] for e in entries.values()), reverse=True):
+            ok = await self.remove(cart_id, n) and ok
+        return ok
+
+    async def delete(self, cart_id):
+        url = f"{API_HOST}{PREFIX}/{SITE_ID}/users/anonymous/carts/{cart_id}"
+        try:
+            return (await self.req.delete(url, headers=COMMON_HEADERS, timeout=10000)).ok
+        except Exception:
+            return False
+
+    async def empty(self, cart_id, entries):
+        if len(entries) > 2 and await self.delete(cart_id):
+            new_id = await self.create()
+            if new_id:
+                return new_id
+        await self.clear(cart_id, entries)
+        return cart_id
+
+    async def recycle(self, cart_id):
+        entries = await self.get_prices(cart_id)
+        if entries:
+            await self.clear(cart_id, entries)
+            entries = await self.get_prices(cart_id)
+        if entries == {}:
+            return cart_id
+        logger.warning(f"Carrito {cart_id} expirado o con entradas residuales; se reemplaza.")
+        return await self.create()
+
+class CartLease:
+    """Carrito prestado por el pool; ``cart_id`` puede cambiar si se reemplaza."""
+
+    def __init__(self, cart_id):
+        self.cart_id = cart_id
+        self.original = cart_id
+
+class CartPool:
+    """Pool de carritos anónimos que se prestan a los workers.
+
+    Cada préstamo entrega un carrito vacío. Al devolverlo se verifica que
+    haya quedado vacío; si expiró o no se pudo vaciar se reemplaza por uno
+    nuevo. Los carritos recién creados durante el préstamo no se verifican.
+    """
+
+    def __init__(self, cart, size):
+        self.cart = cart
+        self.size = size
+        self.alive = 0
+        self._free = asyncio.Queue()
+
+    async def start(self):
+        ids = await asyncio.gather(*(self.cart.create() for _ in range(self.size)))
+        for cart_id in ids:
+            if cart_id:
+                self._free.put_nowait(cart_id)
+        self.alive = self._free.qsize()
+        logger.info(f"Pool de carritos listo: {self.alive}/{self.size}")
+        return self.alive
+
+    @asynccontextmanager
+    async def lease(self):
+        if self.alive <= 0:
+            raise RuntimeError("No hay carritos disponibles en el pool")
+        cart_id = await self._free.get()
+        if cart_id is None:
+            # Pool agotado: se propaga el aviso a los demás workers en espera
+            self._free.put_nowait(None)
+            raise RuntimeError("No hay carritos disponibles en el pool")
+        lease = CartLease(cart_id)
+        try:
+            yield lease
+        finally:
+            cart_id = lease.cart_id
+            if cart_id == lease.original:
+                cart_id = await self.cart.recycle(cart_id)
+            if cart_id:
+                self._free.put_nowait(cart_id)
+            else:
+                self.alive -= 1
+                logger.error("No se pudo recrear un carrito; el pool se reduce.")
+                if self.alive <= 0:
+                    self._free.put_nowait(None)
+
+@asynccontextmanager
+async def open_async_transport(transport="playwright", pool_size=10):
+    """``APIRequestContext`` de Playwright (sin navegador) o ``AsyncHttpTransport``."""
+    if transport == "http":
+        client = AsyncHttpTransport(headers={"User-Agent": COMMON_HEADERS["User-Agent"]}, pool_size=pool_size)
+        try:
+            yield client
+        finally:
+            await client.dispose()
+        return
+
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        request = await p.request.new_context(extra_http_headers={"User-Agent": COMMON_HEADERS["User-Agent"]})
+        try:
+            yield request
+        finally:
+            await request.dispose()
+
+async def resolve_upc_async(occ, upc, parallel=DETAIL_PARALLEL):
+    """Versión asíncrona de ``resolve_upc``: detalles en tandas de ``parallel``.
+
+    En cada tanda gana la primera respuesta que coincide y se cancelan las
+    demás; la siguiente tanda sólo se pide si ninguna coincidió.
+    """
+    prods = await occ.search(upc)
+    ok = prods is not None
+    if not prods:
+        prods = await occ.search(f":relevance:freeText:{upc}")
+        ok = ok and prods is not None
+    found, candidates = rank_candidates(prods or [], upc)
+    if found:
+        return found
+
+    async def check(pdt):
+        nonlocal ok
+        dj = await occ.detail(pdt["code"])
+        ok = ok and dj is not None
+        return (pdt["code"], (pdt.get("name") or "").strip()) if dj and upc_matches(dj, upc) else None
+
+    for i in range(0, len(candidates), max(1, parallel)):
+        tasks = [asyncio.ensure_future(check(pdt)) for pdt in candidates[i:i + parallel]]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result:
+                    return result
+        finally:
+            for task in tasks:
+                task.cancel()
+    return None if ok else MISS
+
+async def price_batch_async(cart, pool, items, metrics=NULL_METRICS, cache=None):
+    """Versión asíncrona de ``price_batch`` usando un carrito prestado del pool."""
+    async with pool.lease() as lease:
+        added = {}
+        for _, code, _ in items:
+            if code not in added:
+                added[code] = await cart.add_entry(lease.cart_id, code, qty=1)
+
+        entries = None
+        if any(added.values()):
+            with metrics.stage("espera_carrito"):
+                await asyncio.sleep(0.3)
+            entries = await cart.get_prices(lease.cart_id)
+        if entries:
+            lease.cart_id = await cart.empty(lease.cart_id, entries)
+    forget_unpriced(cache, items, entries)
+    return [entry_row(upc, name, entries or {}, added[code] and code) for upc, code, name in items]
+
+async def main_async(upc_path="upc_list.json", out_csv="/tmp/salida_san_pablo.csv", concurrency=4, rate=None, batch_size=1, cache=None, transport="playwright", sink=None, upcs=None, deadline=None, metrics=None):
+    """Pipeline concurrente: ``concurrency`` workers que comparten un pool de carritos.
+
+    Cada worker resuelve UPCs y, cada ``batch_size`` productos encontrados,
+    obtiene sus precios en un carrito del pool. Las filas se escriben en el
+    mismo orden que los UPCs de entrada, por lo que la salida es
+    equivalente a la del modo secuencial.
+    """
+    upcs = load_upcs(upc_path) if upcs is None else upcs
+    batch_size = max(1, batch_size or 1)
+    metrics = metrics or NULL_METRICS
+    logger.info(f"Iniciando scraping asíncrono. Archivo UPCs: {upc_path}. Total UPCs: {len(upcs)}. Concurrencia: {concurrency}. Lote de carrito: {batch_size}")
+    sink = sink or local_sink(out_csv)
+    rows = OrderedRows(len(upcs), sink, metrics)
+    queue = asyncio.Queue()
+    for i, upc in enumerate(upcs):
+        queue.put_nowait((i, upc))
+
+    workers = max(1, min(concurrency, len(upcs)))
+    async with AsyncExitStack() as stack:
+        request = await stack.enter_async_context(open_async_transport(transport, workers))
+        http = AsyncHttp(request, rate=rate, metrics=metrics)
+        occ = AsyncOCC(http)
+        cart = AsyncCart(http)
+        pool = CartPool(cart, workers)
+        if not await pool.start() and transport == "http":
+            logger.warning("La API rechazó el cliente HTTP; se usa Playwright como respaldo.")
+            http.request = await stack.enter_async_context(open_async_transport("playwright", workers))
+            await pool.start()
+        if not pool.alive:
+            logger.error("Error: No se pudo crear ningún carrito.")
+
+        async def flush(pending):
+            items = [(upc, code, name) for _, upc, code, name in pending]
+            try:
+                priced = await price_batch_async(cart, pool, items, metrics, cache=cache)
             except Exception as e:
-                logger.exception(f"Error procesando UPC {upc}")
-                rows.append({"UPC": upc, "Precio sin promoción": "-", "Precio con promoción": "-", "Nombre del producto": f"Error general al procesar {upc}: {e}", "Fecha Scrapping": now_str()})
+                if pool.alive <= 0:
+                    # Sin carritos: quedan sin fila (pendientes) y el shard falla al final
+                    pending.clear()
+                    return
+                logger.exception("Error obteniendo precios del lote")
+                metrics.count("errores", len(pending))
+                priced = [empty_row(upc, f"Error general al procesar {upc}: {e}") for _, upc, _, _ in pending]
+            for (i, _, _, _), row in zip(pending, priced):
+                rows[i] = row
+            pending.clear()
+
+        async def worker(n):
+            pending = []
+            while pool.alive > 0:
+                if deadline and monotonic() > deadline:
+                    break
+                try:
+                    i, upc = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                logger.info(f"[{i + 1}/{len(upcs)}] Procesando UPC {upc} (worker {n})")
+                rows.start(i)
+                try:
+                    found = cached_resolution(cache, upc)
+                    if found is MISS:
+                        found = await resolve_upc_async(occ, upc)
+                        if found is MISS:
+                            unresolved(rows, i, upc, metrics)
+                            continue
+                        remember_resolution(cache, upc, found)
+                    if not found:
+                        rows[i] = empty_row(upc)
+                        continue
+                    pending.append((i, upc, *found))
+                    if len(pending) >= batch_size:
+                        await flush(pending)
+                except Exception as e:
+                    logger.exception(f"Error procesando UPC {upc}")
+                    metrics.count("errores")
+                    rows[i] = empty_row(upc, f"Error general al procesar {upc}: {e}")
+            if pending:
+                await flush(pending)
 
-        context.close()
+        await asyncio.gather(*(worker(n) for n in range(workers)))
 
-    write_rows(rows, out_csv)
-    logger.info(f"Proceso completado: {len(upcs)} UPCs procesados")
-    logger.info(f"Resultados guardados en: {out_csv}")
+    rows.drain()
+    sink.close()
+    # UPCs sin procesar porque ningún carrito pudo crearse: sin fila no se
+    # marcan en el checkpoint y la ejecución los reintenta al reanudarse
+    faltan = sum(1 for i in range(len(upcs)) if rows[i] is None)
+    if pool.alive <= 0 and faltan:
+        raise RuntimeError(f"No se pudo crear carrito: {faltan} UPCs sin procesar")
+    logger.info(f"Proceso completado: {len(upcs)} UPCs procesados ({sink.count} filas escritas)")
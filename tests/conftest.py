@@ -0,0 +1,124 @@
+import itertools
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# === 🔹 Contenedor de Blob Storage en memoria ===
+# Implementa el subconjunto de ``ContainerClient`` / ``BlobClient`` que usan
+# checkpoint, price_diff y work_queue, con las mismas condiciones que el
+# servicio: ``overwrite=False`` falla si el blob existe, ETag con
+# ``IfNotModified`` / ``IfMissing`` y append blobs que se reemplazan al
+# volver a crearlos.
+
+_etags = itertools.count(1)
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.blob_name = name
+
+    def _blob(self):
+        blob = self.container.blobs.get(self.blob_name)
+        if blob is None:
+            raise ResourceNotFoundError(f"{self.blob_name} no existe")
+        return blob
+
+    def _verificar(self, etag=None, match_condition=None):
+        actual = self.container.blobs.get(self.blob_name)
+        if match_condition == MatchConditions.IfMissing and actual is not None:
+            raise ResourceExistsError(f"{self.blob_name} ya existe")
+        if match_condition == MatchConditions.IfNotModified and (actual is None or actual["etag"] != etag):
+            raise ResourceModifiedError(f"{self.blob_name} fue modificado")
+
+    def _guardar(self, data):
+        self.container.blobs[self.blob_name] = {"data": bytearray(data), "etag": str(next(_etags))}
+
+    def exists(self):
+        return self.blob_name in self.container.blobs
+
+    def get_blob_properties(self):
+        with self.container.lock:
+            blob = self._blob()
+            return SimpleNamespace(etag=blob["etag"], size=len(blob["data"]))
+
+    def download_blob(self):
+        with self.container.lock:
+            blob = self._blob()
+            data, etag = bytes(blob["data"]), blob["etag"]
+        return SimpleNamespace(
+            readall=lambda: data,
+            readinto=lambda f: f.write(data),
+            chunks=lambda: iter([data[i:i + 64] for i in range(0, len(data), 64)]),
+            properties=SimpleNamespace(etag=etag),
+        )
+
+    def upload_blob(self, data, overwrite=False, etag=None, match_condition=None, **kwargs):
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.container.lock:
+            if not overwrite and self.exists():
+                raise ResourceExistsError(f"{self.blob_name} ya existe")
+            self._verificar(etag, match_condition)
+            self._guardar(data)
+
+    def create_append_blob(self, etag=None, match_condition=None, **kwargs):
+        with self.container.lock:
+            self._verificar(etag, match_condition)
+            self._guardar(b"")
+            self.container.creados[self.blob_name] = self.container.creados.get(self.blob_name, 0) + 1
+
+    def append_block(self, data, **kwargs):
+        with self.container.lock:
+            blob = self._blob()
+            blob["data"] += data
+            blob["etag"] = str(next(_etags))
+
+    def stage_block(self, block_id, data, **kwargs):
+        with self.container.lock:
+            self.container.bloques.setdefault(self.blob_name, {})[block_id] = bytes(data)
+
+    def commit_block_list(self, blocks, **kwargs):
+        with self.container.lock:
+            staged = self.container.bloques.pop(self.blob_name, {})
+            self._guardar(b"".join(staged[b.id] for b in blocks))
+
+    def delete_blob(self, **kwargs):
+        with self.container.lock:
+            self._blob()
+            del self.container.blobs[self.blob_name]
+
+
+class FakeContainerClient:
+    def __init__(self):
+        self.blobs = {}
+        self.bloques = {}    # bloques sin confirmar por blob
+        self.creados = {}    # veces que se creó cada append blob
+        self.lock = threading.RLock()
+
+    def get_blob_client(self, blob):
+        return FakeBlobClient(self, blob)
+
+    def list_blobs(self, name_starts_with=""):
+        with self.lock:
+            return [SimpleNamespace(name=n) for n in sorted(self.blobs) if n.startswith(name_starts_with)]
+
+    def delete_blob(self, blob, **kwargs):
+        self.get_blob_client(blob).delete_blob()
+
+    def texto(self, nombre):
+        return bytes(self.blobs[nombre]["data"]).decode("utf-8-sig")
+
+
+@pytest.fixture
+def container():
+    return FakeContainerClient()
@@ -0,0 +1,38 @@
+import pytest
+
+from checkpoint import CHECKPOINT_PREFIX
+from scraper_registry import SCRAPERS, Scraper, ejecutar_scraper, registrar_scraper
+
+# Invocaciones con ``?agenda=1`` (``refresh_scheduler``) sobre el contenedor
+# en memoria de ``conftest``.
+
+
+class ScraperAgenda(Scraper):
+    origen = "Prueba Agenda"
+    run_id = "agenda_{lote}_{fecha}"
+    blob_salida = "Scrapping/Agenda/precios_{lote}_{fecha}.csv"
+    cache_blob = "Scrapping/_cache/prueba_agenda.sqlite"
+    usa_http = False
+    max_workers = 1
+
+    def obtener(self, codigo):
+        return {"Barra": codigo, "Precio": "10.00"}
+
+
+@pytest.fixture
+def fuente(tmp_path):
+    ScraperAgenda.cache_local = str(tmp_path / "cache_{fecha}.sqlite")
+    registrar_scraper("prueba_agenda")(ScraperAgenda)
+    yield "prueba_agenda"
+    SCRAPERS.pop("prueba_agenda", None)
+
+
+def test_agenda_borra_el_checkpoint(container, fuente):
+    codigos = [f"{7500000000000 + i}" for i in range(5)]
+
+    resultado = ejecutar_scraper(fuente, {"agenda": "1", "formato": "csv"}, container, codigos)
+
+    assert resultado["status"] == "ok"
+    assert resultado["registros"] == 5
+    assert resultado["agenda"]["seleccionados"] == 5
+    assert not container.list_blobs(name_starts_with=f"{CHECKPOINT_PREFIX}/")
@@ -0,0 +1,31 @@
+import pytest
+
+from barcode_index import BarcodeIndex, normalizar_codigo
+
+# Normalización y deduplicación de los códigos de entrada.
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("7501055300075", ("7501055300075", "valido")),
+    ("036000291452", ("036000291452", "valido")),
+    ("36000291452", ("036000291452", "corregido")),        # UPC-A que perdió el cero inicial
+    (36000291452, ("036000291452", "corregido")),
+    ("36000291452.0", ("036000291452", "corregido")),
+    ("0036000291452", ("0036000291452", "valido")),
+    ("36000291453", ("36000291453", "digito_invalido")),
+    ("7501055300076", ("7501055300076", "digito_invalido")),
+    ("8054083027166-1", ("8054083027166-1", "alfanumerico")),
+    ("7.50105E+12", (None, "malformado")),
+    ("nan", (None, "malformado")),
+    ("12345", (None, "malformado")),
+])
+def test_normalizar_codigo(valor, esperado):
+    assert normalizar_codigo(valor) == esperado
+
+
+def test_deduplica_por_gtin():
+    indice = BarcodeIndex.desde_valores(["036000291452", "36000291452", "00036000291452", "7501055300075"])
+
+    assert indice.codigos == ["036000291452", "7501055300075"]
+    assert indice.stats["duplicado"] == 2
+    assert "0036000291452" in indice
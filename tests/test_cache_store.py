@@ -0,0 +1,50 @@
+import time
+
+from cache_store import DIA, LAPIDA_TTL, CacheStore
+
+# Caché SQLite: descarte de lo vencido al subirla al contenedor en memoria.
+
+
+def envejecer(cache, namespace, key, dias):
+    with cache._lock:
+        cache._conn.execute(
+            "UPDATE cache SET updated_at = ? WHERE namespace = ? AND key = ?",
+            (time.time() - dias * DIA, namespace, key),
+        )
+        cache._conn.commit()
+
+
+def test_purge_por_namespace(tmp_path):
+    cache = CacheStore(tmp_path / "c.sqlite")
+    cache.set("http", "vieja", {"etag": "1"})
+    cache.set("http", "nueva", {"etag": "2"})
+    cache.set("sin_ttl", "vieja", {"x": 1})
+    cache.invalidate("sin_ttl", "lapida")
+    for ns, key in (("http", "vieja"), ("sin_ttl", "vieja"), ("sin_ttl", "lapida")):
+        envejecer(cache, ns, key, LAPIDA_TTL / DIA + 1)
+
+    assert cache.purge({"http": 30 * DIA}) == 2
+
+    assert cache.get("http", "vieja") is None
+    assert cache.get("http", "nueva").value == {"etag": "2"}
+    assert cache.get("sin_ttl", "vieja").value == {"x": 1}
+    cache.close()
+
+
+def test_to_blob_no_recupera_lo_vencido_de_la_copia_remota(tmp_path, container):
+    blob = container.get_blob_client("Scrapping/_cache/prueba.sqlite")
+    a = CacheStore.from_blob(blob, tmp_path / "a.sqlite")
+    a.set("http", "vieja", {"etag": "1"})
+    a.set("http", "nueva", {"etag": "2"})
+    envejecer(a, "http", "vieja", 40)
+    assert a.to_blob(blob)  # la copia remota conserva la entrada vencida
+    a.close()
+
+    c = CacheStore(tmp_path / "c.sqlite")  # otra instancia, sin esa entrada local
+    assert c.to_blob(blob, ttls={"http": 30 * DIA})
+    c.close()
+
+    b = CacheStore.from_blob(blob, tmp_path / "b.sqlite")
+    assert b.get("http", "vieja") is None
+    assert b.get("http", "nueva").value == {"etag": "2"}
+    b.close()
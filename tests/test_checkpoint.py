@@ -0,0 +1,25 @@
+from checkpoint import BlobRun
+
+# Partes de una ejecución reanudable sobre el contenedor en memoria.
+
+
+def escribir(sink, codigos):
+    with sink:
+        for codigo in codigos:
+            sink.write({"Barra": codigo, "Precio": "10.00"})
+
+
+def test_invocaciones_simultaneas_no_comparten_parte(container):
+    a = BlobRun(container, "run", "final.csv", ["Barra", "Precio"], "Barra")
+    b = BlobRun(container, "run", "final.csv", ["Barra", "Precio"], "Barra")
+    # Ambas eligen la parte antes de que la otra escriba
+    sink_a, sink_b = a.part_sink(chunk_size=1), b.part_sink(chunk_size=1)
+    escribir(sink_a, ["1", "2"])
+    escribir(sink_b, ["3"])
+
+    assert len(a._parts()) == 2
+    cierre = BlobRun(container, "run", "final.csv", ["Barra", "Precio"], "Barra")
+    assert cierre.finish(cierre.pending(["1", "2", "3"]))
+    filas = container.texto("final.csv").splitlines()
+    assert filas[0] == "Barra,Precio"
+    assert sorted(filas[1:]) == ["1,10.00", "2,10.00", "3,10.00"]
@@ -0,0 +1,57 @@
+import pytest
+
+from price_extraction import EXTRACTORES, get_extractor
+
+# Los tres motores de Farmacias Especializadas deben coincidir con bs4 (la
+# implementación original) en las mismas páginas.
+
+
+def motor(nombre):
+    try:
+        return get_extractor(nombre)
+    except RuntimeError as e:  # bs4 / lxml no instalados
+        pytest.skip(str(e))
+
+
+PAGINAS = {
+    "data_price_amount": '<div><span class="price-wrapper" data-price-amount="123.5"><span class="price">$ 123.50</span></span></div>',
+    "meta_itemprop": '<head><meta itemprop="price" content="89.90"></head><body><p>Sin span</p></body>',
+    "span_price": '<div class="price-box"><span class="price">$ 1,234.00</span></div>',
+    "special_price": '<div><span class="special-price"><span>$ 77.00</span></span></div>',
+    "texto": "<div><p>Precio: $ 45.00 MXN</p></div>",
+    "sin_precio": "<div><p>Producto agotado</p></div>",
+    "amount_en_comentario": '<!-- <span data-price-amount="1"> --><div><span data-price-amount="55.5"></span></div>',
+    "meta_en_comentario": '<!-- <meta itemprop="price" content="2"> --><div><span class="price">$ 64.00</span></div>',
+    "precio_en_script": '<script>var p = "$ 12.00";</script><div><p>Total $ 30.00</p></div>',
+    "precio_en_style": "<style>.a:after { content: '$ 9.00'; }</style><p>$ 18.00</p>",
+    "span_en_script": "<script>document.write('<span class=\"price\">$ 5.00</span>')</script><p>$ 40.00</p>",
+}
+
+ENLACES = {
+    "enlace": '<ol><li><a class="product-item-link" href="/p/1.html">Producto</a></li></ol>',
+    "enlace_en_comentario": '<!-- <a class="product-item-link" href="/viejo.html"> --><a class="product-item-link" href="/p/2.html">P</a>',
+    "sin_enlace": "<ol><li><a class=\"otro\" href=\"/x.html\">X</a></li></ol>",
+}
+
+
+@pytest.mark.parametrize("nombre", [n for n in EXTRACTORES if n != "bs4"])
+@pytest.mark.parametrize("pagina", PAGINAS)
+def test_precio_igual_a_bs4(nombre, pagina):
+    referencia = motor("bs4").precio(PAGINAS[pagina])
+
+    assert motor(nombre).precio(PAGINAS[pagina]) == referencia
+
+
+@pytest.mark.parametrize("nombre", [n for n in EXTRACTORES if n != "bs4"])
+@pytest.mark.parametrize("pagina", ENLACES)
+def test_enlace_igual_a_bs4(nombre, pagina):
+    referencia = motor("bs4").enlace_producto(ENLACES[pagina])
+
+    assert motor(nombre).enlace_producto(ENLACES[pagina]) == referencia
+
+
+def test_precios_de_referencia():
+    bs4 = motor("bs4")
+
+    assert bs4.precio(PAGINAS["amount_en_comentario"]) == 55.5
+    assert bs4.precio(PAGINAS["precio_en_script"]) == 30.0
@@ -0,0 +1,245 @@
+import json
+import re
+from contextlib import asynccontextmanager, contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import scrapper_san_pablo as sp
+from cache_store import CacheStore
+
+# API OCC de San Pablo simulada (búsqueda, detalle y carritos anónimos) para
+# ``scrapper_san_pablo.main`` con el transporte HTTP.
+
+
+def respuesta(status=200, cuerpo=None):
+    return SimpleNamespace(ok=200 <= status < 300, status=status, json=lambda: cuerpo)
+
+
+class FakeOCC:
+    """Servidor OCC en memoria; ``fallas`` fija un código de estado por ruta (``search``, ``create``…)."""
+
+    def __init__(self, productos, fallas=None):
+        self.productos = productos  # código → {"name", "gtin", "precio"}
+        self.fallas = dict(fallas or {})
+        self.carritos = {}          # id → [códigos]
+        self.creados = 0
+        self.llamadas = []
+
+    def _falla(self, ruta):
+        status = self.fallas.get(ruta)
+        return respuesta(status) if status else None
+
+    def get(self, url, params=None, **kwargs):
+        if url.endswith("/products/search"):
+            self.llamadas.append("search")
+            if falla := self._falla("search"):
+                return falla
+            q = params["query"].rsplit(":", 1)[-1]
+            prods = [{"code": c, "name": p["name"], "gtin": p["gtin"]} for c, p in self.productos.items() if p["gtin"] == q]
+            return respuesta(cuerpo={"products": prods})
+        if m := re.search(r"/products/([^/]+)$", url):
+            self.llamadas.append("detail")
+            if falla := self._falla("detail"):
+                return falla
+            p = self.productos.get(m.group(1))
+            return respuesta(cuerpo={"code": m.group(1), **p}) if p else respuesta(404)
+        cart_id = url.rsplit("/", 1)[-1]
+        self.llamadas.append("get_cart")
+        if cart_id not in self.carritos:
+            return respuesta(404)
+        return respuesta(cuerpo={"entries": [
+            {"entryNumber": n, "product": {"code": c, "name": self.productos[c]["name"]},
+             "basePrice": {"value": self.productos[c]["precio"]}, "totalPrice": {"value": self.productos[c]["precio"]}}
+            for n, c in enumerate(self.carritos[cart_id])
+        ]})
+
+    def post(self, url, data=None, **kwargs):
+        if url.endswith("/carts"):
+            self.llamadas.append("create")
+            if falla := self._falla("create"):
+                return falla
+            self.creados += 1
+            cart_id = f"c{self.creados}"
+            self.carritos[cart_id] = []
+            return respuesta(201, {"guid": cart_id})
+        cart_id = url.split("/carts/")[1].split("/")[0]
+        code = json.loads(data)["product"]["code"]
+        self.llamadas.append("add")
+        if cart_id not in self.carritos or code in self.fallas.get("rechazados", ()):
+            return respuesta(400)
+        self.carritos[cart_id].append(code)
+        return respuesta(200)
+
+    def delete(self, url, **kwargs):
+        self.llamadas.append("delete")
+        partes = url.split("/carts/")[1].split("/")
+        if partes[0] not in self.carritos:
+            return respuesta(404)
+        if len(partes) == 1:
+            del self.carritos[partes[0]]
+        else:
+            self.carritos[partes[0]].pop(int(partes[2]))
+        return respuesta(200)
+
+    def close(self):
+        pass
+
+
+class AsyncFakeOCC:
+    """``FakeOCC`` con la interfaz asíncrona de ``APIRequestContext``."""
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+
+    @staticmethod
+    def _asincrona(r):
+        async def json():
+            return r.json()
+        return SimpleNamespace(ok=r.ok, status=r.status, json=json)
+
+    async def get(self, url, **kwargs):
+        return self._asincrona(self.servidor.get(url, **kwargs))
+
+    async def post(self, url, **kwargs):
+        return self._asincrona(self.servidor.post(url, **kwargs))
+
+    async def delete(self, url, **kwargs):
+        return self._asincrona(self.servidor.delete(url, **kwargs))
+
+
+class ListSink:
+    def __init__(self):
+        self.filas = []
+
+    @property
+    def count(self):
+        return len(self.filas)
+
+    def write(self, row):
+        self.filas.append(row)
+
+    def close(self):
+        pass
+
+
+PRODUCTOS = {
+    "P1": {"name": "Paracetamol", "gtin": "7501000000011", "precio": 35.5},
+    "P2": {"name": "Ibuprofeno", "gtin": "7501000000028", "precio": 48.0},
+    "P3": {"name": "Loratadina", "gtin": "7501000000035", "precio": 61.0},
+    "P4": {"name": "Omeprazol", "gtin": "7501000000042", "precio": 89.9},
+}
+
+
+@pytest.fixture
+def occ(monkeypatch):
+    servidor = FakeOCC(PRODUCTOS)
+
+    @contextmanager
+    def transporte(transport="playwright", headed=False):
+        yield servidor
+
+    @asynccontextmanager
+    async def transporte_async(transport="playwright", pool_size=10):
+        yield AsyncFakeOCC(servidor)
+
+    monkeypatch.setattr(sp, "open_transport", transporte)
+    monkeypatch.setattr(sp, "open_async_transport", transporte_async)
+    monkeypatch.setattr(sp, "sleep", lambda s: None)
+    return servidor
+
+
+@pytest.fixture
+def cache(tmp_path):
+    store = CacheStore(tmp_path / "cache.sqlite")
+    yield store
+    store.close()
+
+
+def scrapear(upcs, cache=None, batch_size=1, concurrency=1, sink=None):
+    sink = sink or ListSink()
+    sp.main(upcs=upcs, sink=sink, cache=cache, transport="http", batch_size=batch_size, concurrency=concurrency)
+    return sink.filas
+
+
+def test_busqueda_limitada_no_se_guarda_como_no_encontrado(occ, cache):
+    occ.fallas["search"] = 429
+
+    filas = scrapear(["7501000000011"], cache)
+
+    assert filas[0]["Precio sin promoción"] == "-"
+    assert filas[0]["Nombre del producto"].startswith("Error")
+    assert cache.get(sp.UPC_CACHE_NS, "7501000000011") is None
+
+    # Sin el límite el UPC se resuelve y se guarda
+    del occ.fallas["search"]
+    filas = scrapear(["7501000000011"], cache)
+
+    assert filas[0]["Nombre del producto"] == "Paracetamol"
+    assert cache.get(sp.UPC_CACHE_NS, "7501000000011").value["code"] == "P1"
+
+
+def test_no_encontrado_confirmado_se_guarda(occ, cache):
+    filas = scrapear(["7509999999994"], cache)
+
+    assert filas[0]["Nombre del producto"] == "No encontrado"
+    assert cache.get(sp.UPC_CACHE_NS, "7509999999994").value == {"code": None, "name": None}
+
+
+def test_codigo_rechazado_conserva_el_lote(occ):
+    occ.fallas["rechazados"] = {"P2"}
+
+    filas = scrapear(["7501000000011", "7501000000028", "7501000000035", "7501000000042"], batch_size=4)
+
+    assert [f["Precio sin promoción"] for f in filas] == ["35.50", "-", "61.00", "89.90"]
+    assert filas[1]["Nombre del producto"] == "Ibuprofeno"
+    # Un solo carrito vivo: el reemplazo del vaciado, sin reintentos ni carritos huérfanos
+    assert list(occ.carritos.values()) == [[]]
+    assert occ.creados == 2
+    assert occ.llamadas.count("add") == 4
+
+
+def test_carrito_expirado_reintenta_el_lote(occ):
+    def expira(url, _post=occ.post, **kwargs):
+        if "/entries" in url and "c1" in occ.carritos:
+            del occ.carritos["c1"]
+        return _post(url, **kwargs)
+
+    occ.post = expira
+
+    filas = scrapear(["7501000000011", "7501000000028"], batch_size=2)
+
+    assert [f["Nombre del producto"] for f in filas] == ["Paracetamol", "Ibuprofeno"]
+    assert list(occ.carritos) == ["c2"]
+
+
+def test_sin_carrito_lanza_excepcion(occ):
+    occ.fallas["create"] = 503
+
+    with pytest.raises(RuntimeError):
+        scrapear(["7501000000011"])
+
+
+def test_archivo_de_upcs_invalido(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        sp.load_upcs(tmp_path / "no_existe.json")
+    (tmp_path / "upcs.json").write_text('{"codigos": []}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        sp.load_upcs(tmp_path / "upcs.json")
+
+
+def test_asincrono_sin_carrito_no_escribe_filas(occ):
+    occ.fallas["create"] = 503
+    sink = ListSink()
+
+    with pytest.raises(RuntimeError, match="2 UPCs sin procesar"):
+        scrapear(["7501000000011", "7501000000028"], concurrency=2, sink=sink)
+
+    # Sin filas de error: el checkpoint no los da por terminados
+    assert sink.filas == []
+
+
+def test_asincrono_precios(occ, cache):
+    filas = scrapear(["7501000000011", "7509999999994", "7501000000035"], cache, concurrency=2)
+
+    assert [f["Nombre del producto"] for f in filas] == ["Paracetamol", "No encontrado", "Loratadina"]
@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+import work_queue
+from checkpoint import CHECKPOINT_PREFIX, BlobCheckpointStore
+from scraper_registry import SCRAPERS, Scraper, registrar_scraper
+from work_queue import (
+    COLAS_PREFIX,
+    MAX_INTENTOS,
+    MemoryQueue,
+    cerrar_trabajo,
+    consumir,
+    encolar_trabajo,
+    procesar_mensaje,
+    registrar_fallido,
+)
+
+# Trabajos por cola (``work_queue``) sobre ``MemoryQueue`` y un contenedor en
+# memoria (``conftest.FakeContainerClient``), con una fuente de prueba que
+# no hace peticiones.
+
+
+class ScraperPrueba(Scraper):
+    origen = "Prueba Cola"
+    run_id = "prueba_{lote}_{fecha}"
+    blob_salida = "Scrapping/Prueba/precios_{lote}_{fecha}.csv"
+    usa_http = False
+    max_workers = 1
+    chunk_size = 2
+
+    fallos = {}       # código → intentos en los que todavía no devuelve fila
+    esperan = ()      # códigos que esperan en ``barrera`` (lotes que avanzan a la par)
+    barrera = None
+    _lock = threading.Lock()
+
+    def obtener(self, codigo):
+        with self._lock:
+            restantes = self.fallos.get(codigo, 0)
+            if restantes:
+                self.fallos[codigo] = restantes - 1
+                return None
+        if codigo in self.esperan:
+            self.barrera.wait()
+        return {"Barra": codigo, "Precio": f"{int(codigo) % 50 + 10}.00"}
+
+
+@pytest.fixture
+def fuente():
+    ScraperPrueba.fallos = {}
+    ScraperPrueba.esperan = ()
+    registrar_scraper("prueba_cola")(ScraperPrueba)
+    yield "prueba_cola"
+    SCRAPERS.pop("prueba_cola", None)
+
+
+def codigos(n):
+    return [f"{7500000000000 + i}" for i in range(n)]
+
+
+def encolar(container, fuente, n, tam_lote):
+    queue = MemoryQueue()
+    trabajo = encolar_trabajo(queue, container, fuente, codigos(n), tam_lote=tam_lote, params={"formato": "csv"})
+    return queue, trabajo
+
+
+def csv_final(container, trabajo):
+    return json.loads(container.texto(f"{COLAS_PREFIX}/{trabajo['run_id']}.json"))["blob_salida"]
+
+
+def barras_finales(container, trabajo):
+    return [fila["Barra"] for fila in csv.DictReader(io.StringIO(container.texto(csv_final(container, trabajo))))]
+
+
+def handler(container):
+    return lambda contenido, intento: procesar_mensaje(container, contenido, intento)
+
+
+def en_hilos(n, objetivo):
+    hilos = [threading.Thread(target=objetivo) for _ in range(n)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+
+def test_reintenta_lote_incompleto(container, fuente):
+    queue, trabajo = encolar(container, fuente, 6, tam_lote=3)
+    ScraperPrueba.fallos = {codigos(6)[1]: 2}  # sin fila en los dos primeros intentos de su lote
+
+    stats = consumir(queue, handler(container), visibilidad_s=0, espera_s=0.01)
+
+    assert stats == {"procesados": 2, "reintentos": 2, "poison": 0}
+    assert sorted(barras_finales(container, trabajo)) == codigos(6)
+
+
+def test_poison_registra_fallidos_y_cierra(container, fuente):
+    queue, trabajo = encolar(container, fuente, 4, tam_lote=2)
+    ScraperPrueba.fallos = {codigos(4)[3]: MAX_INTENTOS}
+    poison = MemoryQueue()
+
+    stats = consumir(queue, handler(container), poison=poison, visibilidad_s=0, espera_s=0.01)
+
+    assert stats == {"procesados": 1, "reintentos": MAX_INTENTOS - 1, "poison": 1}
+    assert csv_final(container, trabajo) not in container.blobs  # el lote perdido deja el trabajo abierto
+
+    msg = poison.receive_message(visibility_timeout=0)
+    resultado = registrar_fallido(container, msg.content)
+
+    assert resultado["status"] == "ok"
+    assert resultado["fallidos"] == 2
+    assert sorted(barras_finales(container, trabajo)) == codigos(3)
+
+
+def test_cierre_una_sola_vez(container, fuente, monkeypatch):
+    queue, trabajo = encolar(container, fuente, 4, tam_lote=2)
+    # Los lotes terminan sin cerrar; después varios consumidores intentan cerrar a la vez
+    monkeypatch.setattr(work_queue, "cerrar_trabajo", lambda c, run_id: {"status": "en_curso"})
+    consumir(queue, handler(container), visibilidad_s=0, espera_s=0.01)
+    monkeypatch.undo()
+
+    resultados = []
+    en_hilos(4, lambda: resultados.append(cerrar_trabajo(container, trabajo["run_id"])))
+
+    assert sorted(r["status"] for r in resultados) == ["cerrado"] * 3 + ["ok"]
+    assert sorted(barras_finales(container, trabajo)) == codigos(4)
+    assert cerrar_trabajo(container, trabajo["run_id"])["status"] == "cerrado"
+
+
+def test_consumidores_comparten_run_id(container, fuente):
+    queue, trabajo = encolar(container, fuente, 8, tam_lote=2)
+    # El primer código de los lotes 1 y 2 espera al otro: ambos vuelcan y crean el checkpoint a la par
+    ScraperPrueba.esperan = {codigos(8)[0], codigos(8)[2]}
+    ScraperPrueba.barrera = threading.Barrier(2, timeout=5)
+    stats = []
+
+    en_hilos(2, lambda: stats.append(consumir(queue, handler(container), visibilidad_s=0, espera_s=0.01)))
+
+    assert sum(s["procesados"] for s in stats) == 4
+    assert sum(s["reintentos"] for s in stats) == 0
+    assert sorted(barras_finales(container, trabajo)) == codigos(8)
+    assert container.creados[f"{CHECKPOINT_PREFIX}/{trabajo['run_id']}.txt"] == 1
+
+
+def test_checkpoint_no_se_recrea(container):
+    """Una instancia que vio el checkpoint inexistente no borra las claves que otra agregó después."""
+    nombre = f"{CHECKPOINT_PREFIX}/run.txt"
+    a = BlobCheckpointStore(container.get_blob_client(nombre))
+    b_blob = container.get_blob_client(nombre)
+    b = BlobCheckpointStore(b_blob)
+    b_blob.exists = lambda: False  # consultó antes de que ``a`` lo creara
+
+    a.append(["1", "2"])
+    b.append(["3"])
+
+    assert sorted(a.read()) == ["1", "2", "3"]
+    assert container.creados[nombre] == 1
@@ -0,0 +1,249 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from checkpoint import BlobRun
+from scraper_registry import cerrar_ejecucion, ejecutar_scraper, get_scraper, repartir
+
+# === 🔹 Trabajo distribuido por cola (Azure Storage Queue) ===
+# El productor (``encolar_trabajo``) reparte los códigos pendientes de una
+# ejecución en lotes y deja un mensaje por lote en ``scraping-lotes``. Las
+# funciones con queue trigger de cualquier instancia toman un lote a la vez
+# (``procesar_mensaje``) y escriben en la misma ejecución (``run_id``) con
+# una parte propia, así el trabajo se reparte solo entre instancias y un
+# lote lento no frena a los demás.
+#
+# - Reintentos: si el lote falla o se queda sin tiempo, la excepción deja el
+#   mensaje en la cola; reaparece al vencer el visibility timeout y el
+#   checkpoint evita repetir los códigos ya guardados.
+# - Poison: tras ``MAX_INTENTOS`` el host lo mueve a ``scraping-lotes-poison``
+#   y ``registrar_fallido`` guarda sus códigos en ``fallidos/``.
+# - Cierre: el consumidor que completa el último lote combina las partes en
+#   el CSV final; un blob marcador (creación sin sobrescritura) evita que dos
+#   instancias lo hagan a la vez.
+#
+# ``MemoryQueue`` y ``consumir`` reproducen la semántica del host para
+# correr localmente, en proceso o contra Azurite (``QueueClient``).
+
+logger = logging.getLogger("work-queue")
+
+QUEUE_NAME = "scraping-lotes"
+POISON_QUEUE_NAME = f"{QUEUE_NAME}-poison"
+COLAS_PREFIX = "Scrapping/_colas"
+LOTE_COLA = "cola"        # valor de ``{lote}`` en run_id / blob_salida de los trabajos por cola
+TAM_LOTE = 100            # códigos por mensaje
+MAX_INTENTOS = 5          # igual a extensions.queues.maxDequeueCount (host.json)
+VISIBILIDAD_S = 30        # espera antes de reintentar (extensions.queues.visibilityTimeout en host.json)
+RESERVA_S = 600           # invisibilidad mientras se procesa un lote (functionTimeout)
+
+
+class LoteIncompleto(Exception):
+    """El lote terminó con códigos pendientes; el mensaje debe reintentarse."""
+
+
+def _manifiesto(run_id):
+    return f"{COLAS_PREFIX}/{run_id}.json"
+
+
+def _marcador_cierre(run_id):
+    return f"{COLAS_PREFIX}/{run_id}/cierre"
+
+
+def _prefijo_fallidos(run_id):
+    return f"{COLAS_PREFIX}/{run_id}/fallidos/"
+
+
+def _leer_json(container_client, nombre):
+    return json.loads(container_client.get_blob_client(nombre).download_blob().readall())
+
+
+# --- Productor ---
+def encolar_trabajo(queue_client, container_client, clave, codigos, tam_lote=None, params=None):
+    """Publica los códigos pendientes de la ejecución de ``clave`` en lotes de ``tam_lote``.
+
+    Guarda el manifiesto del trabajo (códigos y CSV final) y devuelve un
+    resumen. Volver a llamarlo con el mismo ``run_id`` sólo encola lo que
+    sigue pendiente.
+    """
+    cls = get_scraper(clave)
+    params = dict(params or {})
+    # El trabajo por cola procesa todo su manifiesto: la agenda no aplica
+    params.pop("agenda", None)
+    plantilla = {"fecha": datetime.now().strftime("%Y%m%d"), "lote": LOTE_COLA}
+    run_id = params.pop("run_id", None) or cls.run_id.format(**plantilla)
+    codigos = list(dict.fromkeys(codigos))
+
+    manifiesto = {
+        "fuente": clave,
+        "run_id": run_id,
+        "blob_salida": cls.blob_salida.format(**plantilla),
+        "codigos": codigos,
+        "creado": datetime.now().isoformat(timespec="seconds"),
+    }
+    container_client.get_blob_client(_manifiesto(run_id)).upload_blob(json.dumps(manifiesto), overwrite=True)
+
+    pendientes = BlobRun(container_client, run_id, manifiesto["blob_salida"], None, cls.columna_clave).pending(codigos)
+    lotes = repartir(pendientes, int(tam_lote or cls.tam_shard or TAM_LOTE))
+    if lotes:
+        # Un trabajo reanudado vuelve a poder cerrarse
+        marcador = container_client.get_blob_client(_marcador_cierre(run_id))
+        if marcador.exists():
+            marcador.delete_blob()
+    for n, lote in enumerate(lotes, 1):
+        queue_client.send_message(json.dumps({
+            "fuente": clave,
+            "run_id": run_id,
+            "n": n,
+            "codigos": lote,
+            "params": params,
+        }))
+    logger.info(f"Trabajo {run_id}: {len(pendientes)} de {len(codigos)} códigos en {len(lotes)} lotes")
+    return {"fuente": clave, "run_id": run_id, "codigos": len(codigos), "pendientes": len(pendientes), "lotes": len(lotes)}
+
+
+# --- Consumidor ---
+def procesar_mensaje(container_client, contenido, intento=1):
+    """Procesa un lote; lanza ``LoteIncompleto`` si quedan códigos para que el mensaje se reintente."""
+    msg = json.loads(contenido)
+    resultado = ejecutar_scraper(
+        msg["fuente"], {**msg.get("params", {}), "run_id": msg["run_id"]}, container_client, msg["codigos"],
+        lote=LOTE_COLA, parte=f"lote_{msg['n']:04d}_{intento}", cerrar=False
+    )
+    if resultado["pendientes"]:
+        raise LoteIncompleto(f"Lote {msg['n']} de {msg['run_id']}: {resultado['pendientes']} pendientes")
+    return {"lote": msg["n"], **resultado, "trabajo": cerrar_trabajo(container_client, msg["run_id"])}
+
+
+def registrar_fallido(container_client, contenido):
+    """Lote en poison: guarda sus códigos como fallidos para que el trabajo pueda cerrarse."""
+    msg = json.loads(contenido)
+    container_client.get_blob_client(f"{_prefijo_fallidos(msg['run_id'])}lote_{msg['n']:04d}.json").upload_blob(
+        contenido, overwrite=True
+    )
+    logger.error(f"Lote {msg['n']} de {msg['run_id']} descartado tras {MAX_INTENTOS} intentos ({len(msg['codigos'])} códigos)")
+    return cerrar_trabajo(container_client, msg["run_id"])
+
+
+def codigos_fallidos(container_client, run_id):
+    fallidos = set()
+    for blob in container_client.list_blobs(name_starts_with=_prefijo_fallidos(run_id)):
+        fallidos.update(_leer_json(container_client, blob.name)["codigos"])
+    return fallidos
+
+
+def cerrar_trabajo(container_client, run_id):
+    """Combina las partes si ya no quedan códigos pendientes (sin contar los fallidos)."""
+    from azure.core.exceptions import ResourceExistsError
+
+    manifiesto = _leer_json(container_client, _manifiesto(run_id))
+    cls = get_scraper(manifiesto["fuente"])
+    run = BlobRun(container_client, run_id, manifiesto["blob_salida"], None, cls.columna_clave, **cls.csv_kwargs)
+    fallidos = codigos_fallidos(container_client, run_id)
+    pendientes = [c for c in run.pending(manifiesto["codigos"]) if c not in fallidos]
+    if pendientes:
+        return {"status": "en_curso", "run_id": run_id, "pendientes": len(pendientes)}
+
+    try:
+        container_client.get_blob_client(_marcador_cierre(run_id)).upload_blob(b"", overwrite=False)
+    except ResourceExistsError:
+        return {"status": "cerrado", "run_id": run_id}
+    _, cambios = cerrar_ejecucion(run, [], cls.origen, cls.columnas_precio)
+    logger.info(f"Trabajo {run_id} cerrado en {run.final_blob} ({len(fallidos)} códigos fallidos)")
+    return {"status": "ok", "run_id": run_id, "archivo": run.final_blob, "fallidos": len(fallidos), "cambios": cambios}
+
+
+# --- Cola en proceso y bucle de consumo (local / Azurite) ---
+class MemoryQueue:
+    """Cola en memoria con la interfaz de ``azure.storage.queue.QueueClient`` que usa este módulo."""
+
+    def __init__(self):
+        self._mensajes = {}  # id → mensaje, en orden de llegada
+        self._lock = threading.Lock()
+
+    def send_message(self, content, visibility_timeout=None):
+        with self._lock:
+            msg = SimpleNamespace(
+                id=uuid.uuid4().hex, content=content, dequeue_count=0, pop_receipt=None,
+                visible_desde=time.monotonic() + (visibility_timeout or 0),
+            )
+            self._mensajes[msg.id] = msg
+            return msg
+
+    def receive_message(self, visibility_timeout=VISIBILIDAD_S):
+        ahora = time.monotonic()
+        with self._lock:
+            for msg in self._mensajes.values():
+                if msg.visible_desde <= ahora:
+                    msg.dequeue_count += 1
+                    msg.pop_receipt = uuid.uuid4().hex
+                    msg.visible_desde = ahora + visibility_timeout
+                    return SimpleNamespace(id=msg.id, content=msg.content, dequeue_count=msg.dequeue_count,
+                                           pop_receipt=msg.pop_receipt)
+        return None
+
+    def _vigente(self, message, pop_receipt):
+        actual = self._mensajes.get(message.id)
+        if actual is None or actual.pop_receipt != (pop_receipt or message.pop_receipt):
+            raise LookupError(f"Mensaje {message.id}: pop receipt vencido")
+        return actual
+
+    def update_message(self, message, pop_receipt=None, visibility_timeout=0):
+        with self._lock:
+            actual = self._vigente(message, pop_receipt)
+            actual.pop_receipt = uuid.uuid4().hex
+            actual.visible_desde = time.monotonic() + visibility_timeout
+            return SimpleNamespace(id=actual.id, pop_receipt=actual.pop_receipt)
+
+    def delete_message(self, message, pop_receipt=None):
+        with self._lock:
+            self._vigente(message, pop_receipt)
+            del self._mensajes[message.id]
+
+    def get_queue_properties(self):
+        with self._lock:
+            return SimpleNamespace(approximate_message_count=len(self._mensajes))
+
+
+def consumir(queue, handler, poison=None, max_intentos=MAX_INTENTOS, visibilidad_s=VISIBILIDAD_S,
+             reserva_s=RESERVA_S, espera_s=0.5):
+    """Consume ``queue`` con la semántica del queue trigger hasta que quede vacía.
+
+    Cada mensaje queda reservado (invisible) ``reserva_s`` mientras corre
+    ``handler(contenido, intento)``. Si lanza, reaparece a los
+    ``visibilidad_s`` y al fallar el intento ``max_intentos`` se mueve a
+    ``poison``. Devuelve ``{"procesados", "reintentos", "poison"}``.
+    """
+    stats = {"procesados": 0, "reintentos": 0, "poison": 0}
+
+    def a_poison(msg):
+        if poison is not None:
+            poison.send_message(msg.content)
+        queue.delete_message(msg)
+        stats["poison"] += 1
+
+    while True:
+        msg = queue.receive_message(visibility_timeout=reserva_s)
+        if msg is None:
+            if not queue.get_queue_properties().approximate_message_count:
+                return stats
+            time.sleep(espera_s)  # quedan mensajes invisibles (en curso o por reintentar)
+            continue
+        if msg.dequeue_count > max_intentos:  # consumidor caído tras el último intento
+            a_poison(msg)
+            continue
+        try:
+            handler(msg.content, msg.dequeue_count)
+        except Exception as e:
+            logger.warning(f"Mensaje {msg.id} (intento {msg.dequeue_count}): {e}")
+            if msg.dequeue_count >= max_intentos:
+                a_poison(msg)
+            else:
+                queue.update_message(msg, pop_receipt=msg.pop_receipt, visibility_timeout=visibilidad_s)
+                stats["reintentos"] += 1
+            continue
+        queue.delete_message(msg)
+        stats["procesados"] += 1